@@ -0,0 +1,162 @@
+"""
+对比 MangaOCR 各 CPU 推理配置 (default / quantized / onnx) 的准确率与耗时。
+
+在固定的裁剪图集合上依次加载每种配置，按页的规模分批识别并重复若干轮，输出：
+    - 模型加载 (含量化 / ONNX 导出) 耗时
+    - 每个裁剪图的平均耗时、每批耗时的 p50 / p95
+    - 与参考结果相比的完全一致率与字符错误率 (CER)
+
+参考结果优先使用 --labels 指定的标注文件 ({"文件名": "正确文本"})，否则以第一个配置 (通常为 default) 的输出为准。
+裁剪图集合默认取 data/debug/ocr_bubbles (将 MANGA_OCR_SAVE_DEBUG_CROPS 设为 True 后识别几页即可生成)。
+
+用法:
+    python scripts/benchmark_manga_ocr.py --crops data/debug/ocr_bubbles --profiles default,quantized,onnx --threads 4
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+# 只测试 CPU 推理
+os.environ['CUDA_VISIBLE_DEVICES'] = ''
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+
+from src.shared import constants
+from src.shared.path_helpers import resource_path
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("MangaOCRBenchmark")
+logger.setLevel(logging.INFO)
+
+
+def edit_distance(a, b):
+    """字符级编辑距离。"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def load_crops(crop_dir, limit):
+    paths = sorted(p for p in glob.glob(os.path.join(crop_dir, '*')) if p.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')))
+    if limit:
+        paths = paths[:limit]
+    return [os.path.basename(p) for p in paths], [Image.open(p).convert('RGB') for p in paths]
+
+
+def run_profile(profile, images, batch_size, repeat):
+    """加载指定配置并识别所有裁剪图，返回 (识别结果, 统计)。"""
+    # 每种配置重新加载模型，环境变量优先于 constants 中的设置
+    os.environ['MANGA_OCR_CPU_PROFILE'] = profile
+    from src.interfaces import manga_ocr_interface
+    manga_ocr_interface.reset_manga_ocr_instance()
+    start_time = time.perf_counter()
+    if manga_ocr_interface.get_manga_ocr_instance() is None:
+        raise RuntimeError(f"无法加载 MangaOCR ({profile})")
+    load_seconds = time.perf_counter() - start_time
+
+    # 预热一批，避免首次调用的初始化开销计入耗时
+    manga_ocr_interface.recognize_japanese_text_batch(images[:batch_size], batch_size=batch_size)
+
+    batch_ms = []
+    texts = []
+    for round_index in range(repeat):
+        texts = []
+        for start in range(0, len(images), batch_size):
+            batch_start = time.perf_counter()
+            texts.extend(manga_ocr_interface.recognize_japanese_text_batch(images[start:start + batch_size], batch_size=batch_size))
+            batch_ms.append((time.perf_counter() - batch_start) * 1000)
+    total_ms = sum(batch_ms)
+    stats = {
+        'profile': profile,
+        'load_seconds': round(load_seconds, 2),
+        'ms_per_crop': round(total_ms / (len(images) * repeat), 1),
+        'batch_p50_ms': round(percentile(batch_ms, 0.5), 1),
+        'batch_p95_ms': round(percentile(batch_ms, 0.95), 1)
+    }
+    return texts, stats
+
+
+def compare(texts, reference):
+    exact = sum(1 for text, ref in zip(texts, reference) if text == ref)
+    errors = sum(edit_distance(text, ref) for text, ref in zip(texts, reference))
+    chars = sum(len(ref) for ref in reference) or 1
+    return {'exact_match': round(exact / max(1, len(reference)), 4), 'cer': round(errors / chars, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 MangaOCR CPU 推理配置的准确率与耗时")
+    parser.add_argument('--crops', default=resource_path(os.path.join('data', 'debug', 'ocr_bubbles')), help="裁剪图目录")
+    parser.add_argument('--labels', help="标注文件 (JSON: {文件名: 正确文本})，缺省时以第一个配置的结果为参考")
+    parser.add_argument('--profiles', default='default,quantized,onnx', help="逗号分隔的配置列表")
+    parser.add_argument('--threads', type=int, default=constants.MANGA_OCR_CPU_THREADS, help="intra-op 线程数，0 表示保持默认")
+    parser.add_argument('--batch-size', type=int, default=constants.MANGA_OCR_BATCH_SIZE, help="每批裁剪图数量 (约等于一页的气泡数)")
+    parser.add_argument('--repeat', type=int, default=3, help="重复轮数")
+    parser.add_argument('--limit', type=int, default=0, help="最多使用的裁剪图数量，0 表示全部")
+    parser.add_argument('--output', help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    os.environ['MANGA_OCR_CPU_THREADS'] = str(args.threads)
+    names, images = load_crops(args.crops, args.limit)
+    if not images:
+        logger.error(f"目录中没有裁剪图: {args.crops}")
+        return 1
+    logger.info(f"共 {len(images)} 个裁剪图，每批 {args.batch_size} 个，重复 {args.repeat} 轮。")
+
+    reference = None
+    if args.labels:
+        with open(args.labels, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+        missing = [name for name in names if name not in labels]
+        if missing:
+            logger.error(f"标注文件缺少 {len(missing)} 个裁剪图，例如: {missing[:3]}")
+            return 1
+        reference = [labels[name] for name in names]
+
+    results = []
+    outputs = {}
+    for profile in [p.strip() for p in args.profiles.split(',') if p.strip()]:
+        logger.info(f"--- 配置: {profile} ---")
+        try:
+            texts, stats = run_profile(profile, images, max(1, args.batch_size), max(1, args.repeat))
+        except Exception as e:
+            logger.error(f"配置 {profile} 测试失败: {e}", exc_info=True)
+            continue
+        if reference is None:
+            reference = texts
+            stats['reference'] = True
+        stats.update(compare(texts, reference))
+        results.append(stats)
+        outputs[profile] = dict(zip(names, texts))
+        logger.info(json.dumps(stats, ensure_ascii=False))
+
+    print(f"\n{'配置':<10}{'加载(s)':>10}{'每图(ms)':>10}{'批p50(ms)':>12}{'批p95(ms)':>12}{'一致率':>10}{'CER':>8}")
+    for stats in results:
+        print(f"{stats['profile']:<10}{stats['load_seconds']:>10}{stats['ms_per_crop']:>10}{stats['batch_p50_ms']:>12}"
+              f"{stats['batch_p95_ms']:>12}{stats['exact_match']:>10}{stats['cer']:>8}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'outputs': outputs}, f, ensure_ascii=False, indent=2)
+        logger.info(f"结果已写入 {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
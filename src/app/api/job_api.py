@@ -0,0 +1,196 @@
+"""
+后台翻译任务 API
+
+提交后立即返回 job_id，前端轮询任务状态，完成后取回结果；长时间的章节任务不占用 HTTP 请求线程，
+浏览器刷新或断线后也可以凭 job_id 继续查询。
+也可以通过 Server-Sent Events 订阅任务事件，在各阶段完成时立即拿到检测框、原文和逐个气泡的译文。
+"""
+
+from flask import Blueprint, request, jsonify, Response
+import json
+import logging
+
+from src.core.processing import process_image_translation
+from src.core.chapter_pipeline import ChapterPipeline
+from src.core.job_manager import get_job_manager, JOB_SUCCEEDED
+from src.shared import constants
+from .translate_api import (
+    _parse_translation_request, _decode_request_image, _build_translation_result,
+    _decode_chapter_pages, _build_chapter_results
+)
+
+logger = logging.getLogger("JobAPI")
+
+job_bp = Blueprint('job_api', __name__, url_prefix='/api/jobs')
+
+
+def _submit_translate_image_job(data):
+    """
+    校验请求并提交单张图片翻译任务。
+
+    Returns:
+        tuple: (job, error_response)。校验失败时 job 为 None。
+    """
+    if not data:
+        return None, (jsonify({'success': False, 'error': '请求体不能为空'}), 400)
+    params, error = _parse_translation_request(data)
+    if error:
+        return None, (jsonify({'success': False, 'error': error[0]}), error[1])
+    try:
+        img = _decode_request_image(data.get('image'))
+    except Exception as e:
+        logger.error(f"图像数据解码失败: {e}")
+        return None, (jsonify({'success': False, 'error': f'图像数据解码失败: {str(e)}'}), 400)
+
+    def run_job(reporter):
+        processing_result = process_image_translation(image_pil=img, progress=reporter, **params)
+        return _build_translation_result(processing_result, params['skip_translation'])
+
+    return get_job_manager().submit('translate_image', run_job), None
+
+
+def _format_sse(event_name, data, event_id=None):
+    """格式化一条 Server-Sent Event。"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_name}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _stream_job_events(job, cursor=0):
+    """
+    按顺序推送任务事件，直到任务结束。
+
+    事件类型:
+        job          - 连接建立时的任务状态摘要
+        stage        - 进入新阶段 (detection / ocr / translation / inpainting / rendering ...)
+        progress     - 阶段内完成条目数；翻译阶段每个气泡一条，附带 index / source / text
+        detection    - 气泡坐标
+        ocr          - 所有气泡的识别原文
+        translation  - 翻译阶段的最终结果 (已经过插件钩子)
+        status       - 任务状态变化
+        result       - 任务成功结束时的完整结果 (与 /translate_image 的响应相同)
+        error        - 任务失败或取消
+    每个事件带有序号 id，断线后可通过 Last-Event-ID 请求头从断点继续。
+    """
+    yield _format_sse('job', job.to_dict())
+    while True:
+        events, finished = job.wait_events(cursor, timeout=constants.JOB_EVENT_KEEPALIVE_SECONDS)
+        for event in events:
+            yield _format_sse(event['type'], event, event_id=cursor)
+            cursor += 1
+        if finished:
+            break
+        if not events:
+            yield ": keepalive\n\n" # 注释行，防止代理因空闲断开连接
+
+    if job.status == JOB_SUCCEEDED:
+        yield _format_sse('result', job.result)
+    else:
+        yield _format_sse('error', {'status': job.status, 'error': job.error})
+
+
+def _event_stream_response(job, cursor=0):
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # 禁止 nginx 等反向代理缓冲事件流
+    }
+    return Response(_stream_job_events(job, cursor), mimetype='text/event-stream', headers=headers)
+
+
+@job_bp.route('/translate_image', methods=['POST'])
+def submit_translate_image_job():
+    """提交单张图片翻译任务，请求体与 /api/translate_image 相同。"""
+    job, error_response = _submit_translate_image_job(request.get_json())
+    if error_response:
+        return error_response
+    return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+
+
+@job_bp.route('/translate_image/stream', methods=['POST'])
+def stream_translate_image_job():
+    """
+    提交单张图片翻译任务并直接以 Server-Sent Events 返回其事件流。
+    客户端断开连接不会取消任务，可通过 /api/jobs/<job_id>/events 重新订阅。
+    """
+    job, error_response = _submit_translate_image_job(request.get_json())
+    if error_response:
+        return error_response
+    return _event_stream_response(job)
+
+
+@job_bp.route('/translate_chapter', methods=['POST'])
+def submit_translate_chapter_job():
+    """提交章节翻译任务，请求体与 /api/translate_chapter 相同。"""
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': '请求体不能为空'}), 400
+    params, error = _parse_translation_request(data, image_required=False)
+    if error:
+        return jsonify({'success': False, 'error': error[0]}), error[1]
+    pages, error = _decode_chapter_pages(data)
+    if error:
+        return jsonify({'success': False, 'error': error[0]}), error[1]
+
+    def run_job(reporter):
+        page_results = ChapterPipeline(params, progress=reporter).run(pages)
+        return {'results': _build_chapter_results(page_results, params['skip_translation'])}
+
+    job = get_job_manager().submit('translate_chapter', run_job)
+    return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+
+
+@job_bp.route('', methods=['GET'])
+def list_jobs():
+    """列出所有未过期的任务状态。"""
+    return jsonify({'success': True, 'jobs': get_job_manager().list_jobs()})
+
+
+@job_bp.route('/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """查询任务状态：所处阶段 (stage) 及该阶段已完成/总数 (done/total)。"""
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@job_bp.route('/<job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """订阅任务事件流 (Server-Sent Events)。支持 Last-Event-ID 请求头或 ?cursor= 参数从断点继续。"""
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        if last_event_id is not None:
+            cursor = int(last_event_id) + 1
+        else:
+            cursor = int(request.args.get('cursor', 0))
+    except ValueError:
+        cursor = 0
+    return _event_stream_response(job, max(0, cursor))
+
+
+@job_bp.route('/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """取回任务结果。任务未结束时返回 202，失败或取消时返回 409。"""
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    if not job.finished:
+        return jsonify({'success': False, 'job': job.to_dict(), 'error': '任务尚未完成'}), 202
+    if job.status != JOB_SUCCEEDED:
+        return jsonify({'success': False, 'job': job.to_dict(), 'error': job.error}), 409
+    return jsonify({'success': True, 'job': job.to_dict(), 'result': job.result})
+
+
+@job_bp.route('/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消任务。运行中的任务会在下一个取消点 (例如下一次翻译请求之前) 停止。"""
+    job = get_job_manager().cancel(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
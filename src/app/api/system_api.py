@@ -10,6 +10,7 @@ import requests
 import PyPDF2 # 导入 PyPDF2
 import base64 # 需要 base64
 import io # 需要 io
+import json
 from PIL import Image, ImageDraw, ImageFont # 需要 Image, ImageDraw 和 ImageFont
 import traceback # 需要traceback
 import time # 需要time
@@ -23,12 +24,21 @@ from src.core.pdf_processor import extract_images_from_pdf # 导入 PDF 处理
 from src.shared.path_helpers import get_debug_dir, resource_path # 需要调试目录函数和路径助手
 from src.interfaces.lama_interface import clean_image_with_lama, LAMA_AVAILABLE # 导入LAMA接口
 from src.interfaces.baidu_ocr_interface import test_baidu_ocr_connection # 导入百度OCR接口测试方法
-from src.interfaces.vision_interface import test_ai_vision_ocr # 导入AI视觉OCR测试函数
+from src.interfaces.paddle_ocr_interface import get_paddle_ocr_handler # PaddleOCR 实例池状态
+from src.interfaces.vision_interface import test_ai_vision_ocr, get_vision_ocr_stats, reset_vision_ocr_stats # AI视觉OCR测试与请求统计
 from src.interfaces.baidu_translate_interface import baidu_translate # 导入百度翻译接口
 from src.plugins.manager import get_plugin_manager # 需要插件管理器
 from src.plugins.base import PluginBase # 需要基类来检查类型
 from src.shared.image_helpers import base64_to_image # 需要 image_helpers
 from src.core.detection import get_bubble_coordinates # 需要 detection
+from src.core.stage_cache import get_stage_cache # 阶段结果缓存
+from src.core.ocr_cache import get_ocr_cache # 按裁剪图缓存的 OCR 结果
+from src.core.translation_memory import get_translation_memory # 翻译记忆
+from src.core.translation_router import get_router_stats # 翻译线路延迟与对冲统计
+from src.shared.rate_limiter import get_rate_limiter_stats # rpm 令牌桶状态
+from src.shared.http_clients import get_http_client_stats, reset_http_client_stats # 连接池与请求耗时统计
+from src.shared.resilience import get_resilience_stats, reset_circuit_breakers # 重试与熔断状态
+from src.shared.adaptive_limits import get_adaptive_limits_stats, set_adaptive_enabled, reset_adaptive_limits # 自适应限流
 from src.shared import constants # 导入常量
 # ... 其他需要的导入 ...
 
@@ -646,6 +656,205 @@ def detect_boxes_api():
         logger.error(f"仅检测坐标时出错: {e}", exc_info=True)
         return jsonify({'success': False, 'error': f'检测坐标失败: {str(e)}'}), 500
 
+# --- rpm 限流状态 API ---
+
+@system_bp.route('/rate_limits', methods=['GET'])
+def get_rate_limits():
+    """返回各服务商令牌桶的 rpm 与当前可用令牌数。"""
+    return jsonify({'success': True, 'limiters': get_rate_limiter_stats()})
+
+# --- HTTP 客户端统计 API ---
+
+@system_bp.route('/http_clients/stats', methods=['GET'])
+def get_http_clients_stats_api():
+    """返回复用的客户端数量及各服务的请求次数与耗时 (avg/min/max/last, 毫秒)。"""
+    return jsonify({'success': True, 'stats': get_http_client_stats()})
+
+@system_bp.route('/http_clients/stats/reset', methods=['POST'])
+def reset_http_clients_stats_api():
+    """清零请求耗时统计，便于对比调整前后的单次请求开销。"""
+    reset_http_client_stats()
+    return jsonify({'success': True})
+
+# --- 重试与熔断状态 API ---
+
+@system_bp.route('/resilience', methods=['GET'])
+def get_resilience_api():
+    """返回重试策略及各服务商熔断器的状态、重试和拒绝次数。"""
+    return jsonify({'success': True, 'resilience': get_resilience_stats()})
+
+@system_bp.route('/resilience/reset', methods=['POST'])
+def reset_resilience_api():
+    """手动关闭所有熔断器 (例如更换 API Key 后)。"""
+    reset_circuit_breakers()
+    return jsonify({'success': True})
+
+# --- 自适应限流 API ---
+
+@system_bp.route('/adaptive_limits', methods=['GET'])
+def get_adaptive_limits_api():
+    """返回自适应限流开关及各服务商当前的并发数、rpm 与已学到的上限。"""
+    return jsonify({'success': True, 'adaptive_limits': get_adaptive_limits_stats()})
+
+@system_bp.route('/adaptive_limits', methods=['POST'])
+def set_adaptive_limits_api():
+    """开启或关闭自适应限流。请求体: {"enabled": true}"""
+    data = request.get_json() or {}
+    if not isinstance(data.get('enabled'), bool):
+        return jsonify({'success': False, 'error': '缺少布尔参数 enabled'}), 400
+    set_adaptive_enabled(data['enabled'])
+    return jsonify({'success': True, 'enabled': data['enabled']})
+
+@system_bp.route('/adaptive_limits/reset', methods=['POST'])
+def reset_adaptive_limits_api():
+    """丢弃已学到的限额，从初始值重新开始。"""
+    reset_adaptive_limits()
+    return jsonify({'success': True})
+
+# --- 翻译线路路由 API ---
+
+@system_bp.route('/translation_router/stats', methods=['GET'])
+def get_translation_router_stats_api():
+    """返回各翻译线路的延迟直方图、p50/p95 以及对冲、故障转移和胜出次数。"""
+    return jsonify({'success': True, 'routes': get_router_stats()})
+
+# --- AI视觉OCR 请求统计 API ---
+
+@system_bp.route('/vision_ocr/stats', methods=['GET'])
+def get_vision_ocr_stats_api():
+    """返回各服务商、编码策略下视觉请求的平均发送字节数与耗时，以及最近请求的明细。"""
+    return jsonify({'success': True, 'stats': get_vision_ocr_stats()})
+
+@system_bp.route('/vision_ocr/stats/reset', methods=['POST'])
+def reset_vision_ocr_stats_api():
+    """清零视觉请求统计，便于对比调整编码策略前后的效果。"""
+    reset_vision_ocr_stats()
+    return jsonify({'success': True})
+
+# --- PaddleOCR 实例池 API ---
+
+@system_bp.route('/paddle_ocr/pool', methods=['GET'])
+def get_paddle_ocr_pool_api():
+    """返回 PaddleOCR 实例池中已加载的语言、估算内存以及命中/淘汰次数。"""
+    return jsonify({'success': True, 'pool': get_paddle_ocr_handler().get_pool_stats()})
+
+@system_bp.route('/paddle_ocr/pool/clear', methods=['POST'])
+def clear_paddle_ocr_pool_api():
+    """释放所有已加载的 PaddleOCR 实例。"""
+    get_paddle_ocr_handler().clear_pool()
+    return jsonify({'success': True})
+
+# --- 阶段结果缓存 API ---
+
+@system_bp.route('/stage_cache/stats', methods=['GET'])
+def get_stage_cache_stats():
+    """返回检测/修复阶段缓存的命中统计和占用情况。"""
+    try:
+        stage_cache = get_stage_cache()
+        if not stage_cache:
+            return jsonify({'success': True, 'stats': {'enabled': False}})
+        return jsonify({'success': True, 'stats': stage_cache.get_stats()})
+    except Exception as e:
+        logger.error(f"获取阶段缓存统计失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': f'获取阶段缓存统计失败: {str(e)}'}), 500
+
+@system_bp.route('/stage_cache/clear', methods=['POST'])
+def clear_stage_cache():
+    """清空阶段结果缓存。"""
+    try:
+        stage_cache = get_stage_cache()
+        if stage_cache:
+            stage_cache.clear()
+        return jsonify({'success': True, 'message': '阶段缓存已清空'})
+    except Exception as e:
+        logger.error(f"清空阶段缓存失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': f'清空阶段缓存失败: {str(e)}'}), 500
+
+@system_bp.route('/ocr_cache/stats', methods=['GET'])
+def get_ocr_cache_stats():
+    """返回 OCR 结果缓存的记录数、占用、命中率与淘汰次数。"""
+    try:
+        ocr_cache = get_ocr_cache()
+        if not ocr_cache:
+            return jsonify({'success': True, 'stats': {'enabled': False}})
+        return jsonify({'success': True, 'stats': ocr_cache.get_stats()})
+    except Exception as e:
+        logger.error(f"获取 OCR 缓存统计失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': f'获取 OCR 缓存统计失败: {str(e)}'}), 500
+
+@system_bp.route('/ocr_cache/clear', methods=['POST'])
+def clear_ocr_cache():
+    """清空 OCR 结果缓存。"""
+    try:
+        ocr_cache = get_ocr_cache()
+        if ocr_cache:
+            ocr_cache.clear()
+        return jsonify({'success': True, 'message': 'OCR 缓存已清空'})
+    except Exception as e:
+        logger.error(f"清空 OCR 缓存失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': f'清空 OCR 缓存失败: {str(e)}'}), 500
+
+@system_bp.route('/translation_memory/stats', methods=['GET'])
+def get_translation_memory_stats():
+    """返回翻译记忆的记录数、命中率及估算节省的请求数和耗时。"""
+    try:
+        memory = get_translation_memory()
+        if not memory:
+            return jsonify({'success': True, 'stats': {'enabled': False}})
+        return jsonify({'success': True, 'stats': memory.get_stats()})
+    except Exception as e:
+        logger.error(f"获取翻译记忆统计失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': f'获取翻译记忆统计失败: {str(e)}'}), 500
+
+@system_bp.route('/translation_memory/export', methods=['GET'])
+def export_translation_memory():
+    """导出翻译记忆为 JSON 文件。"""
+    try:
+        memory = get_translation_memory()
+        if not memory:
+            return jsonify({'success': False, 'error': '翻译记忆未启用'}), 400
+        entries = memory.export_entries()
+        buffer = io.BytesIO(json.dumps({'entries': entries}, ensure_ascii=False, indent=2).encode('utf-8'))
+        return send_file(buffer, mimetype='application/json', as_attachment=True,
+                         download_name='translation_memory.json')
+    except Exception as e:
+        logger.error(f"导出翻译记忆失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': f'导出翻译记忆失败: {str(e)}'}), 500
+
+@system_bp.route('/translation_memory/import', methods=['POST'])
+def import_translation_memory():
+    """导入翻译记忆。接受上传的 JSON 文件 (字段名 file) 或 JSON 请求体，格式同导出文件。"""
+    try:
+        memory = get_translation_memory()
+        if not memory:
+            return jsonify({'success': False, 'error': '翻译记忆未启用'}), 400
+        if 'file' in request.files:
+            data = json.loads(request.files['file'].read().decode('utf-8'))
+        else:
+            data = request.get_json()
+        entries = data.get('entries') if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            return jsonify({'success': False, 'error': '缺少 entries 列表'}), 400
+        imported = memory.import_entries(entries)
+        return jsonify({'success': True, 'imported': imported})
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'error': f'无法解析导入文件: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"导入翻译记忆失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': f'导入翻译记忆失败: {str(e)}'}), 500
+
+@system_bp.route('/translation_memory/clear', methods=['POST'])
+def clear_translation_memory():
+    """清空翻译记忆。"""
+    try:
+        memory = get_translation_memory()
+        if memory:
+            memory.clear()
+        return jsonify({'success': True, 'message': '翻译记忆已清空'})
+    except Exception as e:
+        logger.error(f"清空翻译记忆失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': f'清空翻译记忆失败: {str(e)}'}), 500
+
 # --- 新增：插件默认状态 API ---
 
 @system_bp.route('/plugins/default_states', methods=['GET'])
@@ -11,6 +11,7 @@ import logging # 需要 logging
 
 # 导入核心处理函数和接口
 from src.core.processing import process_image_translation
+from src.core.chapter_pipeline import ChapterPipeline
 from src.core.rendering import re_render_text_in_bubbles, render_single_bubble # 添加渲染函数
 from src.core.translation import translate_single_text # 添加单文本翻译函数
 from src.interfaces.lama_interface import is_lama_available, clean_image_with_lama, LAMA_AVAILABLE
@@ -30,328 +31,390 @@ translate_bp = Blueprint('translate_api', __name__, url_prefix='/api')
 from .config_api import save_model_info_api
 # --------------------------
 
-@translate_bp.route('/translate_image', methods=['POST'])
-def translate_image():
-    """处理图像翻译请求"""
+def _parse_translation_request(data, image_required=True):
+    """
+    解析并校验翻译请求中的公共参数 (图像本身除外)。
+
+    Args:
+        data (dict): 请求 JSON。
+        image_required (bool): 是否要求请求中包含 'image' 字段 (单图接口需要，章节接口不需要)。
+
+    Returns:
+        tuple: (params, error)。params 是可直接传给 process_image_translation 的关键字参数字典
+               (不含 image_pil)；校验失败时 params 为 None，error 为 (错误信息, HTTP状态码)。
+    """
+    # 打印详细的请求数据
+    logger.info("----- 翻译请求参数 -----")
+    logger.info(f"气泡填充方式: useInpainting={data.get('use_inpainting')}, useLama={data.get('use_lama')}")
+    logger.info(f"文字方向: {data.get('textDirection')}, 字体: {data.get('fontFamily')}, 字号: {data.get('fontSize')}")
+    logger.info(f"跳过翻译: {data.get('skip_translation', False)}, 跳过OCR: {data.get('skip_ocr', False)}")
+    logger.info(f"仅消除模式: {data.get('remove_only', False)}")
+
+    # --- 获取新的 JSON 格式标记 ---
+    use_json_format_translation = data.get('use_json_format_translation', False)
+    use_json_format_ai_vision_ocr = data.get('use_json_format_ai_vision_ocr', False)
+    logger.info(f"JSON输出模式: 翻译={use_json_format_translation}, AI视觉OCR={use_json_format_ai_vision_ocr}")
+
+    # --- 获取 rpm 参数 ---
+    rpm_limit_translation = data.get('rpm_limit_translation', constants.DEFAULT_rpm_TRANSLATION)
+    rpm_limit_ai_vision_ocr = data.get('rpm_limit_ai_vision_ocr', constants.DEFAULT_rpm_AI_VISION_OCR)
+
+    # 确保rpm值是整数
     try:
-        data = request.get_json()
-        
-        # 打印详细的请求数据（添加此日志）
-        logger.info("----- 翻译请求参数 -----")
-        logger.info(f"气泡填充方式: useInpainting={data.get('use_inpainting')}, useLama={data.get('use_lama')}")
-        logger.info(f"文字方向: {data.get('textDirection')}, 字体: {data.get('fontFamily')}, 字号: {data.get('fontSize')}")
-        logger.info(f"跳过翻译: {data.get('skip_translation', False)}, 跳过OCR: {data.get('skip_ocr', False)}")  # 更新日志
-        logger.info(f"仅消除模式: {data.get('remove_only', False)}")  # 添加仅消除模式日志
-        
-        # --- 获取新的 JSON 格式标记 ---
-        use_json_format_translation = data.get('use_json_format_translation', False)
-        use_json_format_ai_vision_ocr = data.get('use_json_format_ai_vision_ocr', False)
-        logger.info(f"JSON输出模式: 翻译={use_json_format_translation}, AI视觉OCR={use_json_format_ai_vision_ocr}")
-        # ------------------------------
-        
-        # --- 新增：获取 rpm 参数 ---
-        rpm_limit_translation = data.get('rpm_limit_translation', constants.DEFAULT_rpm_TRANSLATION)
-        rpm_limit_ai_vision_ocr = data.get('rpm_limit_ai_vision_ocr', constants.DEFAULT_rpm_AI_VISION_OCR)
-        
-        # 确保rpm值是整数
-        try:
-            rpm_limit_translation = int(rpm_limit_translation)
-            if rpm_limit_translation < 0: rpm_limit_translation = 0 # 负数视为无限制
-        except (ValueError, TypeError):
-            rpm_limit_translation = constants.DEFAULT_rpm_TRANSLATION
-        
+        rpm_limit_translation = int(rpm_limit_translation)
+        if rpm_limit_translation < 0: rpm_limit_translation = 0 # 负数视为无限制
+    except (ValueError, TypeError):
+        rpm_limit_translation = constants.DEFAULT_rpm_TRANSLATION
+
+    try:
+        rpm_limit_ai_vision_ocr = int(rpm_limit_ai_vision_ocr)
+        if rpm_limit_ai_vision_ocr < 0: rpm_limit_ai_vision_ocr = 0
+    except (ValueError, TypeError):
+        rpm_limit_ai_vision_ocr = constants.DEFAULT_rpm_AI_VISION_OCR
+
+    logger.info(f"rpm 设置: 翻译服务 rpm={rpm_limit_translation}, AI视觉OCR rpm={rpm_limit_ai_vision_ocr}")
+
+    # --- 打包翻译参数 ---
+    use_packed_translation = data.get('use_packed_translation', constants.DEFAULT_PACKED_TRANSLATION)
+    try:
+        packed_translation_token_budget = int(data.get('packed_translation_token_budget', constants.PACKED_TRANSLATION_TOKEN_BUDGET))
+        if packed_translation_token_budget <= 0: packed_translation_token_budget = constants.PACKED_TRANSLATION_TOKEN_BUDGET
+    except (ValueError, TypeError):
+        packed_translation_token_budget = constants.PACKED_TRANSLATION_TOKEN_BUDGET
+
+    # --- 备用翻译线路 (对冲请求与故障转移) ---
+    translation_fallback_routes = data.get('translation_fallback_routes') or []
+    if not isinstance(translation_fallback_routes, list):
+        logger.warning("translation_fallback_routes 不是列表，已忽略。")
+        translation_fallback_routes = []
+
+    # --- 获取描边参数 ---
+    enable_text_stroke = data.get('enableTextStroke', constants.DEFAULT_TEXT_STROKE_ENABLED)
+    text_stroke_color = data.get('textStrokeColor', constants.DEFAULT_TEXT_STROKE_COLOR)
+    text_stroke_width = int(data.get('textStrokeWidth', constants.DEFAULT_TEXT_STROKE_WIDTH))
+    logger.info(f"描边设置: enable={enable_text_stroke}, color={text_stroke_color}, width={text_stroke_width}")
+
+    logger.info("------------------------")
+
+    image_data = data.get('image') if image_required else True
+    target_language = data.get('target_language', constants.DEFAULT_TARGET_LANG)
+    source_language = data.get('source_language', constants.DEFAULT_SOURCE_LANG)
+    font_size_str = data.get('fontSize')
+    autoFontSize = data.get('autoFontSize', False)
+    api_key = data.get('api_key')
+    model_name = data.get('model_name')
+    model_provider = data.get('model_provider', constants.DEFAULT_MODEL_PROVIDER)
+    font_family = data.get('fontFamily', constants.DEFAULT_FONT_RELATIVE_PATH)
+    text_direction = data.get('textDirection', constants.DEFAULT_TEXT_DIRECTION)
+    use_inpainting = data.get('use_inpainting', False)  # 智能修复选项
+    use_lama = data.get('use_lama', False)  # LAMA修复选项
+    skip_translation = data.get('skip_translation', False)  # 跳过翻译参数
+    remove_only = data.get('remove_only', False)  # 仅消除文字模式参数
+    ocr_engine = data.get('ocr_engine', 'auto')  # OCR引擎选择参数
+
+    # 百度OCR相关参数
+    baidu_api_key = data.get('baidu_api_key')
+    baidu_secret_key = data.get('baidu_secret_key')
+
+    # AI 视觉 OCR 参数
+    ai_vision_provider = data.get('ai_vision_provider')
+    custom_ai_vision_base_url = data.get('custom_ai_vision_base_url')
+
+    custom_base_url = data.get('custom_base_url')
+    logger.info(f"自定义 OpenAI Base URL: {custom_base_url if custom_base_url else '未提供'}")
+
+    # 对于仅消除文字模式，放宽对API和模型参数的要求
+    if remove_only:
+        logger.info("仅消除文字模式：不检查API和模型参数")
+        if not all([image_data, font_family]):
+            return None, ('缺少必要的图像和字体参数', 400)
+    else:
+        # 正常模式下的参数检查
+        if not all([image_data, target_language, text_direction, model_name, model_provider, font_family]):
+            return None, ('缺少必要的参数', 400)
+
+        # 对于非本地部署的服务商，API Key是必须的
+        if model_provider == constants.CUSTOM_OPENAI_PROVIDER_ID:
+            if not api_key:
+                return None, ('使用自定义OpenAI兼容服务时必须提供API Key', 400)
+            if not model_name:
+                return None, ('使用自定义OpenAI兼容服务时必须提供模型名称', 400)
+            if not custom_base_url:
+                return None, ('使用自定义OpenAI兼容服务时必须提供Base URL', 400)
+        elif model_provider not in ['ollama', 'sakura'] and not api_key:
+            return None, ('非本地部署模式下必须提供API Key', 400)
+
+    # 检查百度OCR参数
+    if ocr_engine == 'baidu_ocr' and not (baidu_api_key and baidu_secret_key):
+        return None, ('使用百度OCR时必须提供API Key和Secret Key', 400)
+
+    # 检查自定义AI视觉OCR参数
+    if ocr_engine == constants.AI_VISION_OCR_ENGINE_ID and \
+       ai_vision_provider == constants.CUSTOM_AI_VISION_PROVIDER_ID and \
+       not custom_ai_vision_base_url:
+        logger.error("请求错误：使用自定义AI视觉OCR服务时缺少 custom_ai_vision_base_url")
+        return None, ('使用自定义AI视觉OCR服务时必须提供Base URL (custom_ai_vision_base_url)', 400)
+
+    # 处理字体大小 - 支持自动字体大小
+    if autoFontSize:
+        font_size = 'auto'
+        logger.info(f"使用自动字体大小")
+    else:
         try:
-            rpm_limit_ai_vision_ocr = int(rpm_limit_ai_vision_ocr)
-            if rpm_limit_ai_vision_ocr < 0: rpm_limit_ai_vision_ocr = 0
+            # 检查是否从自动字号切换到非自动字号
+            prev_auto_font_size = data.get('prev_auto_font_size', False)
+            if prev_auto_font_size:
+                # 从自动字号切换到非自动字号，直接使用默认字号
+                font_size = constants.DEFAULT_FONT_SIZE
+                logger.info(f"从自动字号切换到非自动字号，使用默认字号: {font_size}")
+            else:
+                font_size = int(font_size_str)
         except (ValueError, TypeError):
-            rpm_limit_ai_vision_ocr = constants.DEFAULT_rpm_AI_VISION_OCR
-        
-        logger.info(f"rpm 设置: 翻译服务 rpm={rpm_limit_translation}, AI视觉OCR rpm={rpm_limit_ai_vision_ocr}")
-        # --------------------------
+            logger.warning(f"字体大小参数'{font_size_str}'无效，使用默认值: {constants.DEFAULT_FONT_SIZE}")
+            font_size = constants.DEFAULT_FONT_SIZE
 
-        # === 新增：获取描边参数 START ===
-        enable_text_stroke = data.get('enableTextStroke', constants.DEFAULT_TEXT_STROKE_ENABLED)
-        text_stroke_color = data.get('textStrokeColor', constants.DEFAULT_TEXT_STROKE_COLOR)
-        text_stroke_width = int(data.get('textStrokeWidth', constants.DEFAULT_TEXT_STROKE_WIDTH))
-        logger.info(f"描边设置: enable={enable_text_stroke}, color={text_stroke_color}, width={text_stroke_width}")
-        # === 新增：获取描边参数 END ===
-        
-        logger.info("------------------------")
-        
-        image_data = data.get('image')
-        target_language = data.get('target_language', constants.DEFAULT_TARGET_LANG)
-        source_language = data.get('source_language', constants.DEFAULT_SOURCE_LANG)
-        font_size_str = data.get('fontSize')
-        autoFontSize = data.get('autoFontSize', False)
-        api_key = data.get('api_key')
-        model_name = data.get('model_name')
-        model_provider = data.get('model_provider', constants.DEFAULT_MODEL_PROVIDER)
-        font_family = data.get('fontFamily', constants.DEFAULT_FONT_RELATIVE_PATH)
-        text_direction = data.get('textDirection', constants.DEFAULT_TEXT_DIRECTION)
-        prompt_content = data.get('prompt_content')
-        use_textbox_prompt = data.get('use_textbox_prompt', False)
-        textbox_prompt_content = data.get('textbox_prompt_content')
-        use_inpainting = data.get('use_inpainting', False)  # 添加智能修复选项
-        blend_edges = data.get('blend_edges', True)
-        inpainting_strength = float(data.get('inpainting_strength', constants.DEFAULT_INPAINTING_STRENGTH))
-        use_lama = data.get('use_lama', False)  # 添加LAMA修复选项
-        skip_translation = data.get('skip_translation', False)  # 跳过翻译参数
-        skip_ocr = data.get('skip_ocr', False)  # 跳过OCR参数
-        remove_only = data.get('remove_only', False)  # 新增：仅消除文字模式参数
-        fill_color = data.get('fill_color', constants.DEFAULT_FILL_COLOR)  # 新增：气泡填充颜色参数
-        text_color = data.get('text_color', constants.DEFAULT_TEXT_COLOR)  # 新增：文字颜色参数
-        rotation_angle = data.get('rotation_angle', constants.DEFAULT_ROTATION_ANGLE)  # 新增：旋转角度参数
-        ocr_engine = data.get('ocr_engine', 'auto')  # 新增：OCR引擎选择参数
-        
-        # 百度OCR相关参数
-        baidu_api_key = data.get('baidu_api_key')
-        baidu_secret_key = data.get('baidu_secret_key')
-        baidu_version = data.get('baidu_version', 'standard')
-        
-        # 新增：获取 AI 视觉 OCR 参数
-        ai_vision_provider = data.get('ai_vision_provider')
-        ai_vision_api_key = data.get('ai_vision_api_key')
-        ai_vision_model_name = data.get('ai_vision_model_name')
-        ai_vision_ocr_prompt = data.get('ai_vision_ocr_prompt', constants.DEFAULT_AI_VISION_OCR_PROMPT)
-        custom_ai_vision_base_url = data.get('custom_ai_vision_base_url') # <<< 获取新的参数
-        
-        # --- 新增: 获取 custom_base_url ---
-        custom_base_url = data.get('custom_base_url') # 新增
-        logger.info(f"自定义 OpenAI Base URL: {custom_base_url if custom_base_url else '未提供'}")
-        # ---------------------------------
-        
-        # 对于仅消除文字模式，放宽对API和模型参数的要求
-        if remove_only:
-            logger.info("仅消除文字模式：不检查API和模型参数")
-            if not all([image_data, font_family]):
-                return jsonify({'error': '缺少必要的图像和字体参数'}), 400
+    # 处理字体路径
+    corrected_font_path = get_font_path(font_family)
+    logger.info(f"原始字体路径: {font_family}, 修正后: {corrected_font_path}")
+
+    # 获取前端提供的气泡坐标，如果有的话
+    provided_coords = data.get('bubble_coords')
+    if provided_coords:
+        logger.info(f"使用前端提供的手动标注气泡坐标，数量: {len(provided_coords)}")
+    else:
+        logger.info("未提供手动标注气泡坐标，将自动检测")
+
+    # 确定修复方法
+    if use_lama:
+        if not LAMA_AVAILABLE:
+            logger.warning("LAMA模块不可用，回退到纯色填充方式")
+            inpainting_method = 'solid'
         else:
-            # 正常模式下的参数检查
-            if not all([image_data, target_language, text_direction, model_name, model_provider, font_family]):
-                return jsonify({'error': '缺少必要的参数'}), 400
-                
-            # 对于非本地部署的服务商，API Key是必须的
-            if model_provider == constants.CUSTOM_OPENAI_PROVIDER_ID:
-                if not api_key:
-                    return jsonify({'error': '使用自定义OpenAI兼容服务时必须提供API Key'}), 400
-                if not model_name:
-                    return jsonify({'error': '使用自定义OpenAI兼容服务时必须提供模型名称'}), 400
-                if not custom_base_url:
-                    return jsonify({'error': '使用自定义OpenAI兼容服务时必须提供Base URL'}), 400
-            elif model_provider not in ['ollama', 'sakura'] and not api_key: # 原有逻辑
-                return jsonify({'error': '非本地部署模式下必须提供API Key'}), 400
-        
-        # 检查百度OCR参数
-        if ocr_engine == 'baidu_ocr' and not (baidu_api_key and baidu_secret_key):
-            return jsonify({'error': '使用百度OCR时必须提供API Key和Secret Key'}), 400
+            inpainting_method = 'lama'
+            logger.info("使用LAMA修复方式")
+    elif use_inpainting:
+        inpainting_method = 'inpainting'
+        logger.info("使用MI-GAN修复方式")
+    else:
+        inpainting_method = 'solid'
+        logger.info("使用纯色填充方式")
 
-        # 检查自定义AI视觉OCR参数
-        if ocr_engine == constants.AI_VISION_OCR_ENGINE_ID and \
-           ai_vision_provider == constants.CUSTOM_AI_VISION_PROVIDER_ID and \
-           not custom_ai_vision_base_url:
-            logger.error("请求错误：使用自定义AI视觉OCR服务时缺少 custom_ai_vision_base_url")
-            return jsonify({'error': '使用自定义AI视觉OCR服务时必须提供Base URL (custom_ai_vision_base_url)'}), 400
+    # 如果是仅消除文字模式，跳过翻译
+    skip_translation = bool(remove_only or skip_translation)
+    if skip_translation:
+        logger.info("仅消除文字模式或跳过翻译，处理将省略翻译步骤")
 
-        # 处理字体大小 - 支持自动字体大小
-        if autoFontSize:
-            font_size = 'auto'
-            logger.info(f"使用自动字体大小")
+    params = dict(
+        target_language=target_language,
+        source_language=source_language,
+        font_size_setting=font_size,
+        font_family_rel=corrected_font_path,
+        text_direction=text_direction,
+        model_provider=model_provider,
+        api_key=api_key,
+        model_name=model_name,
+        prompt_content=data.get('prompt_content'),
+        use_textbox_prompt=data.get('use_textbox_prompt', False),
+        textbox_prompt_content=data.get('textbox_prompt_content'),
+        use_dual_prompt_translation=data.get('use_dual_prompt_translation', constants.DEFAULT_DUAL_PROMPT_TRANSLATION),
+        use_packed_translation=use_packed_translation,
+        use_translation_memory=data.get('use_translation_memory', True),
+        translation_fallback_routes=translation_fallback_routes,
+        packed_translation_token_budget=packed_translation_token_budget,
+        use_streaming_translation=data.get('use_streaming_translation', constants.DEFAULT_STREAMING_TRANSLATION),
+        inpainting_method=inpainting_method,
+        fill_color=data.get('fill_color', constants.DEFAULT_FILL_COLOR),
+        migan_strength=float(data.get('inpainting_strength', constants.DEFAULT_INPAINTING_STRENGTH)),
+        migan_blend_edges=data.get('blend_edges', True),
+        skip_ocr=data.get('skip_ocr', False),
+        skip_translation=skip_translation,
+        provided_coords=provided_coords,
+        text_color=data.get('text_color', constants.DEFAULT_TEXT_COLOR),
+        rotation_angle=data.get('rotation_angle', constants.DEFAULT_ROTATION_ANGLE),
+        ocr_engine=ocr_engine,
+        baidu_api_key=baidu_api_key,
+        baidu_secret_key=baidu_secret_key,
+        baidu_version=data.get('baidu_version', 'standard'),
+        ai_vision_provider=ai_vision_provider,
+        ai_vision_api_key=data.get('ai_vision_api_key'),
+        ai_vision_model_name=data.get('ai_vision_model_name'),
+        ai_vision_ocr_prompt=data.get('ai_vision_ocr_prompt', constants.DEFAULT_AI_VISION_OCR_PROMPT),
+        custom_ai_vision_base_url=custom_ai_vision_base_url,
+        ai_vision_page_mode=data.get('ai_vision_page_mode', constants.DEFAULT_AI_VISION_PAGE_MODE),
+        use_fused_ocr_translation=data.get('use_fused_ocr_translation', constants.DEFAULT_FUSED_OCR_TRANSLATION),
+        # 仅消除文字时不翻译，所以翻译JSON模式无效
+        use_json_format_translation=False if skip_translation else use_json_format_translation,
+        use_json_format_ai_vision_ocr=use_json_format_ai_vision_ocr,
+        custom_base_url=custom_base_url,
+        rpm_limit_translation=rpm_limit_translation,
+        rpm_limit_ai_vision_ocr=rpm_limit_ai_vision_ocr,
+        enable_text_stroke=enable_text_stroke,
+        text_stroke_color=text_stroke_color,
+        text_stroke_width=text_stroke_width
+    )
+    return params, None
+
+
+def _decode_request_image(image_data):
+    """将请求中的 base64 图像数据解码为 PIL 图像。"""
+    image_bytes = base64.b64decode(image_data)
+    img = Image.open(io.BytesIO(image_bytes))
+    logger.info(f"图像成功加载，大小: {img.size}")
+    return img
+
+
+def _build_translation_result(processing_result, skip_translation=False):
+    """
+    将 process_image_translation 的返回值转换为可 JSON 序列化的响应字典。
+
+    Args:
+        processing_result (tuple): process_image_translation 的返回值。
+        skip_translation (bool): 是否跳过了翻译 (此时确保返回与坐标等长的空文本列表)。
+
+    Returns:
+        dict: 包含 translated_image / clean_image / 各文本列表 / bubble_coords 的字典。
+    """
+    translated_image, original_texts, bubble_texts, textbox_texts, bubble_coords, bubble_styles = processing_result
+
+    # 确保返回空文本
+    if skip_translation:
+        if not bubble_texts and bubble_coords:
+            bubble_texts = [""] * len(bubble_coords)
+        if not textbox_texts and bubble_coords:
+            textbox_texts = [""] * len(bubble_coords)
+
+    # 保存消除文字后但未添加翻译的图片作为属性
+    clean_image = getattr(translated_image, '_clean_image', None)
+    if clean_image:
+        # 确保我们返回的是真正的干净图片
+        buffered_clean = io.BytesIO()
+        clean_image.save(buffered_clean, format="PNG")
+        clean_img_str = base64.b64encode(buffered_clean.getvalue()).decode('utf-8')
+        print(f"成功获取到干净图片数据，大小: {len(clean_img_str)}")
+    else:
+        print("警告：无法从翻译后的图像获取干净背景图片")
+        # 即使在传统模式下也尝试获取干净背景
+        clean_background = getattr(translated_image, '_clean_background', None)
+        if clean_background:
+            buffered_clean = io.BytesIO()
+            clean_background.save(buffered_clean, format="PNG")
+            clean_img_str = base64.b64encode(buffered_clean.getvalue()).decode('utf-8')
+            print(f"使用clean_background作为替代，大小: {len(clean_img_str)}")
         else:
-            try:
-                # 检查是否从自动字号切换到非自动字号
-                prev_auto_font_size = data.get('prev_auto_font_size', False)
-                if prev_auto_font_size:
-                    # 从自动字号切换到非自动字号，直接使用默认字号
-                    font_size = constants.DEFAULT_FONT_SIZE
-                    logger.info(f"从自动字号切换到非自动字号，使用默认字号: {font_size}")
-                else:
-                    font_size = int(font_size_str)
-            except (ValueError, TypeError):
-                logger.warning(f"字体大小参数'{font_size_str}'无效，使用默认值: {constants.DEFAULT_FONT_SIZE}")
-                font_size = constants.DEFAULT_FONT_SIZE
-        
-        # 处理字体路径
-        corrected_font_path = get_font_path(font_family)
-        logger.info(f"原始字体路径: {font_family}, 修正后: {corrected_font_path}")
-        
+            print("严重警告：无法获取任何干净的背景图片引用")
+            clean_img_str = None
+
+    buffered = io.BytesIO()
+    translated_image.save(buffered, format="PNG")
+    img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
+
+    return {
+        'translated_image': img_str,
+        'clean_image': clean_img_str,  # 消除文字后的干净图片
+        'original_texts': original_texts,
+        'bubble_texts': bubble_texts,
+        'textbox_texts': textbox_texts,
+        'bubble_coords': bubble_coords
+    }
+
+
+def _decode_chapter_pages(data):
+    """
+    将章节请求中的 'images' 与可选的 'bubble_coords_list' 解码为 ChapterPipeline 的页面列表。
+
+    Returns:
+        tuple: (pages, error)。校验失败时 pages 为 None，error 为 (错误信息, HTTP状态码)。
+    """
+    images_data = data.get('images')
+    if not images_data or not isinstance(images_data, list):
+        return None, ('缺少图片列表 (images)', 400)
+
+    coords_list = data.get('bubble_coords_list') or []
+    pages = []
+    for i, image_data in enumerate(images_data):
+        try:
+            img = _decode_request_image(image_data)
+        except Exception as e:
+            logger.error(f"第 {i+1} 张图像数据解码失败: {e}")
+            return None, (f'第 {i+1} 张图像数据解码失败: {str(e)}', 400)
+        page_overrides = {}
+        if i < len(coords_list) and coords_list[i]:
+            page_overrides['provided_coords'] = coords_list[i]
+        pages.append((img, page_overrides))
+    return pages, None
+
+
+def _build_chapter_results(page_results, skip_translation=False):
+    """将 ChapterPipeline.run 的结果转换为响应列表，失败的页只包含 'error'。"""
+    results = []
+    for i, page_result in enumerate(page_results):
+        if page_result.get('error'):
+            results.append({'error': page_result['error']})
+            continue
+        try:
+            results.append(_build_translation_result(page_result['result'], skip_translation))
+        except Exception as e:
+            logger.error(f"组装第 {i+1} 页翻译结果失败: {e}", exc_info=True)
+            results.append({'error': str(e)})
+    return results
+
+
+@translate_bp.route('/translate_image', methods=['POST'])
+def translate_image():
+    """处理图像翻译请求"""
+    try:
+        data = request.get_json()
+        params, error = _parse_translation_request(data)
+        if error:
+            return jsonify({'error': error[0]}), error[1]
+
         # 获取用户上传的图像
         try:
-            # 解码base64图像数据
-            image_bytes = base64.b64decode(image_data)
-            img = Image.open(io.BytesIO(image_bytes))
-            logger.info(f"图像成功加载，大小: {img.size}")
+            img = _decode_request_image(data.get('image'))
         except Exception as e:
             logger.error(f"图像数据解码失败: {e}")
             return jsonify({'error': f'图像数据解码失败: {str(e)}'}), 400
-        
-        # 获取前端提供的气泡坐标，如果有的话
-        provided_coords = data.get('bubble_coords')
-        if provided_coords:
-            logger.info(f"使用前端提供的手动标注气泡坐标，数量: {len(provided_coords)}")
-        else:
-            logger.info("未提供手动标注气泡坐标，将自动检测")
-        
-        # 确定修复方法
-        if use_lama:
-            if not LAMA_AVAILABLE:
-                logger.warning("LAMA模块不可用，回退到纯色填充方式")
-                inpainting_method = 'solid'
-            else:
-                inpainting_method = 'lama'
-                logger.info("使用LAMA修复方式")
-        elif use_inpainting:
-            inpainting_method = 'inpainting'
-            logger.info("使用MI-GAN修复方式")
-        else:
-            inpainting_method = 'solid'
-            logger.info("使用纯色填充方式")
-            
-        # 如果是仅消除文字模式，跳过翻译
-        if remove_only or skip_translation:
-            logger.info("仅消除文字模式或跳过翻译，处理将省略翻译步骤")
-            translated_image, original_texts, bubble_texts, textbox_texts, bubble_coords, bubble_styles = process_image_translation(
-                image_pil=img,
-                target_language=target_language,
-                source_language=source_language,
-                font_size_setting=font_size,
-                font_family_rel=corrected_font_path,
-                text_direction=text_direction,
-                model_provider=model_provider,
-                api_key=api_key,
-                model_name=model_name,
-                prompt_content=prompt_content,
-                use_textbox_prompt=use_textbox_prompt,
-                textbox_prompt_content=textbox_prompt_content,
-                inpainting_method=inpainting_method,
-                fill_color=fill_color,
-                migan_strength=inpainting_strength,
-                migan_blend_edges=blend_edges,
-                skip_ocr=skip_ocr,
-                skip_translation=True,  # 设置跳过翻译
-                provided_coords=provided_coords,
-                text_color=text_color,  # 传递文字颜色参数
-                rotation_angle=rotation_angle,  # 传递旋转角度参数
-                ocr_engine=ocr_engine,  # 传递OCR引擎参数
-                baidu_api_key=baidu_api_key,  # 百度OCR API Key
-                baidu_secret_key=baidu_secret_key,  # 百度OCR Secret Key
-                baidu_version=baidu_version,  # 百度OCR版本
-                # 新增传递 AI 视觉 OCR 参数
-                ai_vision_provider=ai_vision_provider,
-                ai_vision_api_key=ai_vision_api_key,
-                ai_vision_model_name=ai_vision_model_name,
-                ai_vision_ocr_prompt=ai_vision_ocr_prompt,
-                custom_ai_vision_base_url=custom_ai_vision_base_url, # <<< 新增传递
-                # --- 传递新参数 ---
-                use_json_format_translation=False, # 仅消除文字，不翻译，所以翻译JSON模式无效
-                use_json_format_ai_vision_ocr=use_json_format_ai_vision_ocr,
-                custom_base_url=custom_base_url, # --- 传递 custom_base_url ---
-                # --- 传递 rpm 参数给核心处理函数 ---
-                rpm_limit_translation=rpm_limit_translation,
-                rpm_limit_ai_vision_ocr=rpm_limit_ai_vision_ocr,
-                # === 新增：传递描边参数给 processing START ===
-                enable_text_stroke=enable_text_stroke,
-                text_stroke_color=text_stroke_color,
-                text_stroke_width=text_stroke_width
-                # === 新增：传递描边参数给 processing END ===
-                # ------------------------------------
-            )
-            
-            # 确保返回空文本
-            if not bubble_texts and bubble_coords:
-                bubble_texts = [""] * len(bubble_coords)
-            if not textbox_texts and bubble_coords:
-                textbox_texts = [""] * len(bubble_coords)
-        else:
-            # 正常翻译流程
-            translated_image, original_texts, bubble_texts, textbox_texts, bubble_coords, bubble_styles = process_image_translation(
-                image_pil=img,
-                target_language=target_language,
-                source_language=source_language,
-                font_size_setting=font_size,
-                font_family_rel=corrected_font_path,
-                text_direction=text_direction,
-                model_provider=model_provider,
-                api_key=api_key,
-                model_name=model_name,
-                prompt_content=prompt_content,
-                use_textbox_prompt=use_textbox_prompt,
-                textbox_prompt_content=textbox_prompt_content,
-                inpainting_method=inpainting_method,
-                fill_color=fill_color,
-                migan_strength=inpainting_strength,
-                migan_blend_edges=blend_edges,
-                skip_ocr=skip_ocr,
-                provided_coords=provided_coords,
-                text_color=text_color,  # 传递文字颜色参数
-                rotation_angle=rotation_angle,  # 传递旋转角度参数
-                ocr_engine=ocr_engine,  # 传递OCR引擎参数
-                baidu_api_key=baidu_api_key,  # 百度OCR API Key
-                baidu_secret_key=baidu_secret_key,  # 百度OCR Secret Key
-                baidu_version=baidu_version,  # 百度OCR版本
-                # 新增传递 AI 视觉 OCR 参数
-                ai_vision_provider=ai_vision_provider,
-                ai_vision_api_key=ai_vision_api_key,
-                ai_vision_model_name=ai_vision_model_name,
-                ai_vision_ocr_prompt=ai_vision_ocr_prompt,
-                custom_ai_vision_base_url=custom_ai_vision_base_url, # <<< 新增传递
-                # --- 传递新参数 ---
-                use_json_format_translation=use_json_format_translation,
-                use_json_format_ai_vision_ocr=use_json_format_ai_vision_ocr,
-                custom_base_url=custom_base_url, # --- 传递 custom_base_url ---
-                # --- 传递 rpm 参数给核心处理函数 ---
-                rpm_limit_translation=rpm_limit_translation,
-                rpm_limit_ai_vision_ocr=rpm_limit_ai_vision_ocr,
-                # === 新增：传递描边参数给 processing START ===
-                enable_text_stroke=enable_text_stroke,
-                text_stroke_color=text_stroke_color,
-                text_stroke_width=text_stroke_width
-                # === 新增：传递描边参数给 processing END ===
-                # ------------------------------------
-            )
-            
-            # textbox_texts已从detect_text_in_bubbles函数中获取，无需在这里处理
-        
-        # 保存消除文字后但未添加翻译的图片作为属性
-        clean_image = getattr(translated_image, '_clean_image', None)
-        if clean_image:
-            # 确保我们返回的是真正的干净图片
-            buffered_clean = io.BytesIO()
-            clean_image.save(buffered_clean, format="PNG")
-            clean_img_str = base64.b64encode(buffered_clean.getvalue()).decode('utf-8')
-            print(f"成功获取到干净图片数据，大小: {len(clean_img_str)}")
-        else:
-            print("警告：无法从翻译后的图像获取干净背景图片")
-            # 即使在传统模式下也尝试获取干净背景
-            clean_background = getattr(translated_image, '_clean_background', None)
-            if clean_background:
-                buffered_clean = io.BytesIO()
-                clean_background.save(buffered_clean, format="PNG")
-                clean_img_str = base64.b64encode(buffered_clean.getvalue()).decode('utf-8')
-                print(f"使用clean_background作为替代，大小: {len(clean_img_str)}")
-            else:
-                print("严重警告：无法获取任何干净的背景图片引用")
-                clean_img_str = None
 
-        buffered = io.BytesIO()
-        translated_image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        processing_result = process_image_translation(image_pil=img, **params)
 
         # 不再在后端自动保存模型历史，改由前端请求保存
         # 模型历史保存已移至config_api.py的save_model_info_api函数
 
-        return jsonify({
-            'translated_image': img_str,
-            'clean_image': clean_img_str,  # 添加消除文字后的干净图片
-            'original_texts': original_texts,
-            'bubble_texts': bubble_texts,
-            'textbox_texts': textbox_texts,
-            'bubble_coords': bubble_coords
-        })
+        return jsonify(_build_translation_result(processing_result, params['skip_translation']))
 
     except Exception as e:
         print(e)
         return jsonify({'error': str(e)}), 500
 
+
+@translate_bp.route('/translate_chapter', methods=['POST'])
+def translate_chapter():
+    """
+    章节翻译请求：一次提交多张图片，由服务端流水线并行执行各阶段。
+
+    请求体与 /translate_image 相同，但使用 'images' (base64 列表) 代替 'image'，
+    可选的 'bubble_coords_list' 按页提供手动标注坐标。
+    返回 {'results': [...]}，每个元素与 /translate_image 的响应结构一致，失败的页包含 'error'。
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': '请求体不能为空'}), 400
+        params, error = _parse_translation_request(data, image_required=False)
+        if error:
+            return jsonify({'error': error[0]}), error[1]
+        pages, error = _decode_chapter_pages(data)
+        if error:
+            return jsonify({'error': error[0]}), error[1]
+
+        pipeline = ChapterPipeline(params)
+        page_results = pipeline.run(pages)
+        return jsonify({'results': _build_chapter_results(page_results, params['skip_translation'])})
+
+    except Exception as e:
+        logger.error(f"处理章节翻译请求时发生错误: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 @translate_bp.route('/re_render_image', methods=['POST'])
 def re_render_image():
     try:
@@ -0,0 +1,224 @@
+"""
+章节级流水线执行器。
+
+process_image_translation 对单页严格按 检测 → OCR → 翻译 → 修复 → 渲染 顺序执行，
+逐页调用时 CPU 密集阶段 (YOLO、MangaOCR、LAMA) 与网络密集阶段 (LLM 翻译) 的耗时会直接相加。
+本模块把这些阶段拆分到三个工作线程，线程之间使用有界队列衔接：
+
+    [分析: 检测 + OCR] --队列--> [翻译] --队列--> [修复 + 渲染]
+
+这样第 N+1 页可以在第 N 页等待翻译接口、第 N-1 页正在修复渲染时完成检测和 OCR。
+启用打包翻译时，翻译线程会把已在队列中等待的几页合并到同一批请求中。
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from src.core.processing import (
+    PageState, run_before_processing, run_detection_stage, run_ocr_stage,
+    run_translation_stage, run_packed_translation_stage, run_inpainting_stage, run_rendering_stage, finalize_page,
+    can_fuse_ocr_translation, run_fused_ocr_translation_stage
+)
+from src.shared import constants
+
+logger = logging.getLogger("CoreChapterPipeline")
+
+# 队列中表示"没有更多页面"的哨兵对象
+_STOP = object()
+
+
+class _PageTask:
+    """流水线中单页的工作单元。"""
+    def __init__(self, index, page):
+        self.index = index
+        self.page = page
+        self.error = None   # 某阶段出错时记录错误信息，后续阶段将直接跳过
+        self.done = False   # 页面已提前完成 (例如未检测到气泡)
+        self.fused = False  # OCR 与翻译合并为一次请求，在翻译线程中执行
+
+
+class ChapterPipeline:
+    """
+    多页翻译的流水线执行器。
+
+    每个阶段一个工作线程，阶段之间的队列有容量上限 (queue_size)，
+    快的阶段最多领先慢的阶段 queue_size 页，避免一次性把整章图片都解码进内存。
+    各页的参数字典相互独立，插件钩子对某页参数的修改不会影响其他页。
+    """
+    def __init__(self, params, queue_size=constants.CHAPTER_PIPELINE_QUEUE_SIZE, progress=None):
+        """
+        Args:
+            params (dict): process_image_translation 的关键字参数 (不含 image_pil)，应用到所有页。
+            queue_size (int): 阶段间队列的最大长度。
+            progress (ProgressReporter, optional): 按页上报进度；取消后尚未完成的页以错误结束。
+        """
+        self.params = params
+        self.queue_size = max(1, int(queue_size))
+        self.progress = progress
+        self.pack_pages = bool(params.get('use_packed_translation', constants.DEFAULT_PACKED_TRANSLATION))
+        self._results = {}
+        self._results_lock = threading.Lock()
+
+    def run(self, pages):
+        """
+        执行整章翻译并等待全部页面完成。
+
+        Args:
+            pages (list): 每个元素为 PIL 图像，或 (PIL 图像, 该页参数覆盖字典) 元组，
+                          覆盖字典常用于按页提供 provided_coords。
+
+        Returns:
+            list: 与输入顺序一致的结果列表，每个元素为
+                  {'result': process_image_translation 同结构的元组, 'error': None 或错误信息}。
+        """
+        if not pages:
+            return []
+
+        start_time = time.time()
+        logger.info(f"章节流水线开始处理 {len(pages)} 页 (队列容量: {self.queue_size})")
+        self._results = {}
+        if self.progress:
+            self.progress.set_stage('chapter', len(pages))
+
+        # 打包翻译时允许分析阶段多领先几页，让翻译线程一次取到多页
+        translate_queue_size = max(self.queue_size, constants.PACKED_TRANSLATION_MAX_PAGES) if self.pack_pages else self.queue_size
+        translate_queue = queue.Queue(maxsize=translate_queue_size)
+        render_queue = queue.Queue(maxsize=self.queue_size)
+
+        workers = [
+            threading.Thread(target=self._analyze_worker, args=(pages, translate_queue),
+                             name="chapter-analyze", daemon=True),
+            threading.Thread(target=self._translate_worker, args=(translate_queue, render_queue),
+                             name="chapter-translate", daemon=True),
+            threading.Thread(target=self._render_worker, args=(render_queue,),
+                             name="chapter-render", daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        results = [self._results.get(i, {'result': None, 'error': '页面未被处理'}) for i in range(len(pages))]
+        failed = sum(1 for r in results if r['error'])
+        logger.info(f"章节流水线完成: {len(pages) - failed}/{len(pages)} 页成功，总耗时: {time.time() - start_time:.2f}s")
+        return results
+
+    # --- 各阶段工作线程 ---
+
+    def _analyze_worker(self, pages, out_queue):
+        """阶段 1: 检测 + OCR (CPU 密集)。"""
+        try:
+            for index, item in enumerate(pages):
+                if isinstance(item, tuple):
+                    image_pil, overrides = item
+                else:
+                    image_pil, overrides = item, {}
+                page_params = dict(self.params)
+                page_params.update(overrides or {})
+                page_progress = self.progress.child(callback=self._page_event_forwarder(index)) if self.progress else None
+                task = _PageTask(index, PageState(image_pil, page_params, progress=page_progress))
+                try:
+                    run_before_processing(task.page)
+                    run_detection_stage(task.page)
+                    if not task.page.bubble_coords:
+                        logger.info(f"第 {index+1} 页未检测到气泡，跳过后续阶段。")
+                        task.done = True
+                    elif can_fuse_ocr_translation(task.page):
+                        # 合并请求以网络等待为主，交给翻译线程执行
+                        task.fused = True
+                    else:
+                        run_ocr_stage(task.page)
+                except Exception as e:
+                    logger.error(f"第 {index+1} 页检测/OCR 阶段出错: {e}", exc_info=True)
+                    task.error = str(e)
+                out_queue.put(task)
+        finally:
+            out_queue.put(_STOP)
+
+    def _translate_worker(self, in_queue, out_queue):
+        """阶段 2: 翻译 (网络密集)。启用打包翻译时一次取出队列中已就绪的多页。"""
+        try:
+            stopped = False
+            while not stopped:
+                task = in_queue.get()
+                if task is _STOP:
+                    break
+                batch = [task]
+                while self.pack_pages and len(batch) < constants.PACKED_TRANSLATION_MAX_PAGES:
+                    # 只合并已经在排队的页，不为凑批而等待
+                    try:
+                        task = in_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if task is _STOP:
+                        stopped = True
+                        break
+                    batch.append(task)
+                self._translate_batch(batch)
+                for task in batch:
+                    out_queue.put(task)
+        finally:
+            out_queue.put(_STOP)
+
+    def _translate_batch(self, batch):
+        tasks = [task for task in batch if not task.error and not task.done]
+        for task in [task for task in tasks if task.fused]:
+            try:
+                run_fused_ocr_translation_stage(task.page)
+            except Exception as e:
+                logger.error(f"第 {task.index+1} 页 OCR+翻译 合并阶段出错: {e}", exc_info=True)
+                task.error = str(e)
+        tasks = [task for task in tasks if not task.fused]
+        if not tasks:
+            return
+        try:
+            if len(tasks) == 1:
+                run_translation_stage(tasks[0].page)
+            else:
+                logger.info(f"合并翻译第 {', '.join(str(task.index+1) for task in tasks)} 页的文本。")
+                run_packed_translation_stage([task.page for task in tasks])
+        except Exception as e:
+            logger.error(f"第 {', '.join(str(task.index+1) for task in tasks)} 页翻译阶段出错: {e}", exc_info=True)
+            for task in tasks:
+                task.error = str(e)
+
+    def _render_worker(self, in_queue):
+        """阶段 3: 修复 + 渲染 (CPU 密集)，并收集结果。"""
+        while True:
+            task = in_queue.get()
+            if task is _STOP:
+                break
+            page = task.page
+            if task.error:
+                self._store(task.index, (page.original_image.copy(), [], [], [], [], {}), task.error)
+                continue
+            if task.done:
+                self._store(task.index, (page.original_image.copy(), [], [], [], [], {}))
+                continue
+            try:
+                run_inpainting_stage(page)
+                run_rendering_stage(page)
+                self._store(task.index, finalize_page(page))
+            except Exception as e:
+                logger.error(f"第 {task.index+1} 页修复/渲染阶段出错: {e}", exc_info=True)
+                self._store(task.index, (page.original_image.copy(), [], [], [], [], {}), str(e))
+
+    def _page_event_forwarder(self, index):
+        """
+        将单页的中间结果事件 (检测坐标、原文、译文) 附上页码转发给章节上报器。
+        单页的阶段/计数事件不转发，章节整体进度按页计算。
+        """
+        def forward(event):
+            if event['type'] in ('stage', 'progress'):
+                return
+            data = {k: v for k, v in event.items() if k not in ('type', 'time')}
+            self.progress.emit(event['type'], page=index, **data)
+        return forward
+
+    def _store(self, index, result, error=None):
+        with self._results_lock:
+            self._results[index] = {'result': result, 'error': error}
+        if self.progress:
+            self.progress.advance(page=index, error=error)
@@ -14,6 +14,8 @@ except ModuleNotFoundError:
         sys.path.insert(0, script_dir)
     from src.interfaces.yolo_interface import detect_bubbles # 再次尝试导入
 
+from src.core.stage_cache import get_stage_cache, hash_image, make_cache_key
+
 logger = logging.getLogger("CoreDetection")
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -29,6 +31,20 @@ def get_bubble_coordinates(image_pil, conf_threshold=0.6):
         list: 包含气泡坐标元组 (x1, y1, x2, y2) 的列表，按宽度降序排列。
               如果检测失败或未找到气泡，则返回空列表。
     """
+    # 0. 查询阶段缓存 (键: 整页哈希 + 置信度阈值)
+    stage_cache = get_stage_cache()
+    cache_key = None
+    if stage_cache:
+        try:
+            cache_key = make_cache_key(hash_image(image_pil), float(conf_threshold))
+            cached_coords = stage_cache.get_json('detection', cache_key)
+            if cached_coords is not None:
+                logger.info(f"气泡检测命中阶段缓存，共 {len(cached_coords)} 个气泡。")
+                return [tuple(coord) for coord in cached_coords]
+        except Exception as cache_e:
+            logger.warning(f"查询检测缓存失败，将直接检测: {cache_e}")
+            cache_key = None
+
     try:
         # 1. 将 PIL Image 转换为 OpenCV BGR 格式
         img_np = np.array(image_pil.convert('RGB')) # 确保是 RGB
@@ -39,6 +55,8 @@ def get_bubble_coordinates(image_pil, conf_threshold=0.6):
 
         if boxes is None or len(boxes) == 0:
             logger.info("未检测到气泡。")
+            if cache_key:
+                stage_cache.put_json('detection', cache_key, [])
             return []
 
         # 3. 提取并格式化坐标
@@ -59,6 +77,8 @@ def get_bubble_coordinates(image_pil, conf_threshold=0.6):
         bubble_coords.sort(key=lambda coord: coord[2] - coord[0], reverse=True)
 
         logger.info(f"最终获取并排序了 {len(bubble_coords)} 个有效气泡坐标。")
+        if cache_key:
+            stage_cache.put_json('detection', cache_key, bubble_coords)
         return bubble_coords
 
     except Exception as e:
@@ -14,6 +14,7 @@ except ImportError:
 
 from src.shared import constants
 from src.shared.path_helpers import get_debug_dir, resource_path # 导入 resource_path 用于测试
+from src.core.stage_cache import get_stage_cache, hash_image, make_cache_key
 
 logger = logging.getLogger("CoreInpainting")
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -115,6 +116,27 @@ def inpaint_bubbles(image_pil, bubble_coords, method='solid', fill_color=constan
          logger.error(f"无法将输入图像转换为 NumPy 数组: {e}", exc_info=True)
          return image_pil.copy(), None
 
+    # 0. 查询阶段缓存 (键: 整页哈希 + 方法 + 坐标 + 填充颜色)
+    stage_cache = get_stage_cache()
+    cache_key = None
+    if stage_cache:
+        try:
+            cache_key = make_cache_key(hash_image(image_pil), method, [list(c) for c in bubble_coords], fill_color)
+            cached_img = stage_cache.get_image('inpainting', cache_key)
+            if cached_img is not None:
+                logger.info(f"修复结果命中阶段缓存 (方法: {method})。")
+                if image_pil.mode != cached_img.mode:
+                    cached_img = cached_img.convert(image_pil.mode)
+                clean_background = cached_img.copy()
+                if method == 'lama':
+                    setattr(cached_img, '_lama_inpainted', True)
+                setattr(cached_img, '_clean_background', clean_background)
+                setattr(cached_img, '_clean_image', clean_background)
+                return cached_img, clean_background
+        except Exception as cache_e:
+            logger.warning(f"查询修复缓存失败，将直接修复: {cache_e}")
+            cache_key = None
+
     # 1. 创建掩码 (黑色为修复区)
     bubble_mask_np = create_bubble_mask(image_size, bubble_coords)
     bubble_mask_pil = Image.fromarray(bubble_mask_np)
@@ -175,6 +197,13 @@ def inpaint_bubbles(image_pil, bubble_coords, method='solid', fill_color=constan
     except Exception as save_e:
         logger.warning(f"保存修复结果调试图像失败: {save_e}")
 
+    # 写入阶段缓存。LAMA 回退为纯色填充的结果不缓存，以便下次重新尝试 LAMA
+    if cache_key and clean_background is not None and (method != 'lama' or inpainting_successful):
+        try:
+            stage_cache.put_image('inpainting', cache_key, result_img)
+        except Exception as cache_e:
+            logger.warning(f"写入修复缓存失败: {cache_e}")
+
     return result_img, clean_background
 
 # --- 测试代码 ---
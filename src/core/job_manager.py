@@ -0,0 +1,204 @@
+"""
+后台翻译任务管理。
+
+提交任务后立即返回任务 ID，任务在工作线程池中执行，HTTP 请求线程无需等待整个处理流程。
+任务通过 ProgressReporter 上报所处阶段与已完成的气泡数，可随时取消，完成后按 ID 取回结果。
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from src.core.progress import ProgressReporter, ProcessingCancelled
+from src.shared import constants
+
+logger = logging.getLogger("CoreJobManager")
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class Job:
+    """单个后台任务的状态。"""
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = JOB_QUEUED
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = [] # 按顺序记录的进度事件，供事件流 (SSE) 读取
+        self.reporter = ProgressReporter(callback=self._on_event)
+        self._lock = threading.Lock()
+        self._events_changed = threading.Condition(self._lock)
+
+    def _on_event(self, event):
+        """ProgressReporter 回调：同步阶段与计数，并记录事件。"""
+        with self._lock:
+            if event.get('stage') is not None:
+                self.stage = event['stage']
+            if 'done' in event:
+                self.done = event['done']
+                self.total = event.get('total', self.total)
+            self.events.append(event)
+            self._events_changed.notify_all()
+
+    def wait_events(self, cursor, timeout=None):
+        """
+        等待并返回 cursor 之后的新事件。
+
+        Returns:
+            tuple: (新事件列表, 任务是否已结束)。任务结束时其最终状态事件一定已包含在事件列表中。
+        """
+        with self._lock:
+            if len(self.events) <= cursor and self.status not in FINISHED_STATES:
+                self._events_changed.wait(timeout)
+            return self.events[cursor:], self.status in FINISHED_STATES
+
+    def _set_status(self, status, result=None, error=None):
+        with self._lock:
+            self.status = status
+            if status == JOB_RUNNING:
+                self.started_at = time.time()
+            if status in FINISHED_STATES:
+                self.finished_at = time.time()
+                self.result = result
+                self.error = error
+            self.events.append({'type': 'status', 'time': time.time(), 'status': status, 'error': error})
+            self._events_changed.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def to_dict(self):
+        """任务状态摘要 (不含结果本身)。"""
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'stage': self.stage,
+                'done': self.done,
+                'total': self.total,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'cancel_requested': self.reporter.cancelled
+            }
+
+
+class JobManager:
+    """
+    后台任务管理器。
+
+    已结束的任务在保留 JOB_RESULT_TTL_SECONDS 秒后被清理，防止结果图像长期占用内存。
+    """
+    def __init__(self, max_workers=constants.JOB_MAX_WORKERS, result_ttl=constants.JOB_RESULT_TTL_SECONDS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.result_ttl = result_ttl
+
+    def submit(self, kind, func):
+        """
+        提交任务。
+
+        Args:
+            kind (str): 任务类型，仅用于展示 (例如 'translate_image')。
+            func (callable): func(reporter) -> result。应在耗时步骤之间调用
+                             reporter.check_cancelled()，被取消时抛出 ProcessingCancelled。
+
+        Returns:
+            Job: 新建的任务。
+        """
+        self._cleanup_expired()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func)
+        logger.info(f"已提交后台任务 {job.id} ({kind})")
+        return job
+
+    def _run(self, job, func):
+        if job.reporter.cancelled:
+            job._set_status(JOB_CANCELLED, error='任务在开始前被取消')
+            logger.info(f"任务 {job.id} 在开始前被取消。")
+            return
+        job._set_status(JOB_RUNNING)
+        start_time = time.time()
+        try:
+            result = func(job.reporter)
+            if job.reporter.cancelled:
+                job._set_status(JOB_CANCELLED, error='任务已取消')
+                logger.info(f"任务 {job.id} 已取消 (耗时: {time.time() - start_time:.2f}s)")
+            else:
+                job._set_status(JOB_SUCCEEDED, result=result)
+                logger.info(f"任务 {job.id} 完成 (耗时: {time.time() - start_time:.2f}s)")
+        except ProcessingCancelled as e:
+            job._set_status(JOB_CANCELLED, error=str(e))
+            logger.info(f"任务 {job.id} 已取消: {e}")
+        except Exception as e:
+            logger.error(f"任务 {job.id} 执行失败: {e}", exc_info=True)
+            job._set_status(JOB_FAILED, error=str(e))
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in sorted(jobs, key=lambda j: j.created_at)]
+
+    def cancel(self, job_id):
+        """
+        请求取消任务。排队中的任务不会再执行；运行中的任务在下一个取消点停止
+        (例如下一次 translate_single_text 调用之前)。
+
+        Returns:
+            Job or None: 任务不存在时返回 None。
+        """
+        job = self.get(job_id)
+        if job and not job.finished:
+            job.reporter.cancel()
+            logger.info(f"已请求取消任务 {job_id}")
+        return job
+
+    def _cleanup_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at and now - job.finished_at > self.result_ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
+        if expired:
+            logger.info(f"已清理 {len(expired)} 个过期任务。")
+
+
+# --- 单例 ---
+_job_manager_instance = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """获取后台任务管理器单例。"""
+    global _job_manager_instance
+    if _job_manager_instance is None:
+        with _job_manager_lock:
+            if _job_manager_instance is None:
+                _job_manager_instance = JobManager()
+    return _job_manager_instance
@@ -1,33 +1,31 @@
 import logging
 import os
 import time # 为AI Vision添加time导入
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
 import cv2 # 需要 cv2 来裁剪图像
 import numpy as np
 import io
 import json # 确保导入 json
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入接口和常量
-from src.interfaces.manga_ocr_interface import recognize_japanese_text, get_manga_ocr_instance
+from src.interfaces.manga_ocr_interface import recognize_japanese_text_batch, get_manga_ocr_instance
+from src.interfaces.manga_ocr_cpu import get_cpu_profile
 from src.interfaces.paddle_ocr_interface import get_paddle_ocr_handler, PaddleOCRHandler
-from src.interfaces.baidu_ocr_interface import recognize_text_with_baidu_ocr, test_baidu_ocr_connection
+from src.interfaces.baidu_ocr_interface import recognize_text_with_baidu_ocr, recognize_crops_with_baidu_ocr_stitched, test_baidu_ocr_connection
 from src.shared import constants
-from src.shared.path_helpers import get_debug_dir # 用于保存调试图片
+from src.shared.path_helpers import get_debug_dir, resource_path # 用于保存调试图片、定位字体
 from src.shared.image_helpers import image_to_base64 # 导入图像转Base64助手
 # 导入新的AI视觉OCR服务调用函数(将在下一步创建)
 from src.interfaces.vision_interface import call_ai_vision_ocr_service
-# 导入rpm限制辅助函数
-from src.core.translation import _enforce_rpm_limit
+from src.core.stage_cache import hash_array, make_cache_key
+from src.core.ocr_cache import get_ocr_cache
+from src.shared.json_stream import IncrementalJsonArrayParser # 解析整页识别返回的 JSON 数组
 
 logger = logging.getLogger("CoreOCR")
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# --- rpm Limiting Globals for AI Vision OCR ---
-_ai_vision_ocr_rpm_last_reset_time_container = [0]
-_ai_vision_ocr_rpm_request_count_container = [0]
-# --------------------------------------------
-
 # 在解析JSON响应时增加安全提取方法
 def _safely_extract_from_json(json_str, field_name):
     """
@@ -76,6 +74,260 @@ def _safely_extract_from_json(json_str, field_name):
         # 所有方法都失败，返回原始文本
         return json_str
 
+def _recognize_crop_with_ai_vision(img_np, coords, index, source_language, prompt, use_json_format, vision_options):
+    """裁剪单个气泡并用 AI 视觉 OCR 识别，返回文本 (失败时为空字符串)。"""
+    x1, y1, x2, y2 = coords
+    try:
+        # 裁剪气泡图像
+        bubble_img_pil = Image.fromarray(img_np[y1:y2, x1:x2])
+
+        # 保存调试图像 (默认关闭：并发识别时会在热路径上同步编码 PNG，且不同页面的同名文件会互相覆盖)
+        if constants.AI_VISION_SAVE_DEBUG_CROPS:
+            try:
+                debug_dir = get_debug_dir("ocr_bubbles")
+                bubble_img_pil.save(os.path.join(debug_dir, f"bubble_{index}_{source_language}_ai_vision.png"))
+            except Exception as save_e:
+                logger.warning(f"保存 AI视觉OCR 调试气泡图像失败: {save_e}")
+
+        logger.info(f"处理气泡 {index} (AI视觉OCR)...")
+        # rpm 限制在每次实际请求前执行
+        ocr_result_raw = call_ai_vision_ocr_service(bubble_img_pil, prompt=prompt,
+                                                    encoding=constants.AI_VISION_CROP_ENCODING, **vision_options)
+
+        extracted_text_final = ""
+        if ocr_result_raw:
+            if use_json_format:
+                # 解析失败时 _safely_extract_from_json 会尝试用正则提取文本
+                extracted_text_final = _safely_extract_from_json(ocr_result_raw, "extracted_text")
+            else:
+                extracted_text_final = ocr_result_raw # 非JSON模式直接使用结果
+
+        # 输出识别文本到日志
+        if extracted_text_final:
+            logger.info(f"气泡 {index} 识别文本: '{extracted_text_final}'")
+        else:
+            logger.info(f"气泡 {index} 未识别出文本")
+        return extracted_text_final
+    except Exception as e_bubble:
+        logger.error(f"处理气泡 {index} (AI视觉OCR) 时出错: {e_bubble}", exc_info=True)
+        return ""
+
+
+def _draw_numbered_boxes(image_pil, bubble_coords, scale):
+    """
+    缩放整页图像并在每个气泡上画出编号框，返回 (标注后的图像, 缩放后的坐标列表)。
+    编号从 1 开始，与 bubble_coords 的顺序一致。
+    """
+    width, height = image_pil.size
+    page = image_pil.convert('RGB')
+    if scale < 1:
+        page = page.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+    draw = ImageDraw.Draw(page)
+    line_width = max(2, int(min(page.size) / 300))
+    font_size = max(14, int(min(page.size) / 40))
+    try:
+        font = ImageFont.truetype(resource_path(constants.DEFAULT_FONT_RELATIVE_PATH), font_size)
+    except Exception:
+        font = ImageFont.load_default()
+    scaled_coords = []
+    for number, (x1, y1, x2, y2) in enumerate(bubble_coords, 1):
+        box = (int(x1 * scale), int(y1 * scale), int(x2 * scale), int(y2 * scale))
+        scaled_coords.append(box)
+        draw.rectangle(box, outline=constants.AI_VISION_PAGE_BOX_COLOR, width=line_width)
+        # 编号标签放在框的左上角，白字红底，避免与原文混淆
+        label = str(number)
+        label_box = draw.textbbox((box[0], box[1]), label, font=font)
+        draw.rectangle((label_box[0] - 2, label_box[1] - 2, label_box[2] + 2, label_box[3] + 2),
+                       fill=constants.AI_VISION_PAGE_BOX_COLOR)
+        draw.text((box[0], box[1]), label, fill='#FFFFFF', font=font)
+    return page, scaled_coords
+
+
+def _parse_page_ocr_response(raw_text, bubble_count, with_translation=False):
+    """
+    解析整页识别返回的 JSON 数组，校验每个元素的编号与文本。
+
+    编号必须在 1..bubble_count 之间且不重复，文本必须是非空字符串；
+    未通过校验的元素被忽略，对应的气泡由调用方逐个裁剪重新识别。
+
+    Args:
+        with_translation (bool): 合并模式，同时读取每个元素的 "translation" 字段。
+
+    Returns:
+        dict: {气泡下标 (从 0 开始): 文本}；合并模式下值为 (原文, 译文)，译文缺失或为空时为 None。
+    """
+    parser = IncrementalJsonArrayParser()
+    entries = parser.feed(raw_text or "")
+    results = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        text = entry.get('text')
+        try:
+            number = int(entry.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= number <= bubble_count or (number - 1) in results:
+            continue
+        if not isinstance(text, str) or not text.strip():
+            continue
+        if with_translation:
+            translation = entry.get('translation')
+            translation = translation.strip() if isinstance(translation, str) and translation.strip() else None
+            results[number - 1] = (text.strip(), translation)
+        else:
+            results[number - 1] = text.strip()
+    if parser.skipped:
+        logger.warning(f"整页识别结果中有 {parser.skipped} 个元素不是合法 JSON，已忽略。")
+    return results
+
+
+def _prepare_page_image(image_pil, bubble_coords, debug_name):
+    """缩小整页图像并标注气泡编号，返回 (标注后的图像, 坐标说明文本, 缩放比例)。"""
+    width, height = image_pil.size
+    scale = min(1.0, constants.AI_VISION_PAGE_MAX_SIDE / max(width, height))
+    page_img, scaled_coords = _draw_numbered_boxes(image_pil, bubble_coords, scale)
+    # 保存调试图像 (默认关闭：每页都要额外编码一次 PNG，且不同页面的同名文件会互相覆盖)
+    if constants.AI_VISION_SAVE_DEBUG_PAGES:
+        try:
+            debug_dir = get_debug_dir("ocr_pages")
+            page_img.save(os.path.join(debug_dir, f"{debug_name}.png"))
+        except Exception as save_e:
+            logger.warning(f"保存整页识别调试图像失败: {save_e}")
+    box_list = "\n".join(f"{number}: ({x1}, {y1}) - ({x2}, {y2})"
+                         for number, (x1, y1, x2, y2) in enumerate(scaled_coords, 1))
+    return page_img, box_list, scale
+
+
+def _recognize_page_with_ai_vision(image_pil, bubble_coords, source_language, user_prompt, vision_options):
+    """
+    整页模式：把缩小后的整页图像 (标注气泡编号) 与坐标列表一次发送给视觉模型。
+
+    Returns:
+        dict: {气泡下标: 文本}，只包含通过校验的气泡。
+    """
+    try:
+        page_img, box_list, scale = _prepare_page_image(image_pil, bubble_coords, f"page_{source_language}_ai_vision")
+        prompt = constants.DEFAULT_AI_VISION_PAGE_OCR_PROMPT \
+            .replace('{prompt}', user_prompt or constants.DEFAULT_AI_VISION_OCR_PROMPT) \
+            .replace('{count}', str(len(bubble_coords))) \
+            .replace('{boxes}', box_list)
+
+        logger.info(f"AI视觉OCR 整页识别: {len(bubble_coords)} 个气泡, 图像 {page_img.size[0]}x{page_img.size[1]} (缩放 {scale:.2f})")
+        raw = call_ai_vision_ocr_service(page_img, prompt=prompt, encoding=constants.AI_VISION_PAGE_ENCODING, **vision_options)
+        results = _parse_page_ocr_response(raw, len(bubble_coords))
+        logger.info(f"整页识别返回 {len(results)}/{len(bubble_coords)} 个气泡的有效结果。")
+        return results
+    except Exception as e:
+        logger.error(f"AI视觉OCR 整页识别失败，将逐个裁剪识别: {e}", exc_info=True)
+        return {}
+
+
+def find_blank_bubbles(img_np, bubble_coords):
+    """
+    找出没有文字的气泡 (空白框、误检的均匀区域等)。
+
+    整页只计算一次灰度图、墨迹掩码和 Canny 边缘及它们的积分图，
+    每个气泡 (各边向内收缩 BLANK_BUBBLE_INSET_RATIO 以排除轮廓线) 的灰度标准差、
+    墨迹像素比例与边缘密度都由积分图的四个角一次性向量化求出。
+    灰度标准差低于 BLANK_BUBBLE_MAX_STD，或墨迹比例与边缘密度都低于下限的气泡视为空白。
+
+    Args:
+        img_np (numpy.ndarray): RGB 图像。
+        bubble_coords (list): 气泡坐标列表 [(x1, y1, x2, y2), ...]。
+
+    Returns:
+        list: 与 bubble_coords 对应的布尔值，True 表示空白。
+    """
+    if not bubble_coords:
+        return []
+    gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY) if img_np.ndim == 3 else img_np
+    height, width = gray.shape[:2]
+    boxes = np.asarray(bubble_coords, dtype=np.int64).reshape(-1, 4)
+    inset_x = ((boxes[:, 2] - boxes[:, 0]) * constants.BLANK_BUBBLE_INSET_RATIO).astype(np.int64)
+    inset_y = ((boxes[:, 3] - boxes[:, 1]) * constants.BLANK_BUBBLE_INSET_RATIO).astype(np.int64)
+    x1 = np.clip(boxes[:, 0] + inset_x, 0, width)
+    y1 = np.clip(boxes[:, 1] + inset_y, 0, height)
+    x2 = np.maximum(np.clip(boxes[:, 2] - inset_x, 0, width), x1)
+    y2 = np.maximum(np.clip(boxes[:, 3] - inset_y, 0, height), y1)
+    area = ((x2 - x1) * (y2 - y1)).astype(np.float64)
+    safe_area = np.maximum(area, 1.0)
+
+    def box_sums(integral):
+        return (integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]).astype(np.float64)
+
+    # 积分图比原图多一行一列，气泡坐标可直接作为下标
+    gray_sum, gray_sq_sum = cv2.integral2(gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    ink_sum = cv2.integral((gray < constants.BLANK_BUBBLE_INK_THRESHOLD).astype(np.uint8))
+    edge_sum = cv2.integral((cv2.Canny(gray, 50, 150) > 0).astype(np.uint8))
+
+    mean = box_sums(gray_sum) / safe_area
+    std = np.sqrt(np.maximum(box_sums(gray_sq_sum) / safe_area - mean ** 2, 0.0))
+    ink_ratio = box_sums(ink_sum) / safe_area
+    edge_density = box_sums(edge_sum) / safe_area
+    blank = (area >= constants.BLANK_BUBBLE_MIN_AREA) & (
+        (std < constants.BLANK_BUBBLE_MAX_STD) |
+        ((ink_ratio < constants.BLANK_BUBBLE_MIN_INK_RATIO) & (edge_density < constants.BLANK_BUBBLE_MIN_EDGE_DENSITY)))
+    for i in np.flatnonzero(blank):
+        logger.debug(f"气泡 {i} 判定为空白: 标准差 {std[i]:.1f}, 墨迹比例 {ink_ratio[i]:.4f}, 边缘密度 {edge_density[i]:.4f}")
+    return blank.tolist()
+
+
+def recognize_and_translate_page_with_ai_vision(image_pil, bubble_coords, source_language='japan',
+                                                ai_vision_provider=None, ai_vision_api_key=None,
+                                                ai_vision_model_name=None, ai_vision_ocr_prompt=None,
+                                                custom_ai_vision_base_url=None,
+                                                rpm_limit_ai_vision: int = constants.DEFAULT_rpm_AI_VISION_OCR,
+                                                prompt_content=None):
+    """
+    OCR + 翻译 合并模式：整页图像 (标注气泡编号) 只请求一次，视觉模型同时返回每个区域的原文与译文。
+
+    Args:
+        prompt_content (str, optional): 翻译提示词，为空时使用默认提示词。
+        其余参数与 recognize_text_in_bubbles 的 AI 视觉参数相同。
+
+    Returns:
+        dict: {气泡下标: (原文, 译文)}，只包含原文通过校验的气泡；译文缺失时为 None。
+              请求失败时返回空字典，由调用方按普通 OCR 与翻译流程处理。
+    """
+    if not bubble_coords:
+        return {}
+    vision_options = dict(provider=ai_vision_provider, api_key=ai_vision_api_key, model_name=ai_vision_model_name,
+                          custom_base_url=custom_ai_vision_base_url, rpm_limit=rpm_limit_ai_vision)
+    try:
+        page_img, box_list, scale = _prepare_page_image(image_pil, bubble_coords, f"page_{source_language}_ai_vision_fused")
+        prompt = constants.DEFAULT_AI_VISION_FUSED_PROMPT \
+            .replace('{ocr_prompt}', ai_vision_ocr_prompt or constants.DEFAULT_AI_VISION_OCR_PROMPT) \
+            .replace('{count}', str(len(bubble_coords))) \
+            .replace('{boxes}', box_list) \
+            .replace('{prompt}', prompt_content or constants.DEFAULT_PROMPT)
+
+        logger.info(f"AI视觉 OCR+翻译 合并请求: {len(bubble_coords)} 个气泡, 图像 {page_img.size[0]}x{page_img.size[1]} (缩放 {scale:.2f})")
+        raw = call_ai_vision_ocr_service(page_img, prompt=prompt, encoding=constants.AI_VISION_PAGE_ENCODING, **vision_options)
+        results = _parse_page_ocr_response(raw, len(bubble_coords), with_translation=True)
+        translated = sum(1 for _, translation in results.values() if translation)
+        logger.info(f"合并请求返回 {len(results)}/{len(bubble_coords)} 个气泡的原文，其中 {translated} 个带有译文。")
+        return results
+    except Exception as e:
+        logger.error(f"AI视觉 OCR+翻译 合并请求失败，将按普通流程识别和翻译: {e}", exc_info=True)
+        return {}
+
+
+def _store_ocr_results(ocr_cache, ocr_engine_type, source_language, crop_keys, texts):
+    """
+    把识别结果写入 OCR 缓存。
+    全部为空通常意味着引擎未初始化或调用失败，不缓存；远程引擎的空结果也可能是临时网络错误，只缓存非空结果。
+    """
+    if not any(texts):
+        return
+    is_remote_engine = ocr_engine_type in ('BaiduOCR', 'AIVision')
+    entries = {key: text for key, text in zip(crop_keys, texts) if text or not is_remote_engine}
+    try:
+        ocr_cache.put_many(entries, engine=ocr_engine_type, language=source_language)
+    except Exception as e:
+        logger.warning(f"写入 OCR 缓存失败: {e}")
+
+
 def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan', ocr_engine='auto', 
                               baidu_api_key=None, baidu_secret_key=None, baidu_version="standard",
                               ai_vision_provider=None, ai_vision_api_key=None,
@@ -83,7 +335,10 @@ def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan',
                               custom_ai_vision_base_url=None,
                               use_json_format_for_ai_vision=False,
                               rpm_limit_ai_vision: int = constants.DEFAULT_rpm_AI_VISION_OCR,
-                              jsonPromptMode: str = 'normal'): # <--- 新增rpm参数
+                              jsonPromptMode: str = 'normal', # <--- 新增rpm参数
+                              ai_vision_page_mode=constants.DEFAULT_AI_VISION_PAGE_MODE,
+                              skip_blank_bubbles=constants.BLANK_BUBBLE_FILTER_ENABLED,
+                              use_ocr_cache=True):
     """
     根据源语言和引擎选择，使用合适的 OCR 引擎识别所有气泡内的文本。
 
@@ -102,6 +357,10 @@ def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan',
         custom_ai_vision_base_url (str, optional): 自定义AI视觉服务的Base URL，仅当使用自定义服务时需要。
         use_json_format_for_ai_vision (bool): AI视觉OCR是否期望并解析JSON格式的响应。
         rpm_limit_ai_vision (int): AI视觉OCR服务的每分钟请求数限制。
+        ai_vision_page_mode (bool): AI视觉OCR整页模式。整页图像 (缩小并标注气泡编号) 只请求一次，
+            模型按编号返回 JSON 数组；缺失或未通过校验的气泡再逐个裁剪识别。
+        skip_blank_bubbles (bool): 识别前用 find_blank_bubbles 过滤没有文字的气泡，这些气泡直接返回空字符串。
+        use_ocr_cache (bool): 识别前按裁剪图批量查询 OCR 缓存 (ocr_cache)，只识别未命中的气泡并写回缓存。
 
     Returns:
         list: 包含每个气泡识别文本的列表，顺序与 bubble_coords 一致。
@@ -137,33 +396,127 @@ def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan',
         logger.error(f"将 PIL 图像转换为 NumPy 数组失败: {e}", exc_info=True)
         return recognized_texts
 
+    def recognize_subset(indices, **overrides):
+        """只识别 indices 指定的气泡 (其余参数不变)，结果按 indices 的顺序返回。"""
+        options = dict(baidu_api_key=baidu_api_key, baidu_secret_key=baidu_secret_key, baidu_version=baidu_version,
+                       ai_vision_provider=ai_vision_provider, ai_vision_api_key=ai_vision_api_key,
+                       ai_vision_model_name=ai_vision_model_name, ai_vision_ocr_prompt=ai_vision_ocr_prompt,
+                       custom_ai_vision_base_url=custom_ai_vision_base_url,
+                       use_json_format_for_ai_vision=use_json_format_for_ai_vision,
+                       rpm_limit_ai_vision=rpm_limit_ai_vision, jsonPromptMode=jsonPromptMode,
+                       ai_vision_page_mode=ai_vision_page_mode, skip_blank_bubbles=False, use_ocr_cache=use_ocr_cache)
+        options.update(overrides)
+        return recognize_text_in_bubbles(image_pil, [bubble_coords[i] for i in indices], source_language, ocr_engine, **options)
+
+    # --- 空白气泡预过滤：只把可能有文字的气泡送去识别 ---
+    if skip_blank_bubbles:
+        try:
+            blank_flags = find_blank_bubbles(img_np, bubble_coords)
+        except Exception as e:
+            logger.warning(f"空白气泡预过滤失败，将识别所有气泡: {e}")
+            blank_flags = []
+        if any(blank_flags):
+            kept = [i for i, blank in enumerate(blank_flags) if not blank]
+            logger.info(f"空白气泡预过滤: 跳过 {len(bubble_coords) - len(kept)}/{len(bubble_coords)} 个没有文字的气泡。")
+            if kept:
+                for i, text in zip(kept, recognize_subset(kept)):
+                    recognized_texts[i] = text
+            return recognized_texts
+
+    # --- 批量查询 OCR 缓存 (每个裁剪图的键: 引擎 + 语言 + 引擎参数 + 裁剪区域哈希) ---
+    ocr_cache = get_ocr_cache() if use_ocr_cache else None
+    crop_keys = None
+    if ocr_cache:
+        try:
+            engine_params = None
+            if ocr_engine_type == 'BaiduOCR':
+                engine_params = [baidu_version, constants.BAIDU_OCR_STITCH_ENABLED]
+            elif ocr_engine_type == 'PaddleOCR':
+                engine_params = [constants.PADDLE_OCR_RECOGNITION_MODE]
+            elif ocr_engine_type == 'MangaOCR':
+                engine_params = [get_cpu_profile()] # 量化 / ONNX 配置的识别结果可能与默认配置不同
+            elif ocr_engine_type == 'AIVision':
+                engine_params = [ai_vision_provider, ai_vision_model_name, ai_vision_ocr_prompt,
+                                 custom_ai_vision_base_url, bool(use_json_format_for_ai_vision), bool(ai_vision_page_mode),
+                                 constants.AI_VISION_CROP_ENCODING, constants.AI_VISION_PAGE_ENCODING]
+            crop_keys = [make_cache_key(ocr_engine_type, source_language, engine_params, hash_array(img_np[y1:y2, x1:x2]))
+                         for x1, y1, x2, y2 in bubble_coords]
+            cached = ocr_cache.get_many(crop_keys)
+        except Exception as cache_e:
+            logger.warning(f"查询 OCR 缓存失败，将直接识别: {cache_e}")
+            crop_keys, cached = None, {}
+        if cached:
+            misses = [i for i, key in enumerate(crop_keys) if key not in cached]
+            logger.info(f"OCR 缓存命中 {len(bubble_coords) - len(misses)}/{len(bubble_coords)} 个气泡 ({ocr_engine_type})。")
+            for i, key in enumerate(crop_keys):
+                if key in cached:
+                    recognized_texts[i] = cached[key]
+            if misses:
+                miss_texts = recognize_subset(misses, use_ocr_cache=False)
+                for i, text in zip(misses, miss_texts):
+                    recognized_texts[i] = text
+                _store_ocr_results(ocr_cache, ocr_engine_type, source_language,
+                                   [crop_keys[i] for i in misses], miss_texts)
+            return recognized_texts
+
     # --- 使用百度OCR ---
     if ocr_engine_type == 'BaiduOCR':
         if baidu_api_key and baidu_secret_key:
-            logger.info(f"开始使用百度OCR ({baidu_version}) 逐个识别 {len(bubble_coords)} 个气泡...")
-            
             # 获取百度OCR的语言映射
             baidu_language = constants.BAIDU_LANG_MAP.get(source_language, source_language)
             logger.info(f"将源语言 '{source_language}' 映射为百度OCR语言 '{baidu_language}'")
-            
-            # 百度OCR需要逐个处理气泡，添加请求间隔避免QPS限制
+
+            # 裁剪所有气泡图像 (使用 NumPy 数组)
+            bubble_imgs = {}
             for i, (x1, y1, x2, y2) in enumerate(bubble_coords):
-                try:
-                    # 裁剪气泡图像 (使用 NumPy 数组)
-                    bubble_img_np = img_np[y1:y2, x1:x2]
-                    # 转换为 PIL Image
-                    bubble_img_pil = Image.fromarray(bubble_img_np)
-                    
-                    # 保存调试图像 (可选)
+                bubble_img_np = img_np[y1:y2, x1:x2]
+                if bubble_img_np.size == 0:
+                    continue
+                bubble_img_pil = Image.fromarray(bubble_img_np)
+                bubble_imgs[i] = bubble_img_pil
+
+                # 保存调试图像 (可选)
+                if constants.BAIDU_OCR_SAVE_DEBUG_CROPS:
                     try:
                         debug_dir = get_debug_dir("ocr_bubbles")
                         bubble_img_pil.save(os.path.join(debug_dir, f"bubble_{i}_{source_language}_baidu.png"))
                     except Exception as save_e:
                         logger.warning(f"保存 OCR 调试气泡图像失败: {save_e}")
-                    
+
+            # 拼接识别：多个气泡合并为少量请求，拼接图请求失败的气泡再逐个识别
+            pending = list(bubble_imgs)
+            if constants.BAIDU_OCR_STITCH_ENABLED and len(pending) > 1:
+                logger.info(f"开始使用百度OCR ({baidu_version}) 拼接识别 {len(pending)} 个气泡...")
+                try:
+                    stitched_texts = recognize_crops_with_baidu_ocr_stitched(
+                        [bubble_imgs[i] for i in pending],
+                        language=baidu_language,
+                        api_key=baidu_api_key,
+                        secret_key=baidu_secret_key,
+                        version=baidu_version
+                    )
+                except Exception as e:
+                    logger.error(f"百度OCR拼接识别出错，将逐个识别: {e}", exc_info=True)
+                    stitched_texts = [None] * len(pending)
+                for i, text in zip(pending, stitched_texts):
+                    if text is not None:
+                        recognized_texts[i] = text
+                        if text:
+                            logger.info(f"气泡 {i} 识别文本: '{text}'")
+                        else:
+                            logger.info(f"气泡 {i} 未识别出文本")
+                pending = [i for i, text in zip(pending, stitched_texts) if text is None]
+                if pending:
+                    logger.warning(f"{len(pending)} 个气泡的拼接识别失败，改为逐个识别。")
+            elif pending:
+                logger.info(f"开始使用百度OCR ({baidu_version}) 逐个识别 {len(pending)} 个气泡...")
+            
+            # 百度OCR逐个处理气泡时，接口内部会添加请求间隔避免QPS限制
+            for i in pending:
+                try:
                     # 将PIL图像转换为字节
                     buffer = io.BytesIO()
-                    bubble_img_pil.save(buffer, format="PNG")
+                    bubble_imgs[i].save(buffer, format="PNG")
                     image_bytes = buffer.getvalue()
                     
                     # 调用百度OCR接口识别
@@ -201,7 +554,7 @@ def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan',
                 # PaddleOCR 接口现在处理所有气泡
                 # 注意：paddle_ocr.recognize_text 需要接收原始图像和坐标列表
                 logger.info(f"开始使用 PaddleOCR 识别 {len(bubble_coords)} 个气泡...")
-                recognized_texts = paddle_ocr.recognize_text(image_pil, bubble_coords)
+                recognized_texts = paddle_ocr.recognize_text(image_pil, bubble_coords, lang=source_language)
                 logger.info("PaddleOCR 识别完成。")
 
                 # 在核心OCR模块中记录每个气泡的识别结果，确保与MangaOCR保持一致的格式
@@ -228,35 +581,32 @@ def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan',
     elif ocr_engine_type == 'MangaOCR':
         ocr_instance = get_manga_ocr_instance()
         if ocr_instance:
-            logger.info(f"开始使用 MangaOCR 逐个识别 {len(bubble_coords)} 个气泡...")
-            # MangaOCR 需要逐个处理气泡
-            for i, (x1, y1, x2, y2) in enumerate(bubble_coords):
-                try:
-                    # 裁剪气泡图像 (使用 NumPy 数组)
-                    bubble_img_np = img_np[y1:y2, x1:x2]
-                    # 转换为 PIL Image
-                    bubble_img_pil = Image.fromarray(bubble_img_np)
+            logger.info(f"开始使用 MangaOCR 批量识别 {len(bubble_coords)} 个气泡...")
+            start_time = time.time()
+            # 所有气泡裁剪图合并为批次识别，编码器每批只运行一次
+            # 面积为 0 的气泡 (坐标异常) 不参与识别，结果保持空字符串
+            valid_indices = [i for i, (x1, y1, x2, y2) in enumerate(bubble_coords) if x2 > x1 and y2 > y1]
+            bubble_imgs = [Image.fromarray(img_np[y1:y2, x1:x2])
+                           for x1, y1, x2, y2 in (bubble_coords[i] for i in valid_indices)]
 
-                    # 保存调试图像 (可选)
-                    try:
-                        debug_dir = get_debug_dir("ocr_bubbles")
+            # 保存调试图像 (可选)
+            if constants.MANGA_OCR_SAVE_DEBUG_CROPS:
+                try:
+                    debug_dir = get_debug_dir("ocr_bubbles")
+                    for i, bubble_img_pil in zip(valid_indices, bubble_imgs):
                         bubble_img_pil.save(os.path.join(debug_dir, f"bubble_{i}_{source_language}.png"))
-                    except Exception as save_e:
-                        logger.warning(f"保存 OCR 调试气泡图像失败: {save_e}")
+                except Exception as save_e:
+                    logger.warning(f"保存 OCR 调试气泡图像失败: {save_e}")
 
-                    # 调用 MangaOCR 接口识别
-                    text = recognize_japanese_text(bubble_img_pil)
-                    recognized_texts[i] = text
-                    # 输出识别文本到日志
-                    if text:
-                        logger.info(f"气泡 {i} 识别文本: '{text}'")
-                    else:
-                        logger.info(f"气泡 {i} 未识别出文本")
-
-                except Exception as e:
-                    logger.error(f"处理气泡 {i} (MangaOCR) 时出错: {e}", exc_info=True)
-                    recognized_texts[i] = "" # 出错时设置为空字符串
-            logger.info("MangaOCR 识别完成。")
+            for i, text in zip(valid_indices, recognize_japanese_text_batch(bubble_imgs)):
+                recognized_texts[i] = text
+            for i, text in enumerate(recognized_texts):
+                # 输出识别文本到日志
+                if text:
+                    logger.info(f"气泡 {i} 识别文本: '{text}'")
+                else:
+                    logger.info(f"气泡 {i} 未识别出文本")
+            logger.info(f"MangaOCR 识别完成 (耗时: {time.time() - start_time:.2f}s)。")
         else:
             logger.error("无法初始化 MangaOCR，OCR 步骤跳过。")
     elif ocr_engine_type == 'AIVision':
@@ -265,8 +615,10 @@ def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan',
                 logger.error("使用自定义AI视觉OCR时，缺少Base URL (custom_ai_vision_base_url)，OCR步骤跳过。")
                 return [""] * len(bubble_coords)
 
-            logger.info(f"开始使用 AI视觉OCR ({ai_vision_provider}/{ai_vision_model_name}, rpm: {rpm_limit_ai_vision if rpm_limit_ai_vision > 0 else '无'}, BaseURL: {custom_ai_vision_base_url if custom_ai_vision_base_url else '服务商默认'}) 识别 {len(bubble_coords)} 个气泡...")
-            
+            logger.info(f"开始使用 AI视觉OCR ({ai_vision_provider}/{ai_vision_model_name}, rpm: {rpm_limit_ai_vision if rpm_limit_ai_vision > 0 else '无'}, BaseURL: {custom_ai_vision_base_url if custom_ai_vision_base_url else '服务商默认'}, 整页模式: {'是' if ai_vision_page_mode else '否'}) 识别 {len(bubble_coords)} 个气泡...")
+            vision_options = dict(provider=ai_vision_provider, api_key=ai_vision_api_key, model_name=ai_vision_model_name,
+                                  custom_base_url=custom_ai_vision_base_url, rpm_limit=rpm_limit_ai_vision)
+
             # 根据是否使用JSON格式，选择合适的提示词
             current_ai_vision_ocr_prompt = ai_vision_ocr_prompt
             if use_json_format_for_ai_vision:
@@ -276,70 +628,34 @@ def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan',
             elif not current_ai_vision_ocr_prompt: # 非JSON模式下，如果用户没提供，则使用默认非JSON提示词
                  current_ai_vision_ocr_prompt = constants.DEFAULT_AI_VISION_OCR_PROMPT
 
+            pending = list(range(len(bubble_coords)))
+            if ai_vision_page_mode and len(bubble_coords) > 1:
+                # 整页模式：整页图像只发送一次，失败或未通过校验的气泡再逐个裁剪识别
+                page_texts = _recognize_page_with_ai_vision(
+                    image_pil, bubble_coords, source_language,
+                    ai_vision_ocr_prompt if not use_json_format_for_ai_vision else None, vision_options)
+                for i, text in page_texts.items():
+                    recognized_texts[i] = text
+                    logger.info(f"气泡 {i} 识别文本 (整页): '{text}'")
+                pending = [i for i in pending if i not in page_texts]
+                if pending:
+                    logger.info(f"整页识别缺少 {len(pending)} 个气泡的结果，改为逐个裁剪识别。")
+
             try:
-                for i, (x1, y1, x2, y2) in enumerate(bubble_coords):
-                    try:
-                        # 裁剪气泡图像
-                        bubble_img_np = img_np[y1:y2, x1:x2]
-                        bubble_img_pil = Image.fromarray(bubble_img_np)
-                        
-                        # 保存调试图像
-                        try:
-                            debug_dir = get_debug_dir("ocr_bubbles")
-                            bubble_img_pil.save(os.path.join(debug_dir, f"bubble_{i}_{source_language}_ai_vision.png"))
-                        except Exception as save_e:
-                            logger.warning(f"保存 AI视觉OCR 调试气泡图像失败: {save_e}")
-                        
-                        # --- rpm Enforcement for AI Vision OCR ---
-                        _enforce_rpm_limit(
-                            rpm_limit_ai_vision,
-                            f"AI Vision OCR ({ai_vision_provider})",
-                            _ai_vision_ocr_rpm_last_reset_time_container,
-                            _ai_vision_ocr_rpm_request_count_container
-                        )
-                        # -----------------------------------------
-                        
-                        logger.info(f"处理气泡 {i} (AI视觉OCR)...")
-                        ocr_result_raw = call_ai_vision_ocr_service(
-                            bubble_img_pil,
-                            provider=ai_vision_provider,
-                            api_key=ai_vision_api_key,
-                            model_name=ai_vision_model_name,
-                            prompt=current_ai_vision_ocr_prompt,
-                            custom_base_url=custom_ai_vision_base_url
-                        )
-                        
-                        extracted_text_final = ""
-                        if ocr_result_raw:
-                            if use_json_format_for_ai_vision:
-                                try:
-                                    # 使用新的安全提取方法
-                                    extracted_text = _safely_extract_from_json(ocr_result_raw, "extracted_text")
-                                    extracted_text_final = extracted_text
-                                    logger.info(f"气泡 {i} 成功从JSON响应中提取OCR文本。")
-                                except Exception as e:
-                                    logger.warning(f"气泡 {i} AI视觉OCR无法将结果解析为JSON，将尝试提取文本。原始响应: {ocr_result_raw}")
-                                    # 失败时也使用安全提取尝试获取文本
-                                    extracted_text = _safely_extract_from_json(ocr_result_raw, "extracted_text")
-                                    extracted_text_final = extracted_text
-                            else:
-                                extracted_text_final = ocr_result_raw # 非JSON模式直接使用结果
-                        
-                        recognized_texts[i] = extracted_text_final
-                        
-                        # 输出识别文本到日志
-                        if recognized_texts[i]:
-                            logger.info(f"气泡 {i} 识别文本: '{recognized_texts[i]}'")
-                        else:
-                            logger.info(f"气泡 {i} 未识别出文本")
-                        
-                        # 添加请求间隔，避免API限制
-                        if i < len(bubble_coords) - 1:  # 如果不是最后一个气泡
-                            time.sleep(0.5)  # 延迟500毫秒
-                            
-                    except Exception as e_bubble:
-                        logger.error(f"处理气泡 {i} (AI视觉OCR) 时出错: {e_bubble}", exc_info=True)
-                        recognized_texts[i] = ""
+                # 逐个裁剪识别的请求并发发出，请求间隔由 rpm 限流 (或自适应限流) 控制
+                def recognize_crop(i):
+                    return _recognize_crop_with_ai_vision(
+                        img_np, bubble_coords[i], i, source_language, current_ai_vision_ocr_prompt,
+                        use_json_format_for_ai_vision, vision_options)
+
+                workers = min(constants.AI_VISION_OCR_CONCURRENCY, len(pending))
+                if workers > 1:
+                    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision-ocr") as executor:
+                        for i, text in zip(pending, executor.map(recognize_crop, pending)):
+                            recognized_texts[i] = text
+                else:
+                    for i in pending:
+                        recognized_texts[i] = recognize_crop(i)
                 logger.info("AI视觉OCR 识别完成。")
             except Exception as e_loop:
                 logger.error(f"AI视觉OCR 处理循环中发生错误: {e_loop}", exc_info=True)
@@ -348,6 +664,9 @@ def recognize_text_in_bubbles(image_pil, bubble_coords, source_language='japan',
     else:
          logger.error(f"未知的 OCR 引擎类型: {ocr_engine_type}")
 
+    # --- 写入 OCR 缓存 ---
+    if crop_keys:
+        _store_ocr_results(ocr_cache, ocr_engine_type, source_language, crop_keys, recognized_texts)
 
     return recognized_texts
 
@@ -0,0 +1,169 @@
+"""
+按气泡裁剪图缓存的 OCR 结果。
+
+阶段缓存中的 OCR 结果以整页 (所有气泡裁剪区域) 为键，只要有一个气泡不同就整页未命中。
+这里改为每个裁剪图一条记录，键由 (裁剪图像素哈希, 引擎, 语言, 引擎参数) 决定：
+更换翻译服务或提示词后重新翻译整章、或只修改一页后重新 "翻译所有"，相同的裁剪图都不再重新识别，
+跨页面与跨会话都能命中。
+
+记录保存在 SQLite (data/ocr_cache.db)，每页只做一次批量查询；
+总大小 (键 + 文本的字节数) 超过 OCR_CACHE_MAX_BYTES 时按最近使用时间淘汰最旧的记录。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from src.shared import constants
+from src.shared.path_helpers import resource_path
+
+logger = logging.getLogger("CoreOCRCache")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS crops (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    engine TEXT,
+    language TEXT,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_crops_last_used ON crops (last_used);
+"""
+
+_ENTRY_OVERHEAD_BYTES = 64 # 每条记录除键和文本之外的估算开销
+_QUERY_CHUNK = 500         # 单条 SQL 中 IN (...) 的最大参数个数 (低于 SQLite 的默认上限)
+
+
+def _entry_size(key, text):
+    return len(key) + len(text.encode('utf-8')) + _ENTRY_OVERHEAD_BYTES
+
+
+class OcrCache:
+    """
+    SQLite OCR 结果缓存。线程安全 (单连接 + 锁)，可在流水线的多个工作线程之间共享。
+    """
+    def __init__(self, db_path, max_bytes):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM crops").fetchone()
+        self._total_bytes = total
+        logger.info(f"OCR 缓存已加载: {count} 条记录, {total / (1024 * 1024):.1f} MB (上限 {max_bytes / (1024 * 1024):.0f} MB)")
+
+    def get_many(self, keys):
+        """
+        批量查询。
+
+        Returns:
+            dict: {键: 识别文本}，只包含命中的键。
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(unique_keys), _QUERY_CHUNK):
+                chunk = unique_keys[start:start + _QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, text FROM crops WHERE key IN ({placeholders})", chunk).fetchall())
+            if found:
+                # 更新最近使用时间，决定淘汰顺序
+                self._conn.executemany("UPDATE crops SET last_used = ? WHERE key = ?",
+                                       [(time.time(), key) for key in found])
+                self._conn.commit()
+            self._stats['hits'] += sum(1 for key in keys if key in found)
+            self._stats['misses'] += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, entries, engine=None, language=None):
+        """批量写入 {键: 识别文本}，超过容量上限时淘汰最久未使用的记录。"""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            for key, text in entries.items():
+                row = self._conn.execute("SELECT size FROM crops WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._total_bytes -= row[0]
+                size = _entry_size(key, text)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO crops (key, text, engine, language, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, text, engine, language, size, now))
+                self._total_bytes += size
+            self._stats['stores'] += len(entries)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """超出上限时按最近使用时间删除最旧的记录，直到回落到上限的 90%。调用方需持有锁。"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        while self._total_bytes > target:
+            rows = self._conn.execute("SELECT key, size FROM crops ORDER BY last_used LIMIT ?", (_QUERY_CHUNK,)).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            evicted = []
+            for key, size in rows:
+                if self._total_bytes <= target:
+                    break
+                evicted.append((key,))
+                self._total_bytes -= size
+            self._conn.executemany("DELETE FROM crops WHERE key = ?", evicted)
+            self._stats['evictions'] += len(evicted)
+        logger.debug(f"OCR 缓存淘汰后占用 {self._total_bytes / (1024 * 1024):.1f} MB")
+
+    def get_stats(self):
+        """返回记录数、占用、命中率与淘汰次数。"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM crops").fetchone()[0]
+            stats = dict(self._stats)
+            total_bytes = self._total_bytes
+        lookups = stats['hits'] + stats['misses']
+        return dict(
+            stats,
+            enabled=constants.OCR_CACHE_ENABLED,
+            entries=entries,
+            total_bytes=total_bytes,
+            max_bytes=self.max_bytes,
+            hit_rate=round(stats['hits'] / lookups, 4) if lookups else 0.0
+        )
+
+    def clear(self):
+        """删除所有记录 (保留命中统计)。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM crops")
+            self._conn.commit()
+            self._total_bytes = 0
+        logger.info("OCR 缓存已清空。")
+
+
+# --- 单例 ---
+_ocr_cache_instance = None
+_ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """获取 OCR 缓存单例。被禁用或初始化失败时返回 None，调用方应直接识别。"""
+    global _ocr_cache_instance
+    if not constants.OCR_CACHE_ENABLED:
+        return None
+    if _ocr_cache_instance is None:
+        with _ocr_cache_lock:
+            if _ocr_cache_instance is None:
+                try:
+                    db_path = resource_path(os.path.join('data', 'ocr_cache.db'))
+                    _ocr_cache_instance = OcrCache(db_path, constants.OCR_CACHE_MAX_BYTES)
+                except Exception as e:
+                    logger.error(f"初始化 OCR 缓存失败，将不使用缓存: {e}", exc_info=True)
+                    return None
+    return _ocr_cache_instance
@@ -11,9 +11,14 @@ from src.plugins.hooks import *
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from src.core.detection import get_bubble_coordinates
-from src.core.ocr import recognize_text_in_bubbles
-from src.core.translation import translate_text_list
+from src.core.ocr import recognize_text_in_bubbles, recognize_and_translate_page_with_ai_vision
+from src.core.translation import (
+    translate_text_list, translate_dual_text_list, supports_dual_prompt,
+    translate_packed_pages, translate_packed_dual_pages, supports_packed_translation
+)
 from src.core.inpainting import inpaint_bubbles
+from src.core.stage_graph import StageGraph
+from src.core.progress import ProcessingCancelled
 from src.core.rendering import render_all_bubbles, calculate_auto_font_size, get_font # 需要渲染和计算函数
 
 # 导入共享模块
@@ -65,12 +70,21 @@ def process_image_translation(
     rpm_limit_ai_vision_ocr: int = constants.DEFAULT_rpm_AI_VISION_OCR,
     # VVVVVV 新增参数 VVVVVV
     custom_ai_vision_base_url=None, # 用于AI视觉OCR的自定义Base URL
+    ai_vision_page_mode=constants.DEFAULT_AI_VISION_PAGE_MODE, # AI视觉OCR整页识别，一页只请求一次
     # === 新增描边参数 START ===
     enable_text_stroke=constants.DEFAULT_TEXT_STROKE_ENABLED,
     text_stroke_color=constants.DEFAULT_TEXT_STROKE_COLOR,
-    text_stroke_width=constants.DEFAULT_TEXT_STROKE_WIDTH
+    text_stroke_width=constants.DEFAULT_TEXT_STROKE_WIDTH,
     # === 新增描边参数 END ===
     # ^^^^^^ 结束新增 ^^^^^^
+    use_dual_prompt_translation=constants.DEFAULT_DUAL_PROMPT_TRANSLATION, # 一次请求同时获取气泡和文本框译文
+    use_packed_translation=constants.DEFAULT_PACKED_TRANSLATION, # 多个气泡按 token 预算合并为一次请求
+    packed_translation_token_budget=constants.PACKED_TRANSLATION_TOKEN_BUDGET,
+    use_streaming_translation=constants.DEFAULT_STREAMING_TRANSLATION, # 打包翻译流式接收，逐段上报译文
+    use_translation_memory=True, # 翻译前先查询翻译记忆
+    translation_fallback_routes=None, # 备用翻译线路，用于对冲请求与故障转移
+    use_fused_ocr_translation=constants.DEFAULT_FUSED_OCR_TRANSLATION, # AI视觉OCR与翻译同一服务商时合并为一次请求
+    progress=None # 可选的 ProgressReporter，用于上报进度和响应取消
     ):
     """
     执行完整的图像翻译处理流程。
@@ -86,6 +100,21 @@ def process_image_translation(
         baidu_secret_key (str): 百度OCR Secret Key，仅当 ocr_engine 为 'baidu_ocr' 时使用。
         baidu_version (str): 百度OCR版本，'standard'(标准版)或'high_precision'(高精度版)。
         custom_base_url (str, optional): 用户自定义的 OpenAI 兼容 API 的 Base URL (用于翻译)。
+        ai_vision_page_mode (bool): AI视觉OCR时整页图像 (标注气泡编号) 只请求一次，
+            缺失或未通过校验的气泡再逐个裁剪识别。
+        use_dual_prompt_translation (bool): 启用文本框提示词时，对支持的服务商每段文本只请求一次，
+            从 JSON 响应中同时取得气泡译文和文本框译文；不支持的服务商仍分别请求。
+        use_packed_translation (bool): 对话式大模型服务商把本页所有气泡打包为少量请求翻译，
+            每个请求的原文与译文估计不超过 packed_translation_token_budget 个 token。
+        use_streaming_translation (bool): 打包翻译以流式方式接收回复，每段译文一解析出来就上报进度，
+            不必等整个请求结束。
+        use_translation_memory (bool): 翻译前先查询翻译记忆 (精确/模糊匹配)，命中的文本不再请求翻译服务。
+        translation_fallback_routes (list, optional): 备用翻译线路，每项为包含 model_provider、api_key、model_name、
+            custom_base_url、rpm_limit_translation 的字典。逐段翻译时主服务商超过 p95 延迟会向备用线路发出对冲请求，
+            出错时依次故障转移 (合并翻译与打包翻译不使用备用线路)。
+        use_fused_ocr_translation (bool): OCR 引擎为 AI视觉OCR 且翻译服务商与视觉服务商为同一家时，
+            整页图像只请求一次，视觉模型同时返回每个气泡的原文与译文；启用文本框提示词时不合并。
+        progress (ProgressReporter, optional): 进度上报器。被取消时抛出 ProcessingCancelled。
 
     Returns:
         tuple: (
@@ -98,340 +127,754 @@ def process_image_translation(
         )
         如果处理失败，processed_image 将是原始图像的副本。
     """
+    # 将所有参数打包成字典，既传递给插件钩子，也作为各阶段读取参数的唯一来源
+    initial_params = locals().copy()
+    initial_params.pop('image_pil', None)
+    initial_params.pop('progress', None) # 进度上报器不属于处理参数，不传给插件
+
     logger.info(f"开始处理图像翻译流程: 源={source_language}, 目标={target_language}, 修复={inpainting_method}")
-    start_time_total = time.time() # 记录总时间
+    page = PageState(image_pil, initial_params, progress=progress)
+    run_before_processing(page)
+
+    try:
+        run_detection_stage(page)
+        if not page.bubble_coords:
+            logger.info("未检测到气泡，处理结束。")
+            # 返回原图和空列表/字典
+            return page.original_image.copy(), [], [], [], [], {}
+
+        if can_overlap_inpainting(page):
+            run_overlapped_stages(page)
+        else:
+            run_text_stages(page)
+            run_inpainting_stage(page)
+        run_rendering_stage(page)
+        return finalize_page(page)
+
+    except ProcessingCancelled:
+        logger.info("图像翻译流程已被取消。")
+        raise
+    except Exception as e:
+        logger.error(f"图像翻译处理流程中发生严重错误: {e}", exc_info=True)
+        # 返回原始图像副本和空数据
+        return page.original_image.copy(), [], [], [], [], {}
 
-    original_image_copy = image_pil.copy() # 保留原始副本以备失败时返回
 
-    # 获取插件管理器实例
-    plugin_mgr = get_plugin_manager()
+class PageState:
+    """
+    单页翻译流程在各阶段之间传递的状态。
 
-    # --- 触发 BEFORE_PROCESSING 钩子 ---
+    process_image_translation 顺序执行各阶段；章节流水线 (chapter_pipeline)
+    则在不同线程中执行不同阶段，各阶段之间只通过该对象交换数据。
+    """
+    def __init__(self, image_pil, params, progress=None):
+        self.image = image_pil
+        self.original_image = image_pil.copy() # 保留原始副本以备失败时返回
+        self.params = params
+        self.progress = progress # 可选的 ProgressReporter
+        self.start_time = time.time()
+        self.bubble_coords = []
+        self.original_texts = []
+        self.translated_bubble_texts = []
+        self.translated_textbox_texts = []
+        self.inpainted_image = None
+        self.clean_background = None
+        self.bubble_styles = {}
+        self.processed_image = None
+
+    def enter_stage(self, stage, total=0):
+        """进入新阶段前检查取消标志并上报阶段。"""
+        if self.progress:
+            self.progress.check_cancelled()
+            self.progress.set_stage(stage, total)
+
+    def advance(self, count=1, **data):
+        """上报当前阶段完成的条目数。"""
+        if self.progress:
+            self.progress.advance(count, **data)
+
+    def emit(self, event_type, **data):
+        """上报阶段的中间结果 (坐标、原文、译文)，供前端提前展示。"""
+        if self.progress:
+            self.progress.emit(event_type, **data)
+
+
+def run_before_processing(page):
+    """触发 BEFORE_PROCESSING 钩子，插件可替换图像和参数。"""
+    plugin_mgr = get_plugin_manager()
     try:
-        # 将所有参数打包成字典传递给钩子
-        initial_params = locals().copy() # 获取当前函数所有局部变量
-        # 移除不应传递给插件的变量 (例如 image_pil 单独传递)
-        initial_params.pop('image_pil', None)
-        initial_params.pop('original_image_copy', None)
-        initial_params.pop('start_time_total', None)
-        initial_params.pop('plugin_mgr', None) # 移除管理器自身
-
-        hook_result = plugin_mgr.trigger_hook(BEFORE_PROCESSING, image_pil, initial_params)
+        hook_result = plugin_mgr.trigger_hook(BEFORE_PROCESSING, page.image, page.params)
         if hook_result: # 如果插件返回了修改后的数据
-            image_pil, initial_params = hook_result # 解包
-            # 将修改后的参数更新回函数局部变量 (需要小心处理)
-            # 例如: target_language = initial_params.get('target_language', target_language)
-            # 这里简化处理，假设插件主要修改 params 字典本身
+            page.image, page.params = hook_result # 解包
             logger.info("BEFORE_PROCESSING 钩子修改了参数/图像。")
-            # 更新局部变量 (根据需要选择性更新)
-            target_language = initial_params.get('target_language', target_language)
-            source_language = initial_params.get('source_language', source_language)
-            # ... 其他需要更新的参数 ...
     except Exception as hook_e:
          logger.error(f"执行 {BEFORE_PROCESSING} 钩子时出错: {hook_e}", exc_info=True)
-    # ------------------------------------
+
+
+def run_detection_stage(page):
+    """步骤 1: 检测气泡坐标 (优先使用前端提供的坐标)，并触发 AFTER_DETECTION 钩子。"""
+    params = page.params
+    plugin_mgr = get_plugin_manager()
+    page.enter_stage('detection')
+    provided_coords = params.get('provided_coords')
+    if provided_coords and isinstance(provided_coords, list) and len(provided_coords) > 0:
+        page.bubble_coords = provided_coords
+        logger.info(f"使用前端提供的手动标注框，共 {len(page.bubble_coords)} 个")
+    else:
+        logger.info("步骤 1: 检测气泡坐标...")
+        start_time = time.time()
+        page.bubble_coords = get_bubble_coordinates(page.image, conf_threshold=params.get('yolo_conf_threshold', 0.6))
+        logger.info(f"气泡检测完成，找到 {len(page.bubble_coords)} 个气泡 (耗时: {time.time() - start_time:.2f}s)")
 
     try:
-        # 1. 检测气泡坐标
-        # --- 新增：优先使用前端提供的坐标 ---
-        if provided_coords and isinstance(provided_coords, list) and len(provided_coords) > 0:
-            bubble_coords = provided_coords
-            logger.info(f"使用前端提供的手动标注框，共 {len(bubble_coords)} 个")
+        hook_result = plugin_mgr.trigger_hook(AFTER_DETECTION, page.image, page.bubble_coords, params)
+        if hook_result and isinstance(hook_result[0], list): # 钩子应返回包含列表的元组
+            page.bubble_coords = hook_result[0] # 更新坐标
+            logger.info("AFTER_DETECTION 钩子修改了气泡坐标。")
+    except Exception as hook_e:
+        logger.error(f"执行 {AFTER_DETECTION} 钩子时出错: {hook_e}", exc_info=True)
+    page.emit('detection', bubble_coords=[list(coord) for coord in page.bubble_coords])
+
+
+def _prepare_ocr(page):
+    """
+    进入 OCR 阶段并触发 BEFORE_OCR 钩子。
+
+    Returns:
+        bool: 是否需要识别 (跳过 OCR 时为 False，并填入空文本占位)。
+    """
+    bubble_coords = page.bubble_coords
+    page.enter_stage('ocr', len(bubble_coords))
+    if page.params.get('skip_ocr'):
+        logger.info("步骤 2: 跳过 OCR。")
+        page.original_texts = [""] * len(bubble_coords) # 创建占位符
+        return False
+
+    try:
+         get_plugin_manager().trigger_hook(BEFORE_OCR, page.image, bubble_coords, page.params)
+    except Exception as hook_e:
+         logger.error(f"执行 {BEFORE_OCR} 钩子时出错: {hook_e}", exc_info=True)
+    return True
+
+
+def _finish_ocr(page, original_texts):
+    """触发 AFTER_OCR 钩子，保存并上报本页原文。"""
+    try:
+        hook_result = get_plugin_manager().trigger_hook(AFTER_OCR, page.image, original_texts, page.bubble_coords, page.params)
+        if hook_result and isinstance(hook_result[0], list):
+            original_texts = hook_result[0] # 更新识别文本
+            logger.info("AFTER_OCR 钩子修改了识别文本。")
+    except Exception as hook_e:
+        logger.error(f"执行 {AFTER_OCR} 钩子时出错: {hook_e}", exc_info=True)
+    page.original_texts = original_texts
+    page.advance(len(page.bubble_coords))
+    page.emit('ocr', original_texts=list(original_texts))
+
+
+def _ai_vision_options(params):
+    """AI视觉OCR 的服务商、凭证、提示词与 rpm 参数 (recognize_text_in_bubbles 的关键字参数)。"""
+    return dict(
+        ai_vision_provider=params.get('ai_vision_provider'),
+        ai_vision_api_key=params.get('ai_vision_api_key'),
+        ai_vision_model_name=params.get('ai_vision_model_name'),
+        ai_vision_ocr_prompt=params.get('ai_vision_ocr_prompt'),
+        custom_ai_vision_base_url=params.get('custom_ai_vision_base_url'),
+        rpm_limit_ai_vision=params.get('rpm_limit_ai_vision_ocr', constants.DEFAULT_rpm_AI_VISION_OCR)
+    )
+
+
+def _recognize_with_ai_vision(page, bubble_coords):
+    """使用 AI视觉OCR 识别指定气泡。"""
+    params = page.params
+    return recognize_text_in_bubbles(
+        page.image,
+        bubble_coords,
+        params.get('source_language', constants.DEFAULT_SOURCE_LANG),
+        constants.AI_VISION_OCR_ENGINE_ID,
+        use_json_format_for_ai_vision=params.get('use_json_format_ai_vision_ocr', False),
+        ai_vision_page_mode=params.get('ai_vision_page_mode', constants.DEFAULT_AI_VISION_PAGE_MODE),
+        **_ai_vision_options(params)
+    )
+
+
+def run_ocr_stage(page):
+    """步骤 2: OCR 识别文本，前后触发 BEFORE_OCR / AFTER_OCR 钩子。"""
+    if not _prepare_ocr(page):
+        return
+    params = page.params
+    bubble_coords = page.bubble_coords
+    logger.info("步骤 2: OCR 识别文本...")
+    start_time = time.time()
+
+    ocr_engine = params.get('ocr_engine', 'auto')
+    source_language = params.get('source_language', constants.DEFAULT_SOURCE_LANG)
+    # 如果使用百度OCR，传递相关参数
+    if ocr_engine == 'baidu_ocr':
+        logger.info(f"使用百度OCR ({params.get('baidu_version')}) 识别文本...")
+        original_texts = recognize_text_in_bubbles(
+            page.image,
+            bubble_coords,
+            source_language,
+            ocr_engine,
+            baidu_api_key=params.get('baidu_api_key'),
+            baidu_secret_key=params.get('baidu_secret_key'),
+            baidu_version=params.get('baidu_version', 'standard')
+        )
+    elif ocr_engine == constants.AI_VISION_OCR_ENGINE_ID:
+        logger.info(f"使用AI视觉OCR ({params.get('ai_vision_provider')}/{params.get('ai_vision_model_name')}) 识别文本...")
+        original_texts = _recognize_with_ai_vision(page, bubble_coords)
+    else:
+        # 使用其他OCR引擎
+        original_texts = recognize_text_in_bubbles(page.image, bubble_coords, source_language, ocr_engine)
+
+    logger.info(f"OCR 完成 (耗时: {time.time() - start_time:.2f}s)")
+    _finish_ocr(page, original_texts)
+
+
+def _prepare_translation(page):
+    """
+    初始化译文列表、进入翻译阶段并触发 BEFORE_TRANSLATION 钩子。
+
+    Returns:
+        bool: 是否需要翻译 (跳过翻译时为 False)。
+    """
+    plugin_mgr = get_plugin_manager()
+    page.translated_bubble_texts = [""] * len(page.bubble_coords)
+    page.translated_textbox_texts = [""] * len(page.bubble_coords)
+    page.enter_stage('translation', len(page.bubble_coords))
+    if page.params.get('skip_translation'):
+        logger.info("步骤 3: 跳过翻译。")
+        # 如果跳过翻译，两个列表都为空字符串
+        return False
+
+    original_texts = page.original_texts
+    try:
+        hook_result = plugin_mgr.trigger_hook(BEFORE_TRANSLATION, original_texts, page.params)
+        if hook_result:
+             original_texts, page.params = hook_result # 更新待翻译文本和参数
+             logger.info("BEFORE_TRANSLATION 钩子修改了文本或参数。")
+    except Exception as hook_e:
+         logger.error(f"执行 {BEFORE_TRANSLATION} 钩子时出错: {hook_e}", exc_info=True)
+    page.original_texts = original_texts
+
+    params = page.params
+    logger.info("步骤 3: 翻译文本...")
+    logger.info(f"翻译模型: {params.get('model_provider', constants.DEFAULT_MODEL_PROVIDER)}, 模型名称: {params.get('model_name')}")
+    logger.info(f"待翻译文本数量: {len(original_texts)}")
+    for i, text in enumerate(original_texts):
+        if text:
+            logger.info(f"待翻译文本 {i}: '{text}'")
+    return True
+
+
+def _finish_translation(page, translated_bubble_texts, translated_textbox_texts):
+    """触发 AFTER_TRANSLATION 钩子，保存并上报本页译文。"""
+    try:
+        hook_result = get_plugin_manager().trigger_hook(AFTER_TRANSLATION, translated_bubble_texts, translated_textbox_texts, page.original_texts, page.params)
+        if hook_result and len(hook_result) >= 2 and isinstance(hook_result[0], list) and isinstance(hook_result[1], list):
+             translated_bubble_texts, translated_textbox_texts = hook_result[:2] # 只取前两个元素，更新翻译结果
+             logger.info("AFTER_TRANSLATION 钩子修改了翻译结果。")
+    except Exception as hook_e:
+         logger.error(f"执行 {AFTER_TRANSLATION} 钩子时出错: {hook_e}", exc_info=True)
+    page.translated_bubble_texts = translated_bubble_texts
+    page.translated_textbox_texts = translated_textbox_texts
+    page.emit('translation', bubble_texts=list(translated_bubble_texts), textbox_texts=list(translated_textbox_texts))
+
+
+def _translation_error_result(page, error):
+    """翻译出错时的处理：允许忽略错误则以原文代替译文，否则重新抛出异常。"""
+    logger.error(f"翻译过程发生错误: {error}", exc_info=True)
+    if not page.params.get('ignore_connection_errors', True):
+        # 如果不忽略错误，重新抛出异常
+        raise error
+    logger.warning(f"翻译服务出错，使用空翻译结果: {error}")
+    # 使用原文复制代替翻译结果，或者在需要时保持空字符串
+    original_texts = page.original_texts
+    translated_bubble_texts = original_texts.copy() if original_texts else [""] * len(page.bubble_coords)
+    return translated_bubble_texts, translated_bubble_texts
+
+
+def _translation_options(params):
+    """解析本页使用的翻译方式: (是否使用文本框提示词, 是否合并双提示词, 是否打包翻译)。"""
+    model_provider = params.get('model_provider', constants.DEFAULT_MODEL_PROVIDER)
+    use_textbox_prompt = bool(params.get('use_textbox_prompt') and params.get('textbox_prompt_content'))
+    use_dual_prompt = (use_textbox_prompt
+                       and params.get('use_dual_prompt_translation', constants.DEFAULT_DUAL_PROMPT_TRANSLATION)
+                       and supports_dual_prompt(model_provider))
+    use_packed = bool(params.get('use_packed_translation', constants.DEFAULT_PACKED_TRANSLATION)
+                      and supports_packed_translation(model_provider))
+    return use_textbox_prompt, use_dual_prompt, use_packed
+
+
+def _translate_page_texts(page):
+    """
+    按本页参数选择翻译方式 (打包 / 双提示词合并 / 分别请求) 翻译本页文本。
+
+    Returns:
+        tuple: (translated_bubble_texts, translated_textbox_texts)
+    """
+    params = page.params
+    use_textbox_prompt, use_dual_prompt, use_packed = _translation_options(params)
+    if use_packed:
+        # 本页所有气泡按 token 预算打包为少量请求
+        return _translate_pages_packed([page])[0]
+    if use_dual_prompt:
+        # 气泡译文与文本框译文合并为一次请求
+        logger.info(f"调用 translate_dual_text_list 开始 - 模型: {params.get('model_provider')}, 模型名: {params.get('model_name')}")
+        return translate_dual_text_list(
+            page.original_texts, params.get('target_language', constants.DEFAULT_TARGET_LANG),
+            params.get('model_provider', constants.DEFAULT_MODEL_PROVIDER), params.get('api_key'), params.get('model_name'),
+            bubble_prompt=params.get('prompt_content'),
+            textbox_prompt=params.get('textbox_prompt_content'),
+            custom_base_url=params.get('custom_base_url'),
+            rpm_limit_translation=params.get('rpm_limit_translation', constants.DEFAULT_rpm_TRANSLATION),
+            progress=page.progress,
+            **_translation_memory_options(params)
+        )
+    return _translate_separately(page, page.original_texts, use_textbox_prompt)
+
+
+def run_translation_stage(page):
+    """步骤 3: 翻译文本，前后触发 BEFORE_TRANSLATION / AFTER_TRANSLATION 钩子。"""
+    if not _prepare_translation(page):
+        return
+
+    start_time = time.time()
+    try:
+        translated_bubble_texts, translated_textbox_texts = _translate_page_texts(page)
+        logger.info(f"翻译完成 (耗时: {time.time() - start_time:.2f}s)")
+    except ProcessingCancelled:
+        raise
+    except Exception as e:
+        translated_bubble_texts, translated_textbox_texts = _translation_error_result(page, e)
+    _finish_translation(page, translated_bubble_texts, translated_textbox_texts)
+
+
+def _translation_memory_options(params):
+    """翻译记忆相关的关键字参数 (源语言是记忆作用域的一部分)。"""
+    return dict(source_language=params.get('source_language'),
+                use_translation_memory=params.get('use_translation_memory', True))
+
+
+def _packing_group_key(params):
+    """参数相同的页才能合并到同一批请求中 (插件钩子可能按页修改参数)。"""
+    return tuple(str(params.get(name)) for name in (
+        'model_provider', 'model_name', 'api_key', 'custom_base_url', 'target_language',
+        'prompt_content', 'use_textbox_prompt', 'textbox_prompt_content', 'use_dual_prompt_translation',
+        'use_json_format_translation', 'rpm_limit_translation', 'packed_translation_token_budget', 'use_streaming_translation',
+        'source_language', 'use_translation_memory'
+    ))
+
+
+def run_packed_translation_stage(pages):
+    """
+    对多页执行翻译阶段，参数相同的页的文本打包到同一批请求中 (用于章节流水线)。
+    每页仍各自触发 BEFORE_TRANSLATION / AFTER_TRANSLATION 钩子；未启用打包翻译的页逐页翻译。
+    """
+    groups = {}
+    for page in pages:
+        if not _prepare_translation(page):
+            continue
+        if not _translation_options(page.params)[2]:
+            groups.setdefault(('single', id(page)), []).append(page)
         else:
-            # 原有的自动检测逻辑
-            logger.info("步骤 1: 检测气泡坐标...")
-            start_time = time.time()
-            bubble_coords = get_bubble_coordinates(image_pil, conf_threshold=yolo_conf_threshold)
-            logger.info(f"气泡检测完成，找到 {len(bubble_coords)} 个气泡 (耗时: {time.time() - start_time:.2f}s)")
-        # ------------------------------------
-        
-        # --- 触发 AFTER_DETECTION 钩子 ---
+            groups.setdefault(_packing_group_key(page.params), []).append(page)
+
+    for key, group in groups.items():
+        start_time = time.time()
         try:
-            hook_result = plugin_mgr.trigger_hook(AFTER_DETECTION, image_pil, bubble_coords, initial_params)
-            if hook_result and isinstance(hook_result[0], list): # 钩子应返回包含列表的元组
-                bubble_coords = hook_result[0] # 更新坐标
-                logger.info("AFTER_DETECTION 钩子修改了气泡坐标。")
-        except Exception as hook_e:
-            logger.error(f"执行 {AFTER_DETECTION} 钩子时出错: {hook_e}", exc_info=True)
-        # ---------------------------------
-
-        if not bubble_coords:
-             logger.info("未检测到气泡，处理结束。")
-             # 返回原图和空列表/字典
-             return original_image_copy, [], [], [], [], {}
-
-        # 2. OCR 识别文本
-        original_texts = []
-        if not skip_ocr:
-            # --- 触发 BEFORE_OCR 钩子 ---
-            try:
-                 plugin_mgr.trigger_hook(BEFORE_OCR, image_pil, bubble_coords, initial_params)
-            except Exception as hook_e:
-                 logger.error(f"执行 {BEFORE_OCR} 钩子时出错: {hook_e}", exc_info=True)
-            # ---------------------------
-            logger.info("步骤 2: OCR 识别文本...")
-            start_time = time.time()
-            
-            # 如果使用百度OCR，传递相关参数
-            if ocr_engine == 'baidu_ocr':
-                logger.info(f"使用百度OCR ({baidu_version}) 识别文本...")
-                original_texts = recognize_text_in_bubbles(
-                    image_pil, 
-                    bubble_coords, 
-                    source_language, 
-                    ocr_engine,
-                    baidu_api_key=baidu_api_key,
-                    baidu_secret_key=baidu_secret_key,
-                    baidu_version=baidu_version
-                )
-            elif ocr_engine == constants.AI_VISION_OCR_ENGINE_ID:
-                logger.info(f"使用AI视觉OCR ({ai_vision_provider}/{ai_vision_model_name}) 识别文本...")
-                original_texts = recognize_text_in_bubbles(
-                    image_pil,
-                    bubble_coords,
-                    source_language,
-                    ocr_engine,
-                    ai_vision_provider=ai_vision_provider,
-                    ai_vision_api_key=ai_vision_api_key,
-                    ai_vision_model_name=ai_vision_model_name,
-                    ai_vision_ocr_prompt=ai_vision_ocr_prompt,
-                    custom_ai_vision_base_url=custom_ai_vision_base_url,
-                    use_json_format_for_ai_vision=use_json_format_ai_vision_ocr,
-                    rpm_limit_ai_vision=rpm_limit_ai_vision_ocr
-                )
+            if key[0] == 'single':
+                results = [_translate_page_texts(group[0])]
             else:
-                # 使用其他OCR引擎
-                original_texts = recognize_text_in_bubbles(image_pil, bubble_coords, source_language, ocr_engine)
-                
-            logger.info(f"OCR 完成 (耗时: {time.time() - start_time:.2f}s)")
-            # --- 触发 AFTER_OCR 钩子 ---
-            try:
-                hook_result = plugin_mgr.trigger_hook(AFTER_OCR, image_pil, original_texts, bubble_coords, initial_params)
-                if hook_result and isinstance(hook_result[0], list):
-                    original_texts = hook_result[0] # 更新识别文本
-                    logger.info("AFTER_OCR 钩子修改了识别文本。")
-            except Exception as hook_e:
-                logger.error(f"执行 {AFTER_OCR} 钩子时出错: {hook_e}", exc_info=True)
-            # -------------------------
-        else:
-            logger.info("步骤 2: 跳过 OCR。")
-            original_texts = [""] * len(bubble_coords) # 创建占位符
-
-        # 3. 翻译文本
-        translated_bubble_texts = [""] * len(bubble_coords)
-        translated_textbox_texts = [""] * len(bubble_coords)
-        if not skip_translation:
-            # --- 触发 BEFORE_TRANSLATION 钩子 ---
-            try:
-                hook_result = plugin_mgr.trigger_hook(BEFORE_TRANSLATION, original_texts, initial_params)
-                if hook_result:
-                     original_texts, initial_params = hook_result # 更新待翻译文本和参数
-                     logger.info("BEFORE_TRANSLATION 钩子修改了文本或参数。")
-                     # 可能需要更新函数局部变量，如 model_provider, api_key 等
-                     model_provider = initial_params.get('model_provider', model_provider)
-                     api_key = initial_params.get('api_key', api_key)
-                     model_name = initial_params.get('model_name', model_name)
-                     prompt_content = initial_params.get('prompt_content', prompt_content)
-                     textbox_prompt_content = initial_params.get('textbox_prompt_content', textbox_prompt_content)
-                     custom_base_url = initial_params.get('custom_base_url', custom_base_url)
-            except Exception as hook_e:
-                 logger.error(f"执行 {BEFORE_TRANSLATION} 钩子时出错: {hook_e}", exc_info=True)
-            # ------------------------------------
-            logger.info("步骤 3: 翻译文本...")
-            logger.info(f"翻译模型: {model_provider}, 模型名称: {model_name}")
-            logger.info(f"待翻译文本数量: {len(original_texts)}")
-            for i, text in enumerate(original_texts):
-                if text:
-                    logger.info(f"待翻译文本 {i}: '{text}'")
-                
-            start_time = time.time()
-            # 漫画气泡翻译
-            try:
-                logger.info(f"调用 translate_text_list 开始 - 模型: {model_provider}, 模型名: {model_name}, API密钥长度: {len(api_key) if api_key else 0}, 自定义BaseURL: {custom_base_url if custom_base_url else '无'}")
-                translated_bubble_texts = translate_text_list(
-                    original_texts, target_language, model_provider, api_key, model_name, prompt_content,
-                    use_json_format=use_json_format_translation,
-                    custom_base_url=custom_base_url,
-                    rpm_limit_translation=rpm_limit_translation # <--- 传递rpm参数
-                )
-                logger.info(f"translate_text_list 调用完成，返回结果数量: {len(translated_bubble_texts)}")
-                
-                # 输出翻译结果
-                logger.info("翻译结果:")
-                for i, text in enumerate(translated_bubble_texts):
-                    if text:
-                        logger.info(f"文本 {i} 翻译结果: '{text}'")
-                
-                # 文本框翻译 (如果启用)
-                if use_textbox_prompt and textbox_prompt_content:
-                    translated_textbox_texts = translate_text_list(
-                        original_texts, target_language, model_provider, api_key, model_name, textbox_prompt_content,
-                        use_json_format=False,
-                        custom_base_url=custom_base_url,
-                        rpm_limit_translation=rpm_limit_translation # <--- 传递rpm参数
-                    )
-                else:
-                    translated_textbox_texts = translated_bubble_texts
-                logger.info(f"翻译完成 (耗时: {time.time() - start_time:.2f}s)")
-                # --- 触发 AFTER_TRANSLATION 钩子 ---
-                try:
-                    hook_result = plugin_mgr.trigger_hook(AFTER_TRANSLATION, translated_bubble_texts, translated_textbox_texts, original_texts, initial_params)
-                    if hook_result and len(hook_result) >= 2 and isinstance(hook_result[0], list) and isinstance(hook_result[1], list):
-                         translated_bubble_texts, translated_textbox_texts = hook_result[:2] # 只取前两个元素，更新翻译结果
-                         logger.info("AFTER_TRANSLATION 钩子修改了翻译结果。")
-                except Exception as hook_e:
-                     logger.error(f"执行 {AFTER_TRANSLATION} 钩子时出错: {hook_e}", exc_info=True)
-                # ----------------------------------
-            except Exception as e:
-                logger.error(f"翻译过程发生错误: {e}", exc_info=True)
-                if ignore_connection_errors:
-                    logger.warning(f"翻译服务出错，使用空翻译结果: {e}")
-                    # 使用原文复制代替翻译结果，或者在需要时保持空字符串
-                    translated_bubble_texts = original_texts.copy() if original_texts else [""] * len(bubble_coords)
-                    translated_textbox_texts = translated_bubble_texts
-                else:
-                    # 如果不忽略错误，重新抛出异常
-                    raise
-        else:
-            logger.info("步骤 3: 跳过翻译。")
-            # 如果跳过翻译，两个列表都为空字符串
+                results = _translate_pages_packed(group)
+            logger.info(f"{len(group)} 页翻译完成 (耗时: {time.time() - start_time:.2f}s)")
+        except ProcessingCancelled:
+            raise
+        except Exception as e:
+            results = [_translation_error_result(page, e) for page in group]
+        for page, (translated_bubble_texts, translated_textbox_texts) in zip(group, results):
+            _finish_translation(page, translated_bubble_texts, translated_textbox_texts)
 
-        # 4. 修复/填充背景
-        # --- 触发 BEFORE_INPAINTING 钩子 ---
-        try:
-            plugin_mgr.trigger_hook(BEFORE_INPAINTING, image_pil, bubble_coords, initial_params)
-        except Exception as hook_e:
-            logger.error(f"执行 {BEFORE_INPAINTING} 钩子时出错: {hook_e}", exc_info=True)
-        # ---------------------------------
-        logger.info(f"步骤 4: 修复/填充背景 (方法: {inpainting_method})...")
-        start_time = time.time()
+
+def _translate_pages_packed(pages):
+    """
+    打包翻译参数相同的若干页。
+
+    Returns:
+        list: 每页一个 (translated_bubble_texts, translated_textbox_texts) 元组。
+    """
+    params = pages[0].params
+    use_textbox_prompt, use_dual_prompt, _ = _translation_options(params)
+    common = dict(
+        target_language=params.get('target_language', constants.DEFAULT_TARGET_LANG),
+        model_provider=params.get('model_provider', constants.DEFAULT_MODEL_PROVIDER),
+        api_key=params.get('api_key'),
+        model_name=params.get('model_name'),
+        custom_base_url=params.get('custom_base_url'),
+        rpm_limit_translation=params.get('rpm_limit_translation', constants.DEFAULT_rpm_TRANSLATION),
+        token_budget=params.get('packed_translation_token_budget') or constants.PACKED_TRANSLATION_TOKEN_BUDGET,
+        use_streaming=params.get('use_streaming_translation', constants.DEFAULT_STREAMING_TRANSLATION),
+        **_translation_memory_options(params)
+    )
+    pages_texts = [page.original_texts for page in pages]
+    progresses = [page.progress for page in pages]
+    logger.info(f"打包翻译 {len(pages)} 页 - 模型: {common['model_provider']}, 模型名: {common['model_name']}")
+
+    if use_dual_prompt:
+        return translate_packed_dual_pages(pages_texts, bubble_prompt=params.get('prompt_content'),
+                                           textbox_prompt=params.get('textbox_prompt_content'),
+                                           progresses=progresses, **common)
+
+    bubble_results = translate_packed_pages(pages_texts, prompt_content=params.get('prompt_content'),
+                                            use_json_format=params.get('use_json_format_translation', False),
+                                            progresses=progresses, **common)
+    if not use_textbox_prompt:
+        return [(texts, texts) for texts in bubble_results]
+    for page in pages:
+        page.enter_stage('textbox_translation', len(page.original_texts))
+    textbox_results = translate_packed_pages(pages_texts, prompt_content=params.get('textbox_prompt_content'),
+                                             progresses=progresses, **common)
+    return list(zip(bubble_results, textbox_results))
+
+
+def _translate_separately(page, original_texts, use_textbox_prompt):
+    """
+    分别请求气泡译文和 (启用时) 文本框译文。
+
+    Returns:
+        tuple: (translated_bubble_texts, translated_textbox_texts)
+    """
+    params = page.params
+    model_provider = params.get('model_provider', constants.DEFAULT_MODEL_PROVIDER)
+    model_name = params.get('model_name')
+    api_key = params.get('api_key')
+    custom_base_url = params.get('custom_base_url')
+    # 漫画气泡翻译
+    logger.info(f"调用 translate_text_list 开始 - 模型: {model_provider}, 模型名: {model_name}, API密钥长度: {len(api_key) if api_key else 0}, 自定义BaseURL: {custom_base_url if custom_base_url else '无'}")
+    translated_bubble_texts = translate_text_list(
+        original_texts, params.get('target_language', constants.DEFAULT_TARGET_LANG),
+        model_provider, api_key, model_name, params.get('prompt_content'),
+        use_json_format=params.get('use_json_format_translation', False),
+        custom_base_url=custom_base_url,
+        rpm_limit_translation=params.get('rpm_limit_translation', constants.DEFAULT_rpm_TRANSLATION),
+        progress=page.progress,
+        fallback_routes=params.get('translation_fallback_routes'),
+        **_translation_memory_options(params)
+    )
+    logger.info(f"translate_text_list 调用完成，返回结果数量: {len(translated_bubble_texts)}")
+
+    # 输出翻译结果
+    logger.info("翻译结果:")
+    for i, text in enumerate(translated_bubble_texts):
+        if text:
+            logger.info(f"文本 {i} 翻译结果: '{text}'")
+
+    # 文本框翻译 (如果启用)
+    if not use_textbox_prompt:
+        return translated_bubble_texts, translated_bubble_texts
+    page.enter_stage('textbox_translation', len(original_texts))
+    translated_textbox_texts = translate_text_list(
+        original_texts, params.get('target_language', constants.DEFAULT_TARGET_LANG),
+        model_provider, api_key, model_name, params.get('textbox_prompt_content'),
+        use_json_format=False,
+        custom_base_url=custom_base_url,
+        rpm_limit_translation=params.get('rpm_limit_translation', constants.DEFAULT_rpm_TRANSLATION),
+        progress=page.progress,
+        fallback_routes=params.get('translation_fallback_routes'),
+        **_translation_memory_options(params)
+    )
+    return translated_bubble_texts, translated_textbox_texts
+
+
+def can_fuse_ocr_translation(page):
+    """
+    判断本页能否使用 OCR+翻译 合并模式。
+
+    要求 OCR 引擎为 AI视觉OCR、翻译服务商与视觉服务商属于同一家 (见 FUSED_OCR_TRANSLATION_PROVIDERS)，
+    且未启用文本框提示词 (合并请求只返回一种译文)。
+    """
+    params = page.params
+    if not params.get('use_fused_ocr_translation', constants.DEFAULT_FUSED_OCR_TRANSLATION):
+        return False
+    if params.get('skip_ocr') or params.get('skip_translation'):
+        return False
+    if params.get('ocr_engine') != constants.AI_VISION_OCR_ENGINE_ID:
+        return False
+    vision_family = constants.FUSED_OCR_TRANSLATION_PROVIDERS.get(params.get('ai_vision_provider'))
+    if vision_family is None or vision_family != params.get('model_provider', constants.DEFAULT_MODEL_PROVIDER):
+        logger.info("AI视觉OCR 与翻译不是同一服务商，OCR 与翻译将分别请求。")
+        return False
+    if _translation_options(params)[0]:
+        logger.info("已启用文本框提示词，OCR 与翻译将分别请求。")
+        return False
+    return True
+
+
+def run_fused_ocr_translation_stage(page):
+    """
+    步骤 2+3 (合并模式): 视觉模型一次返回本页每个气泡的原文与译文。
+
+    结果拆分后依次触发 BEFORE_OCR / AFTER_OCR 与 BEFORE_TRANSLATION / AFTER_TRANSLATION 钩子，
+    钩子看到的参数与顺序和分别执行两个阶段时相同。合并请求中缺失原文的气泡按普通 AI视觉OCR 补识别；
+    缺失译文、或原文被钩子修改过的气泡按普通翻译流程补译。
+    """
+    if not _prepare_ocr(page):
+        return
+    params = page.params
+    bubble_coords = page.bubble_coords
+    logger.info(f"步骤 2+3: AI视觉OCR ({params.get('ai_vision_provider')}/{params.get('ai_vision_model_name')}) 同时识别并翻译...")
+    start_time = time.time()
+    fused = recognize_and_translate_page_with_ai_vision(
+        page.image, bubble_coords, params.get('source_language', constants.DEFAULT_SOURCE_LANG),
+        prompt_content=params.get('prompt_content'), **_ai_vision_options(params)
+    )
+    original_texts = [fused[i][0] if i in fused else "" for i in range(len(bubble_coords))]
+    missing = [i for i in range(len(bubble_coords)) if i not in fused]
+    if missing:
+        logger.info(f"合并请求缺少 {len(missing)} 个气泡的原文，按普通 AI视觉OCR 识别。")
+        for i, text in zip(missing, _recognize_with_ai_vision(page, [bubble_coords[i] for i in missing])):
+            original_texts[i] = text
+    logger.info(f"OCR 完成 (耗时: {time.time() - start_time:.2f}s)")
+    _finish_ocr(page, original_texts)
+
+    if not _prepare_translation(page):
+        return
+    translated_bubble_texts = [""] * len(bubble_coords)
+    pending = []
+    for i, text in enumerate(page.original_texts):
+        source_text, translation = fused.get(i, (None, None))
+        if translation and source_text == text:
+            translated_bubble_texts[i] = translation
+        elif text:
+            # 没有译文，或原文已被钩子修改，合并请求的译文不再对应
+            pending.append(i)
+    page.advance(len(bubble_coords) - len(pending))
+    if pending:
+        logger.info(f"{len(pending)} 个气泡没有可用的合并译文，按普通流程翻译。")
+        pending_texts = [page.original_texts[i] for i in pending]
         try:
-            inpainted_image, clean_background_img = inpaint_bubbles( # 现在我们保存 clean_bg
-                image_pil, bubble_coords, method=inpainting_method, fill_color=fill_color
-            )
-            logger.info(f"背景处理完成 (耗时: {time.time() - start_time:.2f}s)")
-            # --- 触发 AFTER_INPAINTING 钩子 ---
-            try:
-                hook_result = plugin_mgr.trigger_hook(AFTER_INPAINTING, inpainted_image, clean_background_img, bubble_coords, initial_params)
-                if hook_result and len(hook_result) >= 2 and isinstance(hook_result[0], Image.Image):
-                     inpainted_image, clean_background_img = hook_result[:2] # 只取前两个元素，更新图像
-                     # 如果 clean_background_img 被更新，需要重新附加到 inpainted_image
-                     if clean_background_img:
-                         setattr(inpainted_image, '_clean_background', clean_background_img)
-                         setattr(inpainted_image, '_clean_image', clean_background_img)
-                     logger.info("AFTER_INPAINTING 钩子修改了图像。")
-            except Exception as hook_e:
-                logger.error(f"执行 {AFTER_INPAINTING} 钩子时出错: {hook_e}", exc_info=True)
-            # --------------------------------
+            translated_pending, _ = _translate_separately(page, pending_texts, False)
+        except ProcessingCancelled:
+            raise
         except Exception as e:
-            if ignore_connection_errors and "lama" in inpainting_method.lower():
-                # 如果 LAMA 出错，回退到纯色填充
-                logger.warning(f"LAMA 修复出错，回退到纯色填充: {e}")
-                inpainted_image, _ = inpaint_bubbles(
-                    image_pil, bubble_coords, method='solid', fill_color=fill_color
-                )
-                logger.info("使用纯色填充完成背景处理")
-            else:
-                # 如果不是高级修复方法出错或者不忽略错误，重新抛出异常
+            logger.error(f"补译过程发生错误: {e}", exc_info=True)
+            if not params.get('ignore_connection_errors', True):
                 raise
+            translated_pending = pending_texts # 与 _translation_error_result 一致，以原文代替译文
+        for i, text in zip(pending, translated_pending):
+            translated_bubble_texts[i] = text
+    logger.info(f"翻译完成 (合并模式总耗时: {time.time() - start_time:.2f}s)")
+    _finish_translation(page, translated_bubble_texts, list(translated_bubble_texts))
 
-        # 5. 渲染文本
-        # 准备初始样式字典
-        initial_bubble_styles = {}
-        is_auto_font_size = isinstance(font_size_setting, str) and font_size_setting.lower() == 'auto'
-        for i in range(len(bubble_coords)):
-            initial_bubble_styles[str(i)] = {
-                'fontSize': font_size_setting, # 传递 'auto' 或数字
-                'autoFontSize': is_auto_font_size,
-                'fontFamily': font_family_rel,
-                'text_direction': text_direction,
-                'position_offset': {'x': 0, 'y': 0},
-                'text_color': text_color,
-                'rotation_angle': rotation_angle,
-                # === 新增描边参数 START ===
-                'enableStroke': enable_text_stroke,
-                'strokeColor': text_stroke_color,
-                'strokeWidth': text_stroke_width
-                # === 新增描边参数 END ===
-            }
-        
-        # --- 触发 BEFORE_RENDERING 钩子 ---
-        try:
-            hook_result = plugin_mgr.trigger_hook(BEFORE_RENDERING, inpainted_image, translated_bubble_texts, bubble_coords, initial_bubble_styles, initial_params)
-            if hook_result and len(hook_result) >= 4:
-                 # 只解包前4个元素，忽略其余元素
-                 inpainted_image, translated_bubble_texts, bubble_coords, initial_bubble_styles = hook_result[:4]
-                 logger.info("BEFORE_RENDERING 钩子修改了渲染参数。")
-        except Exception as hook_e:
-            logger.error(f"执行 {BEFORE_RENDERING} 钩子时出错: {hook_e}", exc_info=True)
-        # ----------------------------------
-        logger.info("步骤 5: 渲染翻译文本...")
-        start_time = time.time()
-            # 如果是自动字号，预计算一次（可选，也可以在渲染时计算）
-            # if is_auto_font_size:
-            #     x1, y1, x2, y2 = bubble_coords[i]
-            #     text = translated_bubble_texts[i] if i < len(translated_bubble_texts) else ""
-            #     calculated_size = calculate_auto_font_size(text, x2-x1, y2-y1, text_direction, font_family_rel)
-            #     initial_bubble_styles[str(i)]['calculated_font_size'] = calculated_size
-            #     initial_bubble_styles[str(i)]['fontSize'] = calculated_size # 更新 fontSize
-
-        # 在修复/填充后的图像上渲染
-        render_all_bubbles(
-            inpainted_image, # 直接修改 inpainted_image
-            translated_bubble_texts, # 使用气泡翻译结果渲染
-            bubble_coords,
-            initial_bubble_styles
+
+def run_text_stages(page):
+    """执行 OCR 与翻译：可合并时一次请求完成，否则依次执行两个阶段。"""
+    if can_fuse_ocr_translation(page):
+        run_fused_ocr_translation_stage(page)
+    else:
+        run_ocr_stage(page)
+        run_translation_stage(page)
+
+
+def can_overlap_inpainting(page):
+    """
+    判断本页能否让修复与 OCR+翻译 并发执行。
+
+    修复只依赖气泡坐标，翻译只依赖 OCR 文本，二者本可并行；
+    但 BEFORE_INPAINTING 钩子约定在翻译之后、以修复前的图像为输入执行，
+    若有已启用插件注册了该钩子，则退回顺序执行以保证插件看到的顺序不变。
+    """
+    if not page.params.get('overlap_inpainting', constants.OVERLAP_INPAINTING_WITH_TRANSLATION):
+        return False
+    if get_plugin_manager().has_active_hook(BEFORE_INPAINTING):
+        logger.info("存在 BEFORE_INPAINTING 插件钩子，修复将在翻译之后顺序执行。")
+        return False
+    return True
+
+
+def run_overlapped_stages(page):
+    """
+    以依赖图执行 OCR → 翻译 与 修复 两条分支:
+
+        ocr ──> translation   (合并模式下为单个 ocr_translation 节点)
+        inpainting (仅依赖检测结果)
+
+    修复结果在两条分支都完成后再交给 run_inpainting_stage，
+    因此 BEFORE_INPAINTING / AFTER_INPAINTING 钩子仍在 AFTER_TRANSLATION 之后触发。
+    单页耗时约为 max(修复, OCR+翻译) + 渲染。
+    """
+    # 修复分支使用检测完成时的图像、坐标和参数快照，不受翻译阶段钩子替换参数的影响
+    image, bubble_coords, params = page.image, list(page.bubble_coords), dict(page.params)
+
+    graph = StageGraph("page-stages")
+    if can_fuse_ocr_translation(page):
+        graph.add('ocr_translation', lambda: run_fused_ocr_translation_stage(page))
+    else:
+        graph.add('ocr', lambda: run_ocr_stage(page))
+        graph.add('translation', lambda: run_translation_stage(page), deps=['ocr'])
+    graph.add('inpainting', lambda: _inpaint_page(image, bubble_coords, params))
+    start_time = time.time()
+    results = graph.run()
+    logger.info(f"OCR/翻译 与 修复 并发执行完成 (耗时: {time.time() - start_time:.2f}s)")
+    run_inpainting_stage(page, precomputed=results['inpainting'])
+
+
+def _inpaint_page(image_pil, bubble_coords, params):
+    """
+    执行修复/填充本身 (不触发钩子)。LAMA 出错且允许忽略错误时回退到纯色填充。
+
+    Returns:
+        tuple: (inpainted_image, clean_background, used_fallback)
+    """
+    inpainting_method = params.get('inpainting_method', 'solid')
+    fill_color = params.get('fill_color', constants.DEFAULT_FILL_COLOR)
+    start_time = time.time()
+    try:
+        inpainted_image, clean_background_img = inpaint_bubbles( # 现在我们保存 clean_bg
+            image_pil, bubble_coords, method=inpainting_method, fill_color=fill_color
         )
-        # 将样式附加到最终图像
-        setattr(inpainted_image, '_bubble_styles', initial_bubble_styles)
-        logger.info(f"文本渲染完成 (耗时: {time.time() - start_time:.2f}s)")
+        logger.info(f"背景处理完成 (耗时: {time.time() - start_time:.2f}s)")
+        return inpainted_image, clean_background_img, False
+    except Exception as e:
+        if params.get('ignore_connection_errors', True) and "lama" in inpainting_method.lower():
+            # 如果 LAMA 出错，回退到纯色填充
+            logger.warning(f"LAMA 修复出错，回退到纯色填充: {e}")
+            inpainted_image, clean_background_img = inpaint_bubbles(
+                image_pil, bubble_coords, method='solid', fill_color=fill_color
+            )
+            logger.info("使用纯色填充完成背景处理")
+            return inpainted_image, clean_background_img, True
+        # 如果不是高级修复方法出错或者不忽略错误，重新抛出异常
+        raise
+
 
-        # 6. 准备最终结果
-        processed_image = inpainted_image
+def run_inpainting_stage(page, precomputed=None):
+    """
+    步骤 4: 修复/填充背景，前后触发 BEFORE_INPAINTING / AFTER_INPAINTING 钩子。
+
+    Args:
+        page (PageState): 当前页状态。
+        precomputed (tuple, optional): 已由 run_overlapped_stages 提前算好的 _inpaint_page 结果。
+    """
+    params = page.params
+    plugin_mgr = get_plugin_manager()
+    page.enter_stage('inpainting')
+    try:
+        plugin_mgr.trigger_hook(BEFORE_INPAINTING, page.image, page.bubble_coords, params)
+    except Exception as hook_e:
+        logger.error(f"执行 {BEFORE_INPAINTING} 钩子时出错: {hook_e}", exc_info=True)
+    logger.info(f"步骤 4: 修复/填充背景 (方法: {params.get('inpainting_method', 'solid')})...")
+    if precomputed is None:
+        precomputed = _inpaint_page(page.image, page.bubble_coords, params)
+    inpainted_image, clean_background_img, used_fallback = precomputed
 
-        # --- 触发 AFTER_PROCESSING 钩子 ---
+    if not used_fallback:
         try:
-            # 准备传递给钩子的结果字典
-            final_results = {
-                'original_texts': original_texts,
-                'bubble_texts': translated_bubble_texts,
-                'textbox_texts': translated_textbox_texts,
-                'bubble_coords': bubble_coords,
-                'bubble_styles': initial_bubble_styles
-            }
-            hook_result = plugin_mgr.trigger_hook(AFTER_PROCESSING, processed_image, final_results, initial_params)
+            hook_result = plugin_mgr.trigger_hook(AFTER_INPAINTING, inpainted_image, clean_background_img, page.bubble_coords, params)
             if hook_result and len(hook_result) >= 2 and isinstance(hook_result[0], Image.Image):
-                 processed_image, final_results = hook_result[:2] # 只取前两个元素，更新最终图像和结果
-                 # 可能需要从 final_results 更新局部变量以便返回
-                 original_texts = final_results.get('original_texts', original_texts)
-                 translated_bubble_texts = final_results.get('bubble_texts', translated_bubble_texts)
-                 translated_textbox_texts = final_results.get('textbox_texts', translated_textbox_texts)
-                 bubble_coords = final_results.get('bubble_coords', bubble_coords)
-                 initial_bubble_styles = final_results.get('bubble_styles', initial_bubble_styles)
-                 logger.info("AFTER_PROCESSING 钩子修改了最终结果。")
+                 inpainted_image, clean_background_img = hook_result[:2] # 只取前两个元素，更新图像
+                 # 如果 clean_background_img 被更新，需要重新附加到 inpainted_image
+                 if clean_background_img:
+                     setattr(inpainted_image, '_clean_background', clean_background_img)
+                     setattr(inpainted_image, '_clean_image', clean_background_img)
+                 logger.info("AFTER_INPAINTING 钩子修改了图像。")
         except Exception as hook_e:
-             logger.error(f"执行 {AFTER_PROCESSING} 钩子时出错: {hook_e}", exc_info=True)
-        # ---------------------------------
+            logger.error(f"执行 {AFTER_INPAINTING} 钩子时出错: {hook_e}", exc_info=True)
+    page.inpainted_image = inpainted_image
+    page.clean_background = clean_background_img
 
-        # 附加必要的标记 (修复标记已在 inpaint_bubbles 中处理)
-        # 附加干净背景引用 (已在 inpaint_bubbles 中处理)
 
-        total_duration = time.time() - start_time_total
-        logger.info(f"图像翻译流程完成，总耗时: {total_duration:.2f}s")
+def run_rendering_stage(page):
+    """步骤 5: 在修复后的图像上渲染译文，渲染前触发 BEFORE_RENDERING 钩子。"""
+    params = page.params
+    plugin_mgr = get_plugin_manager()
+    page.enter_stage('rendering')
+    font_size_setting = params.get('font_size_setting', constants.DEFAULT_FONT_SIZE)
+    # 准备初始样式字典
+    initial_bubble_styles = {}
+    is_auto_font_size = isinstance(font_size_setting, str) and font_size_setting.lower() == 'auto'
+    for i in range(len(page.bubble_coords)):
+        initial_bubble_styles[str(i)] = {
+            'fontSize': font_size_setting, # 传递 'auto' 或数字
+            'autoFontSize': is_auto_font_size,
+            'fontFamily': params.get('font_family_rel', constants.DEFAULT_FONT_RELATIVE_PATH),
+            'text_direction': params.get('text_direction', constants.DEFAULT_TEXT_DIRECTION),
+            'position_offset': {'x': 0, 'y': 0},
+            'text_color': params.get('text_color', constants.DEFAULT_TEXT_COLOR),
+            'rotation_angle': params.get('rotation_angle', constants.DEFAULT_ROTATION_ANGLE),
+            'enableStroke': params.get('enable_text_stroke', constants.DEFAULT_TEXT_STROKE_ENABLED),
+            'strokeColor': params.get('text_stroke_color', constants.DEFAULT_TEXT_STROKE_COLOR),
+            'strokeWidth': params.get('text_stroke_width', constants.DEFAULT_TEXT_STROKE_WIDTH)
+        }
 
-        return (
-            processed_image,
-            original_texts,
-            translated_bubble_texts,
-            translated_textbox_texts,
-            bubble_coords,
-            initial_bubble_styles # 返回初始样式
-        )
+    try:
+        hook_result = plugin_mgr.trigger_hook(BEFORE_RENDERING, page.inpainted_image, page.translated_bubble_texts, page.bubble_coords, initial_bubble_styles, params)
+        if hook_result and len(hook_result) >= 4:
+             # 只解包前4个元素，忽略其余元素
+             page.inpainted_image, page.translated_bubble_texts, page.bubble_coords, initial_bubble_styles = hook_result[:4]
+             logger.info("BEFORE_RENDERING 钩子修改了渲染参数。")
+    except Exception as hook_e:
+        logger.error(f"执行 {BEFORE_RENDERING} 钩子时出错: {hook_e}", exc_info=True)
+    logger.info("步骤 5: 渲染翻译文本...")
+    start_time = time.time()
+
+    # 在修复/填充后的图像上渲染
+    render_all_bubbles(
+        page.inpainted_image, # 直接修改 inpainted_image
+        page.translated_bubble_texts, # 使用气泡翻译结果渲染
+        page.bubble_coords,
+        initial_bubble_styles
+    )
+    # 将样式附加到最终图像
+    setattr(page.inpainted_image, '_bubble_styles', initial_bubble_styles)
+    logger.info(f"文本渲染完成 (耗时: {time.time() - start_time:.2f}s)")
+    page.bubble_styles = initial_bubble_styles
+    page.processed_image = page.inpainted_image
+
+
+def finalize_page(page):
+    """
+    触发 AFTER_PROCESSING 钩子并组装 process_image_translation 的返回值。
 
-    except Exception as e:
-        logger.error(f"图像翻译处理流程中发生严重错误: {e}", exc_info=True)
-        # 返回原始图像副本和空数据
-        return original_image_copy, [], [], [], [], {}
+    Returns:
+        tuple: 与 process_image_translation 的返回值相同。
+    """
+    plugin_mgr = get_plugin_manager()
+    try:
+        # 准备传递给钩子的结果字典
+        final_results = {
+            'original_texts': page.original_texts,
+            'bubble_texts': page.translated_bubble_texts,
+            'textbox_texts': page.translated_textbox_texts,
+            'bubble_coords': page.bubble_coords,
+            'bubble_styles': page.bubble_styles
+        }
+        hook_result = plugin_mgr.trigger_hook(AFTER_PROCESSING, page.processed_image, final_results, page.params)
+        if hook_result and len(hook_result) >= 2 and isinstance(hook_result[0], Image.Image):
+             page.processed_image, final_results = hook_result[:2] # 只取前两个元素，更新最终图像和结果
+             page.original_texts = final_results.get('original_texts', page.original_texts)
+             page.translated_bubble_texts = final_results.get('bubble_texts', page.translated_bubble_texts)
+             page.translated_textbox_texts = final_results.get('textbox_texts', page.translated_textbox_texts)
+             page.bubble_coords = final_results.get('bubble_coords', page.bubble_coords)
+             page.bubble_styles = final_results.get('bubble_styles', page.bubble_styles)
+             logger.info("AFTER_PROCESSING 钩子修改了最终结果。")
+    except Exception as hook_e:
+         logger.error(f"执行 {AFTER_PROCESSING} 钩子时出错: {hook_e}", exc_info=True)
+
+    # 附加必要的标记 (修复标记已在 inpaint_bubbles 中处理)
+    # 附加干净背景引用 (已在 inpaint_bubbles 中处理)
+
+    total_duration = time.time() - page.start_time
+    logger.info(f"图像翻译流程完成，总耗时: {total_duration:.2f}s")
+
+    return (
+        page.processed_image,
+        page.original_texts,
+        page.translated_bubble_texts,
+        page.translated_textbox_texts,
+        page.bubble_coords,
+        page.bubble_styles # 返回初始样式
+    )
 
 # --- 测试代码 ---
 if __name__ == '__main__':
@@ -0,0 +1,79 @@
+"""
+处理进度上报与取消。
+
+ProgressReporter 由调用方 (例如后台任务) 创建并传入 process_image_translation，
+各阶段通过它报告当前阶段和已完成的气泡数，并在耗时操作之间检查是否已被取消。
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger("CoreProgress")
+
+
+class ProcessingCancelled(Exception):
+    """处理流程被用户取消。"""
+    pass
+
+
+class ProgressReporter:
+    """
+    线程安全的进度上报器。
+
+    每次状态变化都会生成一个事件字典 {'type': ..., 'time': ..., ...} 并交给回调函数，
+    回调由调用方决定如何使用 (更新任务状态、推送给前端等)。
+    """
+    def __init__(self, callback=None, cancel_event=None):
+        """
+        Args:
+            callback (callable, optional): 接收事件字典的回调，在上报线程中同步调用。
+            cancel_event (threading.Event, optional): 取消标志，不提供则自动创建。
+        """
+        self._callback = callback
+        self._cancel_event = cancel_event or threading.Event()
+        self._lock = threading.Lock()
+        self.stage = None
+        self.done = 0
+        self.total = 0
+
+    def emit(self, event_type, **data):
+        """发送一个事件。回调出错只记录日志，不影响处理流程。"""
+        event = {'type': event_type, 'time': time.time()}
+        event.update(data)
+        if self._callback:
+            try:
+                self._callback(event)
+            except Exception as e:
+                logger.warning(f"进度回调处理事件 '{event_type}' 时出错: {e}")
+
+    def set_stage(self, stage, total=0):
+        """进入新阶段，重置该阶段的完成计数。"""
+        with self._lock:
+            self.stage = stage
+            self.done = 0
+            self.total = total
+        self.emit('stage', stage=stage, done=0, total=total)
+
+    def advance(self, count=1, **data):
+        """当前阶段完成了 count 个条目 (通常是气泡)。额外数据会附加到事件中。"""
+        with self._lock:
+            self.done = min(self.done + count, self.total) if self.total else self.done + count
+            stage, done, total = self.stage, self.done, self.total
+        self.emit('progress', stage=stage, done=done, total=total, **data)
+
+    def child(self, callback=None):
+        """创建共享同一取消标志的子上报器 (例如章节中的单页)。"""
+        return ProgressReporter(callback=callback, cancel_event=self._cancel_event)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """如果已被取消则抛出 ProcessingCancelled，用于在耗时操作之间设置取消点。"""
+        if self._cancel_event.is_set():
+            raise ProcessingCancelled(f"处理已在阶段 '{self.stage}' 被取消")
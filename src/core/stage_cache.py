@@ -0,0 +1,231 @@
+"""
+处理流程各阶段结果的内容寻址磁盘缓存。
+
+键由图像 (或裁剪区域) 像素内容的哈希与该阶段相关的参数共同决定：
+    - 检测: 整页哈希 + YOLO 置信度阈值
+    - 修复: 整页哈希 + 修复方法 + 气泡坐标 + 填充颜色
+因此仅修改字体、翻译服务等下游参数后重新翻译同一页时，可以直接复用检测和修复结果。
+OCR 结果按单个气泡裁剪图缓存，见 ocr_cache。
+
+缓存文件保存在 data/cache/stages/<阶段>/ 下，总大小超过上限时按最近最少使用 (LRU) 顺序淘汰。
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from src.shared import constants
+from src.shared.path_helpers import resource_path
+
+logger = logging.getLogger("CoreStageCache")
+
+
+def hash_image(image_pil):
+    """计算 PIL 图像像素内容的哈希 (与文件编码格式、元数据无关)。"""
+    img = image_pil if image_pil.mode == 'RGB' else image_pil.convert('RGB')
+    hasher = hashlib.sha1()
+    hasher.update(f"{img.size[0]}x{img.size[1]}".encode('utf-8'))
+    hasher.update(img.tobytes())
+    return hasher.hexdigest()
+
+
+def hash_array(array_np):
+    """计算 NumPy 数组 (例如气泡裁剪区域) 内容的哈希。"""
+    hasher = hashlib.sha1()
+    hasher.update(str(array_np.shape).encode('utf-8'))
+    hasher.update(np.ascontiguousarray(array_np).tobytes())
+    return hasher.hexdigest()
+
+
+def make_cache_key(*parts):
+    """将若干参数组合为缓存键。参数需可 JSON 序列化 (元组会按列表处理)。"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """
+    带 LRU 容量上限的磁盘缓存。线程安全，可在流水线的多个工作线程之间共享。
+    """
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # {文件路径: 字节数}，按最近使用顺序排列 (末尾为最新)
+        self._total_bytes = 0
+        self._stats = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """启动时扫描缓存目录，按修改时间重建 LRU 顺序。"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, path, stat.st_size))
+                except OSError:
+                    continue
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self._total_bytes += size
+        logger.info(f"阶段缓存已加载: {len(self._entries)} 个条目, {self._total_bytes / (1024 * 1024):.1f} MB (上限 {self.max_bytes / (1024 * 1024):.0f} MB)")
+
+    def _path(self, stage, key, ext):
+        return os.path.join(self.cache_dir, stage, f"{key}.{ext}")
+
+    def _stage_stats(self, stage):
+        return self._stats.setdefault(stage, {'hits': 0, 'misses': 0, 'stores': 0})
+
+    # --- 原始字节读写 ---
+
+    def get_bytes(self, stage, key, ext='bin'):
+        """读取缓存条目，未命中返回 None。"""
+        path = self._path(stage, key, ext)
+        with self._lock:
+            stats = self._stage_stats(stage)
+            if path not in self._entries:
+                stats['misses'] += 1
+                return None
+            self._entries.move_to_end(path)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None) # 记录访问时间，重启后仍能保持 LRU 顺序
+        except OSError as e:
+            logger.warning(f"读取阶段缓存失败，视为未命中: {path} - {e}")
+            with self._lock:
+                self._forget(path)
+                stats['misses'] += 1
+            return None
+        with self._lock:
+            stats['hits'] += 1
+        return data
+
+    def put_bytes(self, stage, key, data, ext='bin'):
+        """写入缓存条目，必要时淘汰最久未使用的条目。"""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(stage, key, ext)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入阶段缓存失败: {path} - {e}")
+            return
+        with self._lock:
+            self._forget(path)
+            self._entries[path] = len(data)
+            self._total_bytes += len(data)
+            self._stage_stats(stage)['stores'] += 1
+            self._evict()
+
+    def _forget(self, path):
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            logger.debug(f"阶段缓存淘汰: {path}")
+
+    # --- 结构化数据读写 ---
+
+    def get_json(self, stage, key):
+        data = self.get_bytes(stage, key, 'json')
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def put_json(self, stage, key, value):
+        self.put_bytes(stage, key, json.dumps(value, ensure_ascii=False).encode('utf-8'), 'json')
+
+    def get_image(self, stage, key):
+        data = self.get_bytes(stage, key, 'png')
+        if data is None:
+            return None
+        try:
+            img = Image.open(io.BytesIO(data))
+            img.load()
+            return img
+        except Exception:
+            return None
+
+    def put_image(self, stage, key, image_pil):
+        buffer = io.BytesIO()
+        image_pil.save(buffer, format='PNG')
+        self.put_bytes(stage, key, buffer.getvalue(), 'png')
+
+    # --- 管理 ---
+
+    def get_stats(self):
+        """返回各阶段命中/未命中计数及缓存占用。"""
+        with self._lock:
+            stages = {}
+            for stage, stats in self._stats.items():
+                lookups = stats['hits'] + stats['misses']
+                stages[stage] = dict(stats, hit_rate=round(stats['hits'] / lookups, 4) if lookups else 0.0)
+            return {
+                'enabled': constants.STAGE_CACHE_ENABLED,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'stages': stages
+            }
+
+    def clear(self):
+        """删除所有缓存条目 (保留命中统计)。"""
+        with self._lock:
+            for path in list(self._entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._total_bytes = 0
+        logger.info("阶段缓存已清空。")
+
+
+# --- 单例 ---
+_stage_cache_instance = None
+_stage_cache_lock = threading.Lock()
+
+
+def get_stage_cache():
+    """
+    获取阶段缓存单例。缓存被禁用或初始化失败时返回 None，调用方应直接执行原有逻辑。
+    """
+    global _stage_cache_instance
+    if not constants.STAGE_CACHE_ENABLED:
+        return None
+    if _stage_cache_instance is None:
+        with _stage_cache_lock:
+            if _stage_cache_instance is None:
+                try:
+                    cache_dir = resource_path(os.path.join('data', 'cache', 'stages'))
+                    _stage_cache_instance = StageCache(cache_dir, constants.STAGE_CACHE_MAX_BYTES)
+                except Exception as e:
+                    logger.error(f"初始化阶段缓存失败，将不使用缓存: {e}", exc_info=True)
+                    return None
+    return _stage_cache_instance
@@ -0,0 +1,92 @@
+"""
+小型阶段依赖图执行器。
+
+每个节点是一个无参函数，声明其依赖的其他节点；
+执行时所有依赖已完成的节点会被立即提交到线程池，互不依赖的节点因此并发运行。
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger("CoreStageGraph")
+
+
+class StageGraph:
+    """
+    阶段依赖图。
+
+    用法:
+        graph = StageGraph("page")
+        graph.add('ocr', do_ocr)
+        graph.add('translate', do_translate, deps=['ocr'])
+        graph.add('inpaint', do_inpaint)
+        results = graph.run()   # {'ocr': ..., 'translate': ..., 'inpaint': ...}
+    """
+    def __init__(self, name="stage_graph"):
+        self.name = name
+        self._nodes = {} # {节点名: (函数, 依赖列表)}，保持添加顺序
+
+    def add(self, node_name, func, deps=()):
+        """
+        添加节点。依赖的节点必须已经添加过，这保证了图中不存在环。
+
+        Args:
+            node_name (str): 节点名称。
+            func (callable): 无参函数，其返回值记录为该节点的结果。
+            deps (iterable): 依赖的节点名称。
+        """
+        if node_name in self._nodes:
+            raise ValueError(f"节点 '{node_name}' 已存在")
+        missing = [d for d in deps if d not in self._nodes]
+        if missing:
+            raise ValueError(f"节点 '{node_name}' 依赖了未定义的节点: {missing}")
+        self._nodes[node_name] = (func, list(deps))
+        return self
+
+    def run(self, max_workers=None):
+        """
+        执行整个依赖图，直到所有节点完成。
+
+        任一节点抛出异常时，不再提交新节点，等待已在运行的节点结束后重新抛出该异常。
+
+        Args:
+            max_workers (int, optional): 线程池大小，默认为节点数。
+
+        Returns:
+            dict: {节点名: 返回值}
+        """
+        if not self._nodes:
+            return {}
+
+        results = {}
+        pending = dict(self._nodes)
+        running = {} # {future: 节点名}
+        first_error = None
+        start_time = time.time()
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(self._nodes),
+                                thread_name_prefix=self.name) as executor:
+            while pending or running:
+                if first_error is None:
+                    ready = [name for name, (_, deps) in pending.items() if all(d in results for d in deps)]
+                    for name in ready:
+                        func, _ = pending.pop(name)
+                        logger.debug(f"[{self.name}] 提交节点: {name}")
+                        running[executor.submit(func)] = name
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                        logger.debug(f"[{self.name}] 节点完成: {name} (累计耗时 {time.time() - start_time:.2f}s)")
+                    except Exception as e:
+                        logger.error(f"[{self.name}] 节点 '{name}' 执行失败: {e}")
+                        if first_error is None:
+                            first_error = e
+
+        if first_error is not None:
+            raise first_error
+        return results
@@ -2,7 +2,6 @@ import logging
 import time
 import requests # 用于 Ollama 和 Sakura
 import json # 用于解析错误响应
-from openai import OpenAI # 用于 SiliconFlow 和 DeepSeek
 import os # 用于测试代码读取环境变量
 import sys
 from pathlib import Path
@@ -10,6 +9,15 @@ from src.shared import constants # 导入常量
 from src.interfaces.baidu_translate_interface import baidu_translate, BaiduTranslateInterface # 导入百度翻译接口
 from src.interfaces.youdao_translate_interface import YoudaoTranslateInterface # 导入有道翻译接口
 import re # 增加re模块导入
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.shared.adaptive_limits import request_slot # 自适应并发与 rpm
+from src.shared.http_clients import get_openai_client, get_http_session, http_post, track_request # 复用连接池的客户端
+from src.core.progress import ProcessingCancelled
+from src.shared.resilience import call_with_resilience, breaker_scope, is_retryable_error, CircuitOpenError, ConfigError # 重试与熔断
+from src.core.translation_memory import get_translation_memory, MemoryScope, hash_prompt # 翻译记忆
+from src.core.translation_router import TranslationRoute, route_translation # 多服务商对冲与故障转移
+from src.shared.json_stream import IncrementalJsonArrayParser # 流式回复的增量 JSON 解析
 
 # 添加项目根目录到 Python 路径以解决导入问题
 root_dir = str(Path(__file__).resolve().parent.parent.parent)
@@ -43,56 +51,6 @@ youdao_translate = YoudaoTranslateInterface()
 logger = logging.getLogger("CoreTranslation")
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# --- rpm Limiting Globals for Translation ---
-_translation_rpm_last_reset_time_container = [0]
-_translation_rpm_request_count_container = [0]
-# ------------------------------------------
-
-def _enforce_rpm_limit(rpm_limit: int, service_name: str, last_reset_time_ref: list, request_count_ref: list):
-    """
-    执行rpm（每分钟请求数）限制检查和等待。
-    使用列表作为引用类型来修改外部的 last_reset_time 和 request_count。
-
-    Args:
-        rpm_limit (int): 每分钟最大请求数。如果为0或负数，则不限制。
-        service_name (str): 服务名称，用于日志记录。
-        last_reset_time_ref (list): 包含上次重置时间的列表 (e.g., [timestamp])。
-        request_count_ref (list): 包含当前请求计数的列表 (e.g., [count])。
-    """
-    if rpm_limit <= 0:
-        return # 无限制
-
-    current_time = time.time()
-
-    # 检查是否需要重置窗口
-    if current_time - last_reset_time_ref[0] >= 60:
-        logger.info(f"rpm: {service_name} - 1分钟窗口已过，重置计数器和时间。")
-        last_reset_time_ref[0] = current_time
-        request_count_ref[0] = 0
-
-    # 检查是否达到rpm限制
-    if request_count_ref[0] >= rpm_limit:
-        time_to_wait = 60 - (current_time - last_reset_time_ref[0])
-        if time_to_wait > 0:
-            logger.info(f"rpm: {service_name} - 已达到每分钟 {rpm_limit} 次请求上限。将等待 {time_to_wait:.2f} 秒...")
-            time.sleep(time_to_wait)
-            # 等待结束后，这是一个新的窗口
-            last_reset_time_ref[0] = time.time() # 更新为当前时间
-            request_count_ref[0] = 0
-        else:
-            # 理论上不应该到这里，因为上面的窗口重置逻辑会处理
-            logger.info(f"rpm: {service_name} - 窗口已过但计数未重置，立即重置。")
-            last_reset_time_ref[0] = current_time
-            request_count_ref[0] = 0
-    
-    # 如果是窗口内的第一次请求，设置窗口开始时间
-    if request_count_ref[0] == 0 and last_reset_time_ref[0] == 0: # 或者 last_reset_time_ref[0] 远早于 current_time - 60
-        last_reset_time_ref[0] = current_time
-        logger.info(f"rpm: {service_name} - 启动新的1分钟请求窗口。")
-
-    request_count_ref[0] += 1
-    logger.debug(f"rpm: {service_name} - 当前窗口请求计数: {request_count_ref[0]}/{rpm_limit if rpm_limit > 0 else '无限制'}")
-
 # 添加安全JSON解析函数
 def _safely_extract_from_json(json_str, field_name):
     """
@@ -141,6 +99,229 @@ def _safely_extract_from_json(json_str, field_name):
         # 所有方法都失败，返回原始文本
         return json_str
 
+def _call_openai_chat(service_name, base_url, api_key, model_name, system_prompt, text):
+    """通过复用的 OpenAI 兼容客户端发送一次对话请求，返回回复文本。"""
+    client = get_openai_client(base_url, api_key)
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": text})
+    with track_request(service_name):
+        response = client.chat.completions.create(model=model_name, messages=messages)
+    return response.choices[0].message.content.strip()
+
+# OpenAI 兼容服务商的 Base URL (自定义服务商使用用户提供的 Base URL)
+OPENAI_COMPATIBLE_BASE_URLS = {
+    'siliconflow': "https://api.siliconflow.cn/v1",
+    'deepseek': "https://api.deepseek.com/v1",
+    'volcano': "https://ark.cn-beijing.volces.com/api/v3",
+    'gemini': "https://generativelanguage.googleapis.com/v1beta/openai/",
+}
+OLLAMA_CHAT_URL = "http://localhost:11434/api/chat"
+
+
+def _stream_chat(model_provider, api_key, model_name, system_prompt, text, custom_base_url=None):
+    """
+    以流式方式发送一次对话请求，逐段产出回复文本。
+    支持 OpenAI 兼容服务商 (stream=True) 与 Ollama (逐行 JSON)。
+    """
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": text})
+
+    if model_provider == 'ollama':
+        payload = {"model": model_name, "messages": messages, "stream": True}
+        # 流式响应要计入读取全部内容的耗时，因此不使用 http_post (它只记录到收到响应头为止)
+        with track_request('ollama'):
+            response = get_http_session('ollama').post(
+                OLLAMA_CHAT_URL, json=payload, stream=True,
+                timeout=(constants.HTTP_CONNECT_TIMEOUT, constants.HTTP_READ_TIMEOUT))
+            with response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get('error'):
+                        raise ValueError(f"Ollama 返回错误: {data['error']}")
+                    content = (data.get('message') or {}).get('content')
+                    if content:
+                        yield content
+                    if data.get('done'):
+                        break
+        return
+
+    base_url = custom_base_url if model_provider == constants.CUSTOM_OPENAI_PROVIDER_ID else OPENAI_COMPATIBLE_BASE_URLS.get(model_provider.lower())
+    if not base_url:
+        raise ConfigError(f"服务商 {model_provider} 需要 Base URL")
+    if not api_key:
+        raise ConfigError(f"服务商 {model_provider} 需要 API Key")
+    client = get_openai_client(base_url, api_key)
+    with track_request(model_provider):
+        stream = client.chat.completions.create(model=model_name, messages=messages, stream=True)
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def _caiyun_translate(texts, target_language, api_key, model_name):
+    """调用彩云小译，source 列表中的多段文本在一次请求中翻译，返回与 texts 对应的译文列表。"""
+    if not api_key: raise ConfigError("彩云小译需要 API Key")
+    url = "http://api.interpreter.caiyunai.com/v1/translator"
+    # 确定翻译方向，默认为 auto2zh（自动检测源语言翻译到中文）
+    trans_type = "auto2zh"
+    if target_language == 'en':
+        trans_type = "zh2en"
+    elif target_language == 'ja':
+        trans_type = "zh2ja"
+    # 也可以基于源语言确定翻译方向
+    if 'japan' in model_name or 'ja' in model_name:
+        trans_type = "ja2zh"
+    elif 'en' in model_name:
+        trans_type = "en2zh"
+
+    headers = {
+        "Content-Type": "application/json",
+        "X-Authorization": f"token {api_key}"
+    }
+    payload = {
+        "source": list(texts),
+        "trans_type": trans_type,
+        "request_id": f"comic_translator_{int(time.time())}",
+        "detect": True,
+        "media": "text"
+    }
+
+    response = http_post('caiyun', url, headers=headers, json=payload)
+    response.raise_for_status()
+    result = response.json()
+    if "target" in result and len(result["target"]) == len(texts):
+        return [target.strip() for target in result["target"]]
+    raise ValueError(f"彩云小译返回格式错误: {result}")
+
+def _request_translation(text, target_language, model_provider, api_key, model_name, prompt_content, custom_base_url):
+    """向服务商发送一次翻译请求 (不重试)，返回原始回复文本，失败时抛出异常。"""
+    if model_provider == 'siliconflow':
+        # SiliconFlow (硅基流动) 使用 OpenAI 兼容 API
+        if not api_key:
+            raise ConfigError("SiliconFlow需要API Key")
+        translated_text = _call_openai_chat('siliconflow', OPENAI_COMPATIBLE_BASE_URLS['siliconflow'],
+                                            api_key, model_name, prompt_content, text)
+        
+    elif model_provider == 'deepseek':
+        # DeepSeek 也使用 OpenAI 兼容 API
+        if not api_key:
+            raise ConfigError("DeepSeek需要API Key")
+        translated_text = _call_openai_chat('deepseek', OPENAI_COMPATIBLE_BASE_URLS['deepseek'],
+                                            api_key, model_name, prompt_content, text)
+        
+    elif model_provider == 'volcano':
+        # 火山引擎，也使用 OpenAI 兼容 API
+        if not api_key: raise ConfigError("火山引擎需要 API Key")
+        translated_text = _call_openai_chat('volcano', OPENAI_COMPATIBLE_BASE_URLS['volcano'],
+                                            api_key, model_name, prompt_content, text)
+
+    elif model_provider == 'caiyun':
+        translated_text = _caiyun_translate([text], target_language, api_key, model_name)[0]
+
+    elif model_provider == 'sakura':
+        url = "http://localhost:8080/v1/chat/completions"
+        headers = {"Content-Type": "application/json"}
+        sakura_prompt = "你是一个轻小说翻译模型，可以流畅通顺地以日本轻小说的风格将日文翻译成简体中文，并联系上下文正确使用人称代词，不擅自添加原文中没有的代词。"
+        payload = {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": sakura_prompt},
+                {"role": "user", "content": f"将下面的日文文本翻译成中文：{text}"}
+            ]
+        }
+        response = http_post('sakura', url, headers=headers, json=payload)
+        response.raise_for_status()
+        result = response.json()
+        translated_text = result['choices'][0]['message']['content'].strip()
+
+    elif model_provider == 'ollama':
+        url = OLLAMA_CHAT_URL
+        payload = {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": prompt_content},
+                {"role": "user", "content": text}
+            ],
+            "stream": False
+        }
+        response = http_post('ollama', url, json=payload)
+        response.raise_for_status()
+        result = response.json()
+        if "message" in result and "content" in result["message"]:
+            translated_text = result["message"]["content"].strip()
+        else:
+            raise ValueError(f"Ollama返回格式错误: {result}")
+            
+    elif model_provider == constants.BAIDU_TRANSLATE_ENGINE_ID:
+        # 百度翻译API
+        if not api_key or (isinstance(api_key, str) and not api_key.strip()):
+            raise ConfigError("百度翻译API需要appid")
+        if not model_name or (isinstance(model_name, str) and not model_name.strip()):
+            raise ConfigError("百度翻译API需要appkey")
+            
+        # 设置百度翻译接口的认证信息
+        baidu_translate.set_credentials(api_key, model_name)
+        
+        # 将项目内部语言代码转换为百度翻译API支持的语言代码
+        from_lang = 'auto'  # 默认自动检测源语言
+        to_lang = constants.PROJECT_TO_BAIDU_TRANSLATE_LANG_MAP.get(target_language, 'zh')
+        
+        # 调用百度翻译接口
+        translated_text = baidu_translate.translate(text, from_lang, to_lang, max_retries=1) # 重试由 call_with_resilience 统一处理
+    
+    elif model_provider == constants.YOUDAO_TRANSLATE_ENGINE_ID:
+        # 有道翻译API
+        if not api_key or (isinstance(api_key, str) and not api_key.strip()):
+            raise ConfigError("有道翻译API需要AppKey")
+        if not model_name or (isinstance(model_name, str) and not model_name.strip()):
+            raise ConfigError("有道翻译API需要AppSecret")
+            
+        # 设置有道翻译接口的认证信息
+        youdao_translate.app_key = api_key
+        youdao_translate.app_secret = model_name
+        
+        # 将项目内部语言代码转换为有道翻译API支持的语言代码
+        from_lang = 'auto'  # 默认自动检测源语言
+        to_lang = constants.PROJECT_TO_YOUDAO_TRANSLATE_LANG_MAP.get(target_language, 'zh-CHS')
+        
+        # 调用有道翻译接口
+        translated_text = youdao_translate.translate(text, from_lang, to_lang)
+    elif model_provider.lower() == 'gemini':
+        if not api_key:
+            raise ConfigError("Gemini 需要 API Key")
+        if not model_name:
+            raise ConfigError("Gemini 需要模型名称 (例如 gemini-1.5-flash-latest)")
+
+        # System prompt 对于 Gemini 的 OpenAI 兼容层是否有效需要测试
+        # 教程中的 chat completion 示例包含 system role
+        logger.debug(f"Gemini 文本翻译请求 (模型: {model_name}): {text[:100]}")
+        translated_text = _call_openai_chat('gemini', OPENAI_COMPATIBLE_BASE_URLS['gemini'], # 根据教程
+                                            api_key, model_name, prompt_content, text)
+        logger.info(f"Gemini 文本翻译成功，模型: {model_name}")
+        logger.info(f"Gemini 翻译结果 (前100字符): {translated_text[:100]}")
+    elif model_provider == constants.CUSTOM_OPENAI_PROVIDER_ID:
+        if not api_key:
+            raise ConfigError("自定义 OpenAI 兼容服务需要 API Key")
+        if not model_name:
+            raise ConfigError("自定义 OpenAI 兼容服务需要模型名称")
+        if not custom_base_url: # 检查 custom_base_url
+            raise ConfigError("自定义 OpenAI 兼容服务需要 Base URL")
+
+        logger.info(f"使用自定义 OpenAI 兼容服务: Base URL='{custom_base_url}', Model='{model_name}'")
+        translated_text = _call_openai_chat(constants.CUSTOM_OPENAI_PROVIDER_ID, custom_base_url, # 使用 custom_base_url
+                                            api_key, model_name, prompt_content, text)
+    else:
+        raise ConfigError(f"不支持的翻译服务提供商: {model_provider}")
+    return translated_text
+
+
 def translate_single_text(text, target_language, model_provider, 
                           api_key=None, model_name=None, prompt_content=None, 
                           use_json_format=False, custom_base_url=None,
@@ -176,243 +357,40 @@ def translate_single_text(text, target_language, model_provider,
 
     logger.info(f"开始翻译文本: '{text[:30]}...' (服务商: {model_provider}, rpm: {rpm_limit_translation if rpm_limit_translation > 0 else '无'})")
 
-    max_retries = 3
-    retry_count = 0
-    translated_text = "翻译失败: 未知错误"
-
-    # --- rpm Enforcement ---
-    # 使用容器来传递引用
-    _enforce_rpm_limit(
-        rpm_limit_translation,
-        f"Translation ({model_provider})",
-        _translation_rpm_last_reset_time_container,
-        _translation_rpm_request_count_container
-    )
-    # ---------------------
-
-    while retry_count < max_retries:
-        try:
-            if model_provider == 'siliconflow':
-                # SiliconFlow (硅基流动) 使用 OpenAI 兼容 API
-                if not api_key:
-                    raise ValueError("SiliconFlow需要API Key")
-                client = OpenAI(api_key=api_key, base_url="https://api.siliconflow.cn/v1")
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": prompt_content},
-                        {"role": "user", "content": text},
-                    ]
-                )
-                translated_text = response.choices[0].message.content.strip()
-                
-            elif model_provider == 'deepseek':
-                # DeepSeek 也使用 OpenAI 兼容 API
-                if not api_key:
-                    raise ValueError("DeepSeek需要API Key")
-                client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com/v1")
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": prompt_content},
-                        {"role": "user", "content": text},
-                    ]
-                )
-                translated_text = response.choices[0].message.content.strip()
-                
-            elif model_provider == 'volcano':
-                # 火山引擎，也使用 OpenAI 兼容 API
-                if not api_key: raise ValueError("火山引擎需要 API Key")
-                client = OpenAI(api_key=api_key, base_url="https://ark.cn-beijing.volces.com/api/v3")
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": prompt_content},
-                        {"role": "user", "content": text},
-                    ]
-                )
-                translated_text = response.choices[0].message.content.strip()
-
-            elif model_provider == 'caiyun':
-                if not api_key: raise ValueError("彩云小译需要 API Key")
-                url = "http://api.interpreter.caiyunai.com/v1/translator"
-                # 确定翻译方向，默认为 auto2zh（自动检测源语言翻译到中文）
-                trans_type = "auto2zh"
-                if target_language == 'en':
-                    trans_type = "zh2en"
-                elif target_language == 'ja':
-                    trans_type = "zh2ja"
-                # 也可以基于源语言确定翻译方向
-                if 'japan' in model_name or 'ja' in model_name:
-                    trans_type = "ja2zh"
-                elif 'en' in model_name:
-                    trans_type = "en2zh"
-                
-                headers = {
-                    "Content-Type": "application/json",
-                    "X-Authorization": f"token {api_key}"
-                }
-                payload = {
-                    "source": [text],
-                    "trans_type": trans_type,
-                    "request_id": f"comic_translator_{int(time.time())}",
-                    "detect": True,
-                    "media": "text"
-                }
-                
-                response = requests.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                if "target" in result and len(result["target"]) > 0:
-                    translated_text = result["target"][0].strip()
-                else:
-                    raise ValueError(f"彩云小译返回格式错误: {result}")
-
-            elif model_provider == 'sakura':
-                url = "http://localhost:8080/v1/chat/completions"
-                headers = {"Content-Type": "application/json"}
-                sakura_prompt = "你是一个轻小说翻译模型，可以流畅通顺地以日本轻小说的风格将日文翻译成简体中文，并联系上下文正确使用人称代词，不擅自添加原文中没有的代词。"
-                payload = {
-                    "model": model_name,
-                    "messages": [
-                        {"role": "system", "content": sakura_prompt},
-                        {"role": "user", "content": f"将下面的日文文本翻译成中文：{text}"}
-                    ]
-                }
-                response = requests.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                translated_text = result['choices'][0]['message']['content'].strip()
-
-            elif model_provider == 'ollama':
-                url = "http://localhost:11434/api/chat"
-                payload = {
-                    "model": model_name,
-                    "messages": [
-                        {"role": "system", "content": prompt_content},
-                        {"role": "user", "content": text}
-                    ],
-                    "stream": False
-                }
-                response = requests.post(url, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                if "message" in result and "content" in result["message"]:
-                    translated_text = result["message"]["content"].strip()
-                else:
-                    raise ValueError(f"Ollama返回格式错误: {result}")
-                    
-            elif model_provider == constants.BAIDU_TRANSLATE_ENGINE_ID:
-                # 百度翻译API
-                if not api_key or (isinstance(api_key, str) and not api_key.strip()):
-                    raise ValueError("百度翻译API需要appid")
-                if not model_name or (isinstance(model_name, str) and not model_name.strip()):
-                    raise ValueError("百度翻译API需要appkey")
-                    
-                # 设置百度翻译接口的认证信息
-                baidu_translate.set_credentials(api_key, model_name)
-                
-                # 将项目内部语言代码转换为百度翻译API支持的语言代码
-                from_lang = 'auto'  # 默认自动检测源语言
-                to_lang = constants.PROJECT_TO_BAIDU_TRANSLATE_LANG_MAP.get(target_language, 'zh')
-                
-                # 调用百度翻译接口
-                translated_text = baidu_translate.translate(text, from_lang, to_lang)
-            
-            elif model_provider == constants.YOUDAO_TRANSLATE_ENGINE_ID:
-                # 有道翻译API
-                if not api_key or (isinstance(api_key, str) and not api_key.strip()):
-                    raise ValueError("有道翻译API需要AppKey")
-                if not model_name or (isinstance(model_name, str) and not model_name.strip()):
-                    raise ValueError("有道翻译API需要AppSecret")
-                    
-                # 设置有道翻译接口的认证信息
-                youdao_translate.app_key = api_key
-                youdao_translate.app_secret = model_name
-                
-                # 将项目内部语言代码转换为有道翻译API支持的语言代码
-                from_lang = 'auto'  # 默认自动检测源语言
-                to_lang = constants.PROJECT_TO_YOUDAO_TRANSLATE_LANG_MAP.get(target_language, 'zh-CHS')
-                
-                # 调用有道翻译接口
-                translated_text = youdao_translate.translate(text, from_lang, to_lang)
-            elif model_provider.lower() == 'gemini':
-                if not api_key:
-                    raise ValueError("Gemini 需要 API Key")
-                if not model_name:
-                    raise ValueError("Gemini 需要模型名称 (例如 gemini-1.5-flash-latest)")
-
-                client = OpenAI(
-                    api_key=api_key,
-                    base_url="https://generativelanguage.googleapis.com/v1beta/openai/" # 根据教程
-                )
-                
-                gemini_messages = []
-                # System prompt 对于 Gemini 的 OpenAI 兼容层是否有效需要测试
-                # 教程中的 chat completion 示例包含 system role
-                if prompt_content:
-                    gemini_messages.append({"role": "system", "content": prompt_content})
-                # 用户输入是实际的待翻译文本
-                gemini_messages.append({"role": "user", "content": text}) 
-
-                logger.debug(f"Gemini 文本翻译请求 (模型: {model_name}): {json.dumps(gemini_messages, ensure_ascii=False)}")
-
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=gemini_messages,
-                )
-                translated_text = response.choices[0].message.content.strip()
-                logger.info(f"Gemini 文本翻译成功，模型: {model_name}")
-                logger.info(f"Gemini 翻译结果 (前100字符): {translated_text[:100]}")
-            elif model_provider == constants.CUSTOM_OPENAI_PROVIDER_ID:
-                if not api_key:
-                    raise ValueError("自定义 OpenAI 兼容服务需要 API Key")
-                if not model_name:
-                    raise ValueError("自定义 OpenAI 兼容服务需要模型名称")
-                if not custom_base_url: # 检查 custom_base_url
-                    raise ValueError("自定义 OpenAI 兼容服务需要 Base URL")
-
-                logger.info(f"使用自定义 OpenAI 兼容服务: Base URL='{custom_base_url}', Model='{model_name}'")
-                client = OpenAI(api_key=api_key, base_url=custom_base_url) # 使用 custom_base_url
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": prompt_content},
-                        {"role": "user", "content": text},
-                    ],
-                )
-                translated_text = response.choices[0].message.content.strip()
-            else:
-                raise ValueError(f"不支持的翻译服务提供商: {model_provider}")
-                
-            if use_json_format:
-                try:
-                    extracted_text = _safely_extract_from_json(translated_text, "translated_text")
-                    logger.info(f"成功从JSON响应中提取翻译文本: '{extracted_text}'")
-                    return extracted_text
-                except Exception as e:
-                    logger.warning(f"无法将翻译结果解析为JSON，将尝试提取文本。原始响应: {translated_text}")
-                    return _safely_extract_from_json(translated_text, "translated_text")
-            
-            break
-            
-        except Exception as e:
-            retry_count += 1
-            error_message = str(e)
-            logger.error(f"翻译失败（尝试 {retry_count}/{max_retries}，服务商: {model_provider}）: {error_message}", exc_info=True)
-            translated_text = f"翻译失败: {error_message}"
-            if hasattr(e, 'response') and e.response is not None:
-                try:
-                    error_detail = e.response.json()
-                    logger.error(f"{model_provider} API 错误详情: {error_detail}")
-                except json.JSONDecodeError:
-                    logger.error(f"{model_provider} API 原始错误响应 (状态码 {e.response.status_code}): {e.response.text}")
-
-            if "API key" in error_message or "appid" in error_message or "appkey" in error_message or "authentication" in error_message.lower() or "Base URL" in error_message: # 新增 "Base URL" 检查
-                break # 凭证或配置错误，不重试
-            if retry_count < max_retries:
-                time.sleep(1)
-    
+    def request_once():
+        # --- rpm Enforcement (按服务商 + API Key 共享令牌桶，线程安全；每次尝试都占用一次额度) ---
+        # 开启自适应限流时并发数与 rpm 按服务商的限流反馈自动调整，rpm 设置作为上限
+        with request_slot('translation', model_provider, api_key, rpm_limit_translation, model=model_name,
+                          max_concurrency=get_translation_concurrency(model_provider)):
+            return _request_translation(text, target_language, model_provider, api_key, model_name,
+                                        prompt_content, custom_base_url)
+
+    try:
+        # 暂时性错误按指数退避重试 (遵循 Retry-After)，服务商连续失败时熔断，直接返回失败
+        translated_text = call_with_resilience('translation', model_provider, request_once,
+                                               is_retryable=is_retryable_error,
+                                               scope=breaker_scope(custom_base_url, api_key))
+        if use_json_format:
+            try:
+                extracted_text = _safely_extract_from_json(translated_text, "translated_text")
+                logger.info(f"成功从JSON响应中提取翻译文本: '{extracted_text}'")
+                return extracted_text
+            except Exception as e:
+                logger.warning(f"无法将翻译结果解析为JSON，将尝试提取文本。原始响应: {translated_text}")
+                return _safely_extract_from_json(translated_text, "translated_text")
+    except CircuitOpenError as e:
+        translated_text = f"翻译失败: {e}"
+    except Exception as e:
+        error_message = str(e)
+        logger.error(f"翻译失败（服务商: {model_provider}）: {error_message}", exc_info=True)
+        translated_text = f"翻译失败: {error_message}"
+        if hasattr(e, 'response') and e.response is not None:
+            try:
+                error_detail = e.response.json()
+                logger.error(f"{model_provider} API 错误详情: {error_detail}")
+            except (json.JSONDecodeError, ValueError):
+                logger.error(f"{model_provider} API 原始错误响应 (状态码 {e.response.status_code}): {e.response.text}")
+
     # 记录翻译结果
     if "翻译失败" in translated_text:
         logger.warning(f"最终翻译失败: '{text}' -> '{translated_text}'")
@@ -442,13 +420,237 @@ def translate_with_mock(text, target_language, api_key=None, model_name=None, pr
     return translated
 
 
+def get_translation_concurrency(model_provider):
+    """返回服务商允许同时进行的翻译请求数。"""
+    provider = (model_provider or '').lower()
+    return max(1, constants.TRANSLATION_CONCURRENCY_BY_PROVIDER.get(provider, constants.DEFAULT_TRANSLATION_CONCURRENCY))
+
+
+def _map_concurrently(items, func, max_concurrency, progress=None):
+    """
+    对 items 中的每一项调用 func(index, item)，最多 max_concurrency 项同时进行，按输入顺序返回结果。
+
+    每项开始前检查取消标志；被取消时尚未开始的项不再执行，并抛出 ProcessingCancelled。
+    """
+    results = [None] * len(items)
+
+    def run_one(index, item):
+        if progress:
+            progress.check_cancelled()
+        return func(index, item)
+
+    if max_concurrency <= 1 or len(items) <= 1:
+        for i, item in enumerate(items):
+            results[i] = run_one(i, item)
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(items)), thread_name_prefix="translate") as executor:
+        futures = {executor.submit(run_one, i, item): i for i, item in enumerate(items)}
+        try:
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        except ProcessingCancelled:
+            for future in futures:
+                future.cancel()
+            raise
+    return results
+
+
+# --- 机器翻译接口批量请求 ---
+
+# 支持一次请求翻译多段文本的机器翻译服务商
+NATIVE_BATCH_PROVIDERS = ('caiyun', constants.BAIDU_TRANSLATE_ENGINE_ID, constants.YOUDAO_TRANSLATE_ENGINE_ID)
+
+
+def _native_batch_limits(model_provider):
+    """返回服务商单次请求的限制: (最多文本段数, 最大长度, 计算单段长度的函数)。"""
+    if model_provider == constants.BAIDU_TRANSLATE_ENGINE_ID:
+        # 多段文本以换行拼接，每段额外计 1 个字节
+        return None, constants.BAIDU_TRANSLATE_MAX_QUERY_BYTES, lambda text: len(text.encode('utf-8')) + 1
+    if model_provider == constants.YOUDAO_TRANSLATE_ENGINE_ID:
+        return None, constants.YOUDAO_TRANSLATE_MAX_QUERY_CHARS, lambda text: len(text) + 1
+    return constants.CAIYUN_BATCH_MAX_ITEMS, constants.CAIYUN_BATCH_MAX_CHARS, len
+
+
+def _chunk_for_native_batch(indices, texts, model_provider):
+    """按服务商的单次请求限制把文本依次分组，单段超出限制时独占一组。"""
+    max_items, max_size, size_of = _native_batch_limits(model_provider)
+    batches, current, current_size = [], [], 0
+    for i in indices:
+        size = size_of(texts[i])
+        if current and (current_size + size > max_size or (max_items and len(current) >= max_items)):
+            batches.append(current)
+            current, current_size = [], 0
+        current.append(i)
+        current_size += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _translate_native_batch(texts, target_language, model_provider, api_key, model_name):
+    """
+    一次请求翻译一组文本。
+
+    Returns:
+        list or None: 与 texts 对应的译文；接口不返回逐段结果时为 None。
+    """
+    if model_provider == 'caiyun':
+        return _caiyun_translate(texts, target_language, api_key, model_name)
+    if not api_key or not model_name:
+        raise ConfigError(f"{model_provider} 需要 API 凭证")
+    if model_provider == constants.BAIDU_TRANSLATE_ENGINE_ID:
+        baidu_translate.set_credentials(api_key, model_name)
+        to_lang = constants.PROJECT_TO_BAIDU_TRANSLATE_LANG_MAP.get(target_language, 'zh')
+        return baidu_translate.translate_batch(texts, 'auto', to_lang, max_retries=1)
+    youdao_translate.app_key = api_key
+    youdao_translate.app_secret = model_name
+    to_lang = constants.PROJECT_TO_YOUDAO_TRANSLATE_LANG_MAP.get(target_language, 'zh-CHS')
+    return youdao_translate.translate_batch(texts, 'auto', to_lang)
+
+
+def _translate_text_list_native_batch(texts, indices, target_language, model_provider, api_key, model_name,
+                                      rpm_limit_translation, progress=None):
+    """
+    机器翻译服务商的批量翻译：indices 指定的文本在接口长度限制内合并为尽量少的请求，
+    每个请求只占用一次 rpm 额度。某组请求失败或结果段数对不上时，该组退回逐段翻译。
+
+    Returns:
+        dict: {下标: 译文}
+    """
+    results = {}
+    pending = []
+    for i in indices:
+        text = texts[i]
+        if text and text.strip():
+            pending.append(i)
+        else:
+            results[i] = ""
+            if progress:
+                progress.advance(index=i, source=text, text="")
+    batches = _chunk_for_native_batch(pending, texts, model_provider)
+    logger.info(f"{model_provider} 批量翻译: {len(pending)} 段文本合并为 {len(batches)} 个请求")
+
+    def translate_batch(batch_index, batch):
+        batch_texts = [texts[i] for i in batch]
+
+        def request_once():
+            with request_slot('translation', model_provider, api_key, rpm_limit_translation, model=model_name,
+                              max_concurrency=get_translation_concurrency(model_provider)):
+                return _translate_native_batch(batch_texts, target_language, model_provider, api_key, model_name)
+
+        try:
+            translated = call_with_resilience('translation', model_provider, request_once,
+                                              is_retryable=is_retryable_error,
+                                              scope=breaker_scope(api_key=api_key))
+        except Exception as e:
+            logger.error(f"{model_provider} 批量请求 {batch_index} 失败: {e}")
+            translated = None
+        if translated is None or len(translated) != len(batch):
+            logger.warning(f"{model_provider} 批量请求 {batch_index} 未返回逐段结果，改为逐段翻译 {len(batch)} 段文本。")
+            translated = [translate_single_text(text, target_language, model_provider, api_key=api_key,
+                                                model_name=model_name, rpm_limit_translation=rpm_limit_translation)
+                          for text in batch_texts]
+        for i, text in zip(batch, translated):
+            results[i] = text.strip()
+            if progress:
+                progress.advance(index=i, source=texts[i], text=results[i])
+
+    _map_concurrently(batches, translate_batch, get_translation_concurrency(model_provider), progress)
+    return results
+
+
+# --- 翻译记忆 ---
+
+def _memory_scopes(use_translation_memory, source_language, target_language, model_provider, model_name, prompts):
+    """
+    返回翻译记忆及每种提示词对应的作用域。未启用时返回 (None, None)。
+
+    Args:
+        prompts (list): 实际使用的提示词，每种译文一个 (例如气泡提示词、文本框提示词)。
+    """
+    if not use_translation_memory or not model_provider or model_provider.lower() == 'mock':
+        return None, None
+    memory = get_translation_memory()
+    if not memory:
+        return None, None
+    return memory, [MemoryScope(source_language, target_language, model_provider, model_name, hash_prompt(prompt))
+                    for prompt in prompts]
+
+
+def _memory_lookup(memory, scopes, texts, indices):
+    """
+    在翻译记忆中查询 indices 指定的文本，所有作用域都命中的文本才算命中。
+
+    Returns:
+        dict: {下标: 各作用域译文组成的元组}
+    """
+    hits = {}
+    if not memory:
+        return hits
+    for i in indices:
+        if not texts[i] or not texts[i].strip():
+            continue
+        values = []
+        for scope in scopes:
+            match = memory.lookup(texts[i], scope)
+            if not match:
+                break
+            values.append(match[0])
+        else:
+            hits[i] = tuple(values)
+    return hits
+
+
+def _is_failed_translation(source, translated, provider=None):
+    if not translated or translated.startswith("翻译失败"):
+        return True
+    # 有道接口出错时返回原文，同样不应记入翻译记忆；
+    # 其他服务商的译文与原文相同 ("……"、"！？"、人名、拟声词等) 是正常结果，应当保存
+    return provider == constants.YOUDAO_TRANSLATE_ENGINE_ID and translated == source
+
+
+def _memory_store(memory, scopes, texts, results, elapsed_seconds):
+    """保存新翻译的结果 (跳过失败项)，并记录实际翻译耗时用于估算节省的时间。"""
+    if not memory or not results:
+        return
+    stored = 0
+    for i, values in results.items():
+        if any(_is_failed_translation(texts[i], value, scope.provider) for scope, value in zip(scopes, values)):
+            continue
+        for scope, value in zip(scopes, values):
+            memory.store(texts[i], value, scope)
+        stored += 1
+    memory.record_translation_time(len(results), elapsed_seconds * 1000)
+    if stored:
+        logger.debug(f"翻译记忆保存了 {stored} 段新译文。")
+
+
+def _build_routes(model_provider, api_key, model_name, custom_base_url, rpm_limit_translation, fallback_routes):
+    """主服务商加备用线路组成的路由列表；没有有效的备用线路时返回 None (不经过路由)。"""
+    if not fallback_routes or not model_provider or model_provider.lower() == 'mock':
+        return None
+    fallbacks = [route if isinstance(route, TranslationRoute) else TranslationRoute.from_dict(route)
+                 for route in fallback_routes]
+    fallbacks = [route for route in fallbacks if route is not None]
+    if not fallbacks:
+        return None
+    return [TranslationRoute(model_provider, api_key, model_name, custom_base_url, rpm_limit_translation)] + fallbacks
+
+
 def translate_text_list(texts, target_language, model_provider, 
                         api_key=None, model_name=None, prompt_content=None, 
                         use_json_format=False, custom_base_url=None,
-                        rpm_limit_translation: int = constants.DEFAULT_rpm_TRANSLATION): # <--- 新增rpm参数
+                        rpm_limit_translation: int = constants.DEFAULT_rpm_TRANSLATION, # <--- 新增rpm参数
+                        progress=None, max_concurrency=None,
+                        source_language=None, use_translation_memory=True,
+                        fallback_routes=None):
     """
     翻译文本列表中的每一项。
 
+    各项在线程池中并发翻译 (并发数见 get_translation_concurrency)，
+    rpm 限制由按服务商 + API Key 共享的令牌桶保证，因此并发不会超出额度。
+
     Args:
         texts (list): 包含待翻译文本字符串的列表。
         target_language (str): 目标语言代码。
@@ -459,46 +661,594 @@ def translate_text_list(texts, target_language, model_provider,
         use_json_format (bool): 是否期望并解析JSON格式的响应。
         custom_base_url (str, optional): 用户自定义的 OpenAI 兼容 API 的 Base URL。
         rpm_limit_translation (int): 翻译服务的每分钟请求数限制。
+        progress (ProgressReporter, optional): 每翻译完一项上报一次进度；
+            每项开始前检查取消标志，已取消时抛出 ProcessingCancelled，剩余文本不再请求。
+        max_concurrency (int, optional): 最大并发请求数，默认按服务商决定。
+        source_language (str, optional): 源语言，作为翻译记忆作用域的一部分。
+        use_translation_memory (bool): 请求翻译服务前先查询翻译记忆，并保存新的译文。
+        fallback_routes (list, optional): 备用线路 (TranslationRoute 或字典)，按优先级排序。
+            提供时每段文本按 主服务商 -> 备用线路 的顺序对冲请求与故障转移 (见 translation_router)；
+            由备用线路给出的译文不写入主服务商的翻译记忆。
     Returns:
         list: 包含翻译后文本的列表，顺序与输入列表一致。失败的项包含错误信息。
     """
-    translated_texts = []
     if not texts:
-        return translated_texts
+        return []
 
-    logger.info(f"开始批量翻译 {len(texts)} 个文本片段 (使用 {model_provider}, rpm: {rpm_limit_translation if rpm_limit_translation > 0 else '无'})...")
-    
-    # 特殊处理模拟翻译提供商
-    if model_provider.lower() == 'mock':
-        logger.info("使用模拟翻译提供商")
-        for i, text in enumerate(texts):
-            translated = translate_with_mock(
-                text,
-                target_language,
-                api_key=api_key,
-                model_name=model_name,
-                prompt_content=prompt_content
-            )
-            translated_texts.append(translated)
-    else:    
-        # 正常翻译流程
-        for i, text in enumerate(texts):
-            translated = translate_single_text(
-                text,
-                target_language,
-                model_provider,
-                api_key=api_key,
-                model_name=model_name,
-                prompt_content=prompt_content,
-                use_json_format=use_json_format,
-                custom_base_url=custom_base_url,
-                rpm_limit_translation=rpm_limit_translation # <--- 传递参数
-            )
-            translated_texts.append(translated)
-    
-    logger.info("批量翻译完成。")
+    if max_concurrency is None:
+        max_concurrency = get_translation_concurrency(model_provider)
+    logger.info(f"开始批量翻译 {len(texts)} 个文本片段 (使用 {model_provider}, rpm: {rpm_limit_translation if rpm_limit_translation > 0 else '无'}, 并发: {max_concurrency})...")
+    start_time = time.time()
+
+    translated_texts = [None] * len(texts)
+    effective_prompt = prompt_content or (constants.DEFAULT_TRANSLATE_JSON_PROMPT if use_json_format else constants.DEFAULT_PROMPT)
+    memory, scopes = _memory_scopes(use_translation_memory, source_language, target_language,
+                                    model_provider, model_name, [effective_prompt])
+    # 空白文本 (包括 OCR 前被判定为空白的气泡) 不查询翻译记忆，也不请求翻译服务
+    blank = [i for i, text in enumerate(texts) if not text or not text.strip()]
+    for i in blank:
+        translated_texts[i] = ""
+        if progress:
+            progress.advance(index=i, source=texts[i], text="")
+    if blank:
+        logger.info(f"跳过 {len(blank)}/{len(texts)} 段空白文本。")
+    non_blank = [i for i in range(len(texts)) if translated_texts[i] is None]
+    hits = _memory_lookup(memory, scopes, texts, non_blank)
+    for i, (translated,) in hits.items():
+        translated_texts[i] = translated
+        if progress:
+            progress.advance(index=i, source=texts[i], text=translated, memory_hit=True)
+    pending = [i for i in non_blank if i not in hits]
+
+    routes = _build_routes(model_provider, api_key, model_name, custom_base_url, rpm_limit_translation, fallback_routes)
+    served_by_fallback = set()
+
+    network_start = time.time()
+    if not routes and model_provider in NATIVE_BATCH_PROVIDERS and len(pending) > 1:
+        batch_results = _translate_text_list_native_batch(texts, pending, target_language, model_provider, api_key, model_name,
+                                                          rpm_limit_translation, progress)
+        for i in pending:
+            translated_texts[i] = batch_results[i]
+    else:
+        def translate_one(_, i):
+            text = texts[i]
+            # 特殊处理模拟翻译提供商
+            if model_provider.lower() == 'mock':
+                translated = translate_with_mock(
+                    text,
+                    target_language,
+                    api_key=api_key,
+                    model_name=model_name,
+                    prompt_content=prompt_content
+                )
+            elif routes:
+                def attempt(route):
+                    return translate_single_text(
+                        text, target_language, route.provider,
+                        api_key=route.api_key, model_name=route.model_name,
+                        prompt_content=prompt_content, use_json_format=use_json_format,
+                        custom_base_url=route.custom_base_url, rpm_limit_translation=route.rpm_limit)
+
+                translated, route_index = route_translation(routes, attempt, lambda result: not result or result.startswith("翻译失败"))
+                if route_index:
+                    served_by_fallback.add(i)
+            else:
+                translated = translate_single_text(
+                    text,
+                    target_language,
+                    model_provider,
+                    api_key=api_key,
+                    model_name=model_name,
+                    prompt_content=prompt_content,
+                    use_json_format=use_json_format,
+                    custom_base_url=custom_base_url,
+                    rpm_limit_translation=rpm_limit_translation # <--- 传递参数
+                )
+            if progress:
+                progress.advance(index=i, source=text, text=translated)
+            return translated
+
+        for i, translated in zip(pending, _map_concurrently(pending, translate_one, max_concurrency, progress)):
+            translated_texts[i] = translated
+        if served_by_fallback:
+            logger.info(f"{len(served_by_fallback)} 段文本由备用线路翻译。")
+
+    _memory_store(memory, scopes, texts, {i: (translated_texts[i],) for i in pending if i not in served_by_fallback},
+                  time.time() - network_start)
+    logger.info(f"批量翻译完成 (翻译记忆命中 {len(hits)} 段, 耗时: {time.time() - start_time:.2f}s)。")
     return translated_texts
 
+# --- 双提示词合并翻译 ---
+
+# 能够按提示词输出 JSON 的对话式大模型服务商。
+# 百度/有道/彩云是机器翻译接口，Sakura 使用固定提示词，均无法同时给出两种译文，也无法打包翻译
+CHAT_LLM_PROVIDERS = ('siliconflow', 'deepseek', 'volcano', 'ollama', 'gemini', constants.CUSTOM_OPENAI_PROVIDER_ID)
+
+
+def supports_dual_prompt(model_provider):
+    """判断服务商能否在一次请求中同时返回气泡译文和文本框译文。"""
+    return bool(model_provider) and model_provider.lower() in CHAT_LLM_PROVIDERS
+
+
+def _build_dual_prompt(bubble_prompt, textbox_prompt):
+    """将气泡提示词和文本框提示词合并为一个要求 JSON 输出的提示词。"""
+    return constants.DEFAULT_DUAL_TRANSLATE_JSON_PROMPT \
+        .replace('{bubble_prompt}', bubble_prompt or constants.DEFAULT_PROMPT) \
+        .replace('{textbox_prompt}', textbox_prompt or constants.DEFAULT_TEXTBOX_PROMPT)
+
+
+def _parse_dual_translation(raw_text):
+    """
+    从合并翻译的响应中解析两种译文。
+
+    Returns:
+        tuple or None: (bubble_text, textbox_text)；任一字段缺失时返回 None，由调用方回退。
+    """
+    if not raw_text:
+        return None
+    # 去掉模型可能包裹的 ```json 代码块
+    cleaned = re.sub(r'^\s*```(?:json)?\s*|\s*```\s*$', '', raw_text.strip())
+    try:
+        match = re.search(r'\{.*\}', cleaned, re.DOTALL)
+        data = json.loads(match.group(0) if match else cleaned)
+        bubble_text, textbox_text = data.get('bubble_text'), data.get('textbox_text')
+        if isinstance(bubble_text, str) and isinstance(textbox_text, str):
+            return bubble_text.strip(), textbox_text.strip()
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        pass
+
+    # JSON 不规范 (例如译文中含未转义的引号) 时，用正则逐个提取字段
+    fields = []
+    for field_name in ('bubble_text', 'textbox_text'):
+        pattern = r'"' + field_name + r'"\s*:\s*"(.*?)"\s*(?:,\s*"|\})'
+        match = re.search(pattern, cleaned, re.DOTALL)
+        if not match:
+            return None
+        fields.append(match.group(1).replace('\\"', '"').replace('\\n', '\n').replace('\\\\', '\\').strip())
+    return tuple(fields)
+
+
+def translate_dual_text_list(texts, target_language, model_provider,
+                             api_key=None, model_name=None,
+                             bubble_prompt=None, textbox_prompt=None,
+                             custom_base_url=None,
+                             rpm_limit_translation: int = constants.DEFAULT_rpm_TRANSLATION,
+                             progress=None, source_language=None, use_translation_memory=True):
+    """
+    一次请求同时获取每段文本的气泡译文和文本框译文，代替两次 translate_text_list 调用。
+
+    服务商不支持合并翻译时退回到分别翻译；某一项的响应无法解析时，
+    该项的气泡译文取响应中能提取到的内容，文本框译文单独再请求一次。
+
+    Args:
+        texts (list): 待翻译文本列表。
+        bubble_prompt (str, optional): 气泡提示词 (简洁译文)。
+        textbox_prompt (str, optional): 文本框提示词 (解释性译文)。
+        其余参数同 translate_text_list。
+
+    Returns:
+        tuple: (bubble_texts, textbox_texts)，顺序与输入一致。
+    """
+    if not texts:
+        return [], []
+
+    if not supports_dual_prompt(model_provider):
+        logger.info(f"服务商 {model_provider} 不支持合并翻译，将分别请求气泡译文和文本框译文。")
+        bubble_texts = translate_text_list(texts, target_language, model_provider, api_key, model_name, bubble_prompt,
+                                           custom_base_url=custom_base_url, rpm_limit_translation=rpm_limit_translation,
+                                           progress=progress, source_language=source_language,
+                                           use_translation_memory=use_translation_memory)
+        if progress:
+            progress.set_stage('textbox_translation', len(texts))
+        textbox_texts = translate_text_list(texts, target_language, model_provider, api_key, model_name, textbox_prompt,
+                                            custom_base_url=custom_base_url, rpm_limit_translation=rpm_limit_translation,
+                                            progress=progress, source_language=source_language,
+                                            use_translation_memory=use_translation_memory)
+        return bubble_texts, textbox_texts
+
+    logger.info(f"开始合并翻译 {len(texts)} 个文本片段 (使用 {model_provider}，每段一次请求同时获取气泡和文本框译文)...")
+    dual_prompt = _build_dual_prompt(bubble_prompt, textbox_prompt)
+    fallback_count = [0]
+    results = [None] * len(texts)
+    memory, scopes = _memory_scopes(use_translation_memory, source_language, target_language, model_provider, model_name,
+                                    [bubble_prompt or constants.DEFAULT_PROMPT, textbox_prompt or constants.DEFAULT_TEXTBOX_PROMPT])
+    hits = _memory_lookup(memory, scopes, texts, range(len(texts)))
+    for i, (bubble_text, textbox_text) in hits.items():
+        results[i] = (bubble_text, textbox_text)
+        if progress:
+            progress.advance(index=i, source=texts[i], text=bubble_text, textbox_text=textbox_text, memory_hit=True)
+    pending = [i for i in range(len(texts)) if i not in hits]
+
+    def translate_one(_, i):
+        text = texts[i]
+        raw = translate_single_text(
+            text, target_language, model_provider,
+            api_key=api_key, model_name=model_name, prompt_content=dual_prompt,
+            use_json_format=False, custom_base_url=custom_base_url,
+            rpm_limit_translation=rpm_limit_translation
+        )
+        if not raw or raw.startswith("翻译失败"):
+            bubble_text = textbox_text = raw
+        else:
+            parsed = _parse_dual_translation(raw)
+            if parsed:
+                bubble_text, textbox_text = parsed
+            else:
+                fallback_count[0] += 1
+                logger.warning(f"文本 {i} 的合并翻译响应无法解析，将单独请求文本框译文。原始响应: {raw[:200]}")
+                bubble_text = _safely_extract_from_json(raw, "bubble_text")
+                textbox_text = translate_single_text(
+                    text, target_language, model_provider,
+                    api_key=api_key, model_name=model_name, prompt_content=textbox_prompt,
+                    custom_base_url=custom_base_url, rpm_limit_translation=rpm_limit_translation
+                )
+        if progress:
+            progress.advance(index=i, source=text, text=bubble_text, textbox_text=textbox_text)
+        return bubble_text, textbox_text
+
+    network_start = time.time()
+    for i, result in zip(pending, _map_concurrently(pending, translate_one, get_translation_concurrency(model_provider), progress)):
+        results[i] = result
+    _memory_store(memory, scopes, texts, {i: results[i] for i in pending}, time.time() - network_start)
+    bubble_texts = [bubble_text for bubble_text, _ in results]
+    textbox_texts = [textbox_text for _, textbox_text in results]
+
+    logger.info(f"合并翻译完成 (翻译记忆命中 {len(hits)} 段，其中 {fallback_count[0]} 段回退为单独请求文本框译文)。")
+    return bubble_texts, textbox_texts
+
+# --- 打包翻译 ---
+
+def supports_packed_translation(model_provider):
+    """判断服务商能否把多段文本打包到一次请求中翻译。"""
+    return bool(model_provider) and model_provider.lower() in CHAT_LLM_PROVIDERS
+
+
+def estimate_tokens(text):
+    """粗略估计文本的 token 数：中日韩字符约每字 1 个，其余字符约每 4 个 1 个。"""
+    if not text:
+        return 0
+    cjk_count = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def _pack_batches(indices, texts, token_budget, max_items, outputs_per_item=1):
+    """
+    按顺序把文本分组，每组原文与译文的估计 token 总数不超过 token_budget。
+    单段文本超出预算时独占一组。
+
+    Returns:
+        list: 每个元素为一组文本在 texts 中的下标列表。
+    """
+    batches, current, current_tokens = [], [], 0
+    for i in indices:
+        # 每段文本: 原文 + 每种译文约与原文等长 + JSON 包装的固定开销
+        tokens = estimate_tokens(texts[i]) * (1 + outputs_per_item) + 10
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_packed_translation(raw_text, expected_count, fields):
+    """
+    解析打包翻译返回的 JSON 数组。
+
+    按 "id" 把译文对应回输入；元素缺少 id 且数组长度与输入一致时按位置对应。
+    编号越界、重复或缺少任一字段的元素被忽略，由调用方把缺失的文本单独重新请求。
+
+    Returns:
+        dict: {编号 (从 1 开始): 各字段译文组成的元组}
+    """
+    if not raw_text:
+        return {}
+    cleaned = re.sub(r'^\s*```(?:json)?\s*|\s*```\s*$', '', raw_text.strip())
+    entries = None
+    try:
+        match = re.search(r'\[.*\]', cleaned, re.DOTALL)
+        entries = json.loads(match.group(0) if match else cleaned)
+    except (json.JSONDecodeError, TypeError):
+        pass
+    if not isinstance(entries, list):
+        # 整体不是合法 JSON (例如个别译文中有未转义的引号) 时，逐个对象解析，尽量保住其余译文
+        entries = []
+        for obj_text in re.findall(r'\{[^{}]*\}', cleaned, re.DOTALL):
+            try:
+                entries.append(json.loads(obj_text))
+            except json.JSONDecodeError:
+                continue
+
+    parsed = {}
+    for position, entry in enumerate(entries, 1):
+        item = _packed_entry(entry, fields, expected_count, position if len(entries) == expected_count else None)
+        if item and item[0] not in parsed:
+            parsed[item[0]] = item[1]
+    return parsed
+
+
+def _packed_entry(entry, fields, expected_count, default_id=None):
+    """
+    取出打包翻译结果中一个数组元素的编号和译文。
+
+    Returns:
+        tuple or None: (编号, 各字段译文组成的元组)；元素无效时为 None。
+    """
+    if not isinstance(entry, dict):
+        return None
+    values = [entry.get(field) for field in fields]
+    if not all(isinstance(value, str) for value in values):
+        return None
+    try:
+        item_id = int(entry.get('id', default_id))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= item_id <= expected_count:
+        return None
+    return item_id, tuple(value.strip() for value in values)
+
+
+def _translate_packed_items(texts, target_language, model_provider, api_key, model_name,
+                            custom_base_url, rpm_limit_translation, system_prompt, fields,
+                            fallback, on_item_done, token_budget, progress=None, known=None,
+                            use_streaming=constants.DEFAULT_STREAMING_TRANSLATION):
+    """
+    打包翻译的公共实现。
+
+    Args:
+        texts (list): 所有待翻译文本 (可来自多页)。
+        system_prompt (str): 要求返回编号 JSON 数组的提示词。
+        fields (tuple): 每个数组元素中需要取出的译文字段。
+        fallback (callable): fallback(texts) -> 与 fields 对应的元组列表，用于单独重新翻译失败的文本。
+        on_item_done (callable): on_item_done(index, result) 每段文本完成时调用。
+        progress (ProgressReporter, optional): 仅用于检查取消。
+        known (dict, optional): {下标: 译文元组}，已有译文 (例如翻译记忆命中) 的文本不再请求。
+        use_streaming (bool): 以流式方式接收回复，数组中每个元素一闭合就调用 on_item_done，
+            不必等整个请求结束 (见 _stream_packed_batch)。
+
+    Returns:
+        list: 每段文本的译文元组，顺序与输入一致。
+    """
+    results = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        if known and i in known:
+            results[i] = known[i]
+            on_item_done(i, results[i])
+        elif text and text.strip():
+            pending.append(i)
+        else:
+            results[i] = ("",) * len(fields)
+            on_item_done(i, results[i])
+    if not pending:
+        return results
+
+    batches = _pack_batches(pending, texts, token_budget, constants.PACKED_TRANSLATION_MAX_ITEMS, len(fields))
+    logger.info(f"打包翻译: {len(pending)} 段文本合并为 {len(batches)} 个请求 (使用 {model_provider}, token 预算: {token_budget})")
+    failed = []
+    failed_lock = threading.Lock()
+
+    def send_batch(batch_index, batch):
+        payload = json.dumps([{"id": n + 1, "text": texts[i]} for n, i in enumerate(batch)], ensure_ascii=False)
+        emitted = {}
+        if use_streaming and supports_streaming(model_provider):
+            def emit(item_id, values):
+                i = batch[item_id - 1]
+                results[i] = values
+                on_item_done(i, values)
+
+            raw = _stream_packed_batch(payload, len(batch), fields, model_provider, api_key, model_name,
+                                       custom_base_url, rpm_limit_translation, system_prompt, emitted, emit)
+        else:
+            raw = translate_single_text(
+                payload, target_language, model_provider,
+                api_key=api_key, model_name=model_name, prompt_content=system_prompt,
+                use_json_format=False, custom_base_url=custom_base_url,
+                rpm_limit_translation=rpm_limit_translation
+            )
+        # 流式解析跳过的元素 (例如译文中有未转义的引号) 用完整回复再解析一次
+        parsed = {} if not raw or raw.startswith("翻译失败") else _parse_packed_translation(raw, len(batch), fields)
+        parsed.update(emitted)
+        if len(parsed) != len(batch):
+            logger.warning(f"打包请求 {batch_index} 返回 {len(parsed)}/{len(batch)} 段译文，缺失的将单独重新翻译。原始响应: {(raw or '')[:200]}")
+        missing = []
+        for n, i in enumerate(batch):
+            if n + 1 in emitted:
+                continue
+            if n + 1 in parsed:
+                results[i] = parsed[n + 1]
+                on_item_done(i, results[i])
+            else:
+                missing.append(i)
+        with failed_lock:
+            failed.extend(missing)
+
+    _map_concurrently(batches, send_batch, get_translation_concurrency(model_provider), progress)
+
+    if failed:
+        failed.sort()
+        logger.info(f"打包翻译: {len(failed)} 段文本单独重新翻译。")
+        for i, result in zip(failed, fallback([texts[i] for i in failed])):
+            results[i] = result
+            on_item_done(i, result)
+    return results
+
+
+def supports_streaming(model_provider):
+    """服务商是否支持流式接收打包翻译的回复 (OpenAI 兼容接口与 Ollama)。"""
+    return supports_packed_translation(model_provider)
+
+
+def _stream_packed_batch(payload, expected_count, fields, model_provider, api_key, model_name,
+                         custom_base_url, rpm_limit_translation, system_prompt, emitted, emit):
+    """
+    以流式方式发送一个打包请求，数组元素一闭合就通过 emit(编号, 译文元组) 交给调用方，并记入 emitted。
+
+    已经产出译文后请求中断时不再重试 (重试会重复产出)，未产出的文本由调用方单独重新翻译。
+
+    Returns:
+        str: 完整的回复文本；失败时为 "翻译失败: ..."。
+    """
+    def request_once():
+        parser = IncrementalJsonArrayParser()
+        with request_slot('translation', model_provider, api_key, rpm_limit_translation, model=model_name,
+                          max_concurrency=get_translation_concurrency(model_provider)):
+            for delta in _stream_chat(model_provider, api_key, model_name, system_prompt, payload, custom_base_url):
+                for entry in parser.feed(delta):
+                    item = _packed_entry(entry, fields, expected_count)
+                    if item and item[0] not in emitted:
+                        emitted[item[0]] = item[1]
+                        emit(*item)
+        return parser.text
+
+    try:
+        return call_with_resilience('translation', model_provider, request_once,
+                                    is_retryable=lambda e: not emitted and is_retryable_error(e),
+                                    scope=breaker_scope(custom_base_url, api_key))
+    except Exception as e:
+        logger.error(f"流式打包请求失败 (已收到 {len(emitted)}/{expected_count} 段译文): {e}")
+        return f"翻译失败: {e}"
+
+
+def _flatten_pages(pages_texts):
+    """把多页文本展平，返回 (展平后的文本列表, 每段文本对应的 (页序号, 页内序号))。"""
+    flat_texts, positions = [], []
+    for page_index, texts in enumerate(pages_texts):
+        for item_index, text in enumerate(texts or []):
+            flat_texts.append(text)
+            positions.append((page_index, item_index))
+    return flat_texts, positions
+
+
+def _first_progress(progresses):
+    return next((p for p in progresses if p is not None), None)
+
+
+def translate_packed_pages(pages_texts, target_language, model_provider,
+                           api_key=None, model_name=None, prompt_content=None,
+                           use_json_format=False, custom_base_url=None,
+                           rpm_limit_translation: int = constants.DEFAULT_rpm_TRANSLATION,
+                           progresses=None,
+                           token_budget=constants.PACKED_TRANSLATION_TOKEN_BUDGET,
+                           source_language=None, use_translation_memory=True,
+                           use_streaming=constants.DEFAULT_STREAMING_TRANSLATION):
+    """
+    把一页或多页的所有文本按 token 预算打包成尽量少的请求进行翻译。
+
+    系统提示词每个请求只发送一次，请求数也只按打包后的数量占用 rpm 额度。
+    每个请求要求模型返回带编号的 JSON 数组，只有缺失或无法解析的文本才会单独重新请求。
+    服务商不支持打包时退回到逐页调用 translate_text_list。
+
+    Args:
+        pages_texts (list): 每个元素为一页的待翻译文本列表。
+        progresses (list, optional): 与 pages_texts 对应的每页 ProgressReporter (可含 None)，
+            每段文本完成时在所属页上报一次进度。
+        token_budget (int): 单个请求中原文与译文的估计 token 总数上限。
+        use_streaming (bool): 流式接收回复，每段译文解析出来就立即上报进度。
+        其余参数同 translate_text_list。use_json_format 仅用于单独重新请求的文本。
+
+    Returns:
+        list: 每页的译文列表，结构与 pages_texts 一致。
+    """
+    progresses = list(progresses) if progresses else [None] * len(pages_texts)
+    if not supports_packed_translation(model_provider):
+        logger.info(f"服务商 {model_provider} 不支持打包翻译，将逐段请求。")
+        return [translate_text_list(texts, target_language, model_provider, api_key, model_name, prompt_content,
+                                    use_json_format=use_json_format, custom_base_url=custom_base_url,
+                                    rpm_limit_translation=rpm_limit_translation, progress=progress,
+                                    source_language=source_language, use_translation_memory=use_translation_memory)
+                for texts, progress in zip(pages_texts, progresses)]
+
+    flat_texts, positions = _flatten_pages(pages_texts)
+    system_prompt = constants.DEFAULT_PACKED_TRANSLATE_PROMPT.replace('{prompt}', prompt_content or constants.DEFAULT_PROMPT)
+
+    memory, scopes = _memory_scopes(use_translation_memory, source_language, target_language, model_provider, model_name,
+                                    [prompt_content or constants.DEFAULT_PROMPT])
+    hits = _memory_lookup(memory, scopes, flat_texts, range(len(flat_texts)))
+
+    def fallback(texts):
+        translated = translate_text_list(texts, target_language, model_provider, api_key, model_name, prompt_content,
+                                         use_json_format=use_json_format, custom_base_url=custom_base_url,
+                                         rpm_limit_translation=rpm_limit_translation, use_translation_memory=False)
+        return [(text,) for text in translated]
+
+    def on_item_done(i, result):
+        page_index, item_index = positions[i]
+        if progresses[page_index]:
+            progresses[page_index].advance(index=item_index, source=flat_texts[i], text=result[0])
+
+    start_time = time.time()
+    results = _translate_packed_items(flat_texts, target_language, model_provider, api_key, model_name,
+                                      custom_base_url, rpm_limit_translation, system_prompt, ('translation',),
+                                      fallback, on_item_done, token_budget, _first_progress(progresses), known=hits,
+                                      use_streaming=use_streaming)
+    _memory_store(memory, scopes, flat_texts, {i: results[i] for i in range(len(flat_texts)) if i not in hits}, time.time() - start_time)
+    pages_results = [[""] * len(texts or []) for texts in pages_texts]
+    for (page_index, item_index), (translated,) in zip(positions, results):
+        pages_results[page_index][item_index] = translated
+    logger.info(f"打包翻译完成: {len(pages_texts)} 页 {len(flat_texts)} 段文本 (耗时: {time.time() - start_time:.2f}s)")
+    return pages_results
+
+
+def translate_packed_dual_pages(pages_texts, target_language, model_provider,
+                                api_key=None, model_name=None,
+                                bubble_prompt=None, textbox_prompt=None,
+                                custom_base_url=None,
+                                rpm_limit_translation: int = constants.DEFAULT_rpm_TRANSLATION,
+                                progresses=None,
+                                token_budget=constants.PACKED_TRANSLATION_TOKEN_BUDGET,
+                                source_language=None, use_translation_memory=True,
+                                use_streaming=constants.DEFAULT_STREAMING_TRANSLATION):
+    """
+    打包翻译与双提示词合并翻译结合：一次请求为多段文本同时取得气泡译文和文本框译文。
+    缺失的文本单独通过 translate_dual_text_list 重新请求。
+
+    Returns:
+        list: 每页一个 (bubble_texts, textbox_texts) 元组。
+    """
+    progresses = list(progresses) if progresses else [None] * len(pages_texts)
+    if not supports_packed_translation(model_provider):
+        return [translate_dual_text_list(texts, target_language, model_provider, api_key, model_name,
+                                         bubble_prompt, textbox_prompt, custom_base_url=custom_base_url,
+                                         rpm_limit_translation=rpm_limit_translation, progress=progress,
+                                         source_language=source_language, use_translation_memory=use_translation_memory)
+                for texts, progress in zip(pages_texts, progresses)]
+
+    flat_texts, positions = _flatten_pages(pages_texts)
+    system_prompt = constants.DEFAULT_PACKED_DUAL_TRANSLATE_PROMPT \
+        .replace('{bubble_prompt}', bubble_prompt or constants.DEFAULT_PROMPT) \
+        .replace('{textbox_prompt}', textbox_prompt or constants.DEFAULT_TEXTBOX_PROMPT)
+
+    memory, scopes = _memory_scopes(use_translation_memory, source_language, target_language, model_provider, model_name,
+                                    [bubble_prompt or constants.DEFAULT_PROMPT, textbox_prompt or constants.DEFAULT_TEXTBOX_PROMPT])
+    hits = _memory_lookup(memory, scopes, flat_texts, range(len(flat_texts)))
+
+    def fallback(texts):
+        bubble_texts, textbox_texts = translate_dual_text_list(
+            texts, target_language, model_provider, api_key, model_name, bubble_prompt, textbox_prompt,
+            custom_base_url=custom_base_url, rpm_limit_translation=rpm_limit_translation, use_translation_memory=False)
+        return list(zip(bubble_texts, textbox_texts))
+
+    def on_item_done(i, result):
+        page_index, item_index = positions[i]
+        if progresses[page_index]:
+            progresses[page_index].advance(index=item_index, source=flat_texts[i], text=result[0], textbox_text=result[1])
+
+    start_time = time.time()
+    results = _translate_packed_items(flat_texts, target_language, model_provider, api_key, model_name,
+                                      custom_base_url, rpm_limit_translation, system_prompt, ('bubble_text', 'textbox_text'),
+                                      fallback, on_item_done, token_budget, _first_progress(progresses), known=hits,
+                                      use_streaming=use_streaming)
+    _memory_store(memory, scopes, flat_texts, {i: results[i] for i in range(len(flat_texts)) if i not in hits}, time.time() - start_time)
+    pages_results = [([""] * len(texts or []), [""] * len(texts or [])) for texts in pages_texts]
+    for (page_index, item_index), (bubble_text, textbox_text) in zip(positions, results):
+        pages_results[page_index][0][item_index] = bubble_text
+        pages_results[page_index][1][item_index] = textbox_text
+    logger.info(f"打包合并翻译完成: {len(pages_texts)} 页 {len(flat_texts)} 段文本 (耗时: {time.time() - start_time:.2f}s)")
+    return pages_results
+
 # --- 测试代码 ---
 if __name__ == '__main__':
     # 设置基本的日志配置，以便在测试时查看日志
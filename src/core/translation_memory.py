@@ -0,0 +1,273 @@
+"""
+持久化的翻译记忆 (Translation Memory)。
+
+汉化章节中角色名、拟声词、口头禅、"……" 等文本大量重复，每次重复都要重新请求付费的大模型。
+翻译记忆以 SQLite 保存已完成的译文，翻译前先查询：
+
+    - 精确匹配: 规范化后的原文完全相同
+    - 模糊匹配: 通过字符三元组 (trigram) 索引找出候选，再用 difflib 计算相似度，超过阈值才采用
+
+每条记录属于一个作用域，作用域由 (源语言, 目标语言, 服务商, 模型, 提示词哈希) 决定，
+更换模型或提示词后不会复用旧译文。数据库保存在 data/translation_memory.db。
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from difflib import SequenceMatcher
+
+from src.shared import constants
+from src.shared.path_helpers import resource_path
+
+logger = logging.getLogger("CoreTranslationMemory")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope TEXT NOT NULL,
+    source_norm TEXT NOT NULL,
+    source TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    source_lang TEXT,
+    target_lang TEXT,
+    provider TEXT,
+    model TEXT,
+    prompt_hash TEXT,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (scope, source_norm)
+);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    entry_id INTEGER NOT NULL,
+    scope TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_grams_scope_gram ON grams (scope, gram);
+CREATE INDEX IF NOT EXISTS idx_grams_entry ON grams (entry_id);
+"""
+
+# 导出/导入时使用的字段
+_EXPORT_FIELDS = ('source', 'translation', 'source_lang', 'target_lang', 'provider', 'model', 'prompt_hash', 'hits')
+
+
+def normalize_text(text):
+    """规范化原文: 全角/半角统一 (NFKC)、合并空白、去掉首尾空白。"""
+    if not text:
+        return ""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def hash_prompt(prompt_content):
+    """提示词哈希，作为作用域的一部分。"""
+    return hashlib.sha1((prompt_content or '').encode('utf-8')).hexdigest()[:16]
+
+
+class MemoryScope:
+    """一组翻译设置对应的作用域。"""
+    def __init__(self, source_lang, target_lang, provider, model, prompt_hash):
+        self.source_lang = source_lang or ''
+        self.target_lang = target_lang or ''
+        self.provider = provider or ''
+        self.model = model or ''
+        self.prompt_hash = prompt_hash or ''
+        raw = "\x00".join((self.source_lang, self.target_lang, self.provider, self.model, self.prompt_hash))
+        self.key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """
+    SQLite 翻译记忆。线程安全 (单连接 + 锁)，可在并发翻译线程和多个后台任务间共享。
+    """
+    def __init__(self, db_path, fuzzy_threshold=constants.TRANSLATION_MEMORY_FUZZY_THRESHOLD):
+        self.db_path = db_path
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._stats = {'exact_hits': 0, 'fuzzy_hits': 0, 'misses': 0, 'stores': 0, 'saved_chars': 0}
+        self._translated_items = 0
+        self._translated_ms = 0.0
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        logger.info(f"翻译记忆已加载: {count} 条记录 ({db_path})")
+
+    # --- 查询 ---
+
+    def lookup(self, text, scope, fuzzy=True):
+        """
+        查询一段原文的译文。
+
+        Returns:
+            tuple or None: (译文, 相似度)。精确匹配的相似度为 1.0。
+        """
+        source_norm = normalize_text(text)
+        if not source_norm:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, translation FROM entries WHERE scope = ? AND source_norm = ?",
+                (scope.key, source_norm)).fetchone()
+            if row:
+                self._touch(row[0])
+                self._stats['exact_hits'] += 1
+                self._stats['saved_chars'] += len(source_norm)
+                return row[1], 1.0
+            match = self._fuzzy_lookup(source_norm, scope) if fuzzy and len(source_norm) >= constants.TRANSLATION_MEMORY_FUZZY_MIN_CHARS else None
+            if match:
+                self._touch(match[0])
+                self._stats['fuzzy_hits'] += 1
+                self._stats['saved_chars'] += len(source_norm)
+                return match[1], match[2]
+            self._stats['misses'] += 1
+            return None
+
+    def _fuzzy_lookup(self, source_norm, scope):
+        """按共享三元组数量取候选，再计算相似度。调用方需持有锁。"""
+        grams = list(_trigrams(source_norm))
+        placeholders = ','.join('?' * len(grams))
+        candidates = self._conn.execute(
+            f"SELECT e.id, e.translation, e.source_norm FROM grams g JOIN entries e ON e.id = g.entry_id "
+            f"WHERE g.scope = ? AND g.gram IN ({placeholders}) "
+            f"GROUP BY g.entry_id ORDER BY COUNT(*) DESC LIMIT ?",
+            [scope.key] + grams + [constants.TRANSLATION_MEMORY_FUZZY_CANDIDATES]).fetchall()
+        best = None
+        for entry_id, translation, candidate in candidates:
+            # 长度相差过大时不可能超过阈值，跳过
+            if min(len(candidate), len(source_norm)) * 2 / (len(candidate) + len(source_norm)) < self.fuzzy_threshold:
+                continue
+            ratio = SequenceMatcher(None, source_norm, candidate).ratio()
+            if ratio >= self.fuzzy_threshold and (best is None or ratio > best[2]):
+                best = (entry_id, translation, ratio)
+        return best
+
+    def _touch(self, entry_id):
+        self._conn.execute("UPDATE entries SET hits = hits + 1 WHERE id = ?", (entry_id,))
+        self._conn.commit()
+
+    # --- 写入 ---
+
+    def store(self, text, translation, scope):
+        """保存一条译文 (同一作用域内相同原文会被覆盖)。"""
+        source_norm = normalize_text(text)
+        if not source_norm or not translation:
+            return
+        with self._lock:
+            self._insert(source_norm, text, translation, scope, 0)
+            self._conn.commit()
+            self._stats['stores'] += 1
+
+    def _insert(self, source_norm, source, translation, scope, hits):
+        now = time.time()
+        row = self._conn.execute("SELECT id FROM entries WHERE scope = ? AND source_norm = ?",
+                                 (scope.key, source_norm)).fetchone()
+        if row:
+            self._conn.execute("UPDATE entries SET translation = ?, source = ?, updated_at = ? WHERE id = ?",
+                               (translation, source, now, row[0]))
+            return
+        cursor = self._conn.execute(
+            "INSERT INTO entries (scope, source_norm, source, translation, source_lang, target_lang, provider, model, "
+            "prompt_hash, hits, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (scope.key, source_norm, source, translation, scope.source_lang, scope.target_lang,
+             scope.provider, scope.model, scope.prompt_hash, hits, now, now))
+        self._conn.executemany("INSERT INTO grams (gram, entry_id, scope) VALUES (?, ?, ?)",
+                               [(gram, cursor.lastrowid, scope.key) for gram in _trigrams(source_norm)])
+
+    def record_translation_time(self, count, elapsed_ms):
+        """记录未命中文本实际翻译的耗时，用于估算命中节省的时间。"""
+        with self._lock:
+            self._translated_items += count
+            self._translated_ms += elapsed_ms
+
+    # --- 导入导出与管理 ---
+
+    def export_entries(self):
+        """导出全部记录 (不含内部作用域哈希)。"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_EXPORT_FIELDS)} FROM entries ORDER BY id").fetchall()
+        return [dict(zip(_EXPORT_FIELDS, row)) for row in rows]
+
+    def import_entries(self, entries):
+        """
+        导入记录 (格式同 export_entries)。缺少原文或译文的记录被跳过。
+
+        Returns:
+            int: 成功导入的记录数。
+        """
+        imported = 0
+        with self._lock:
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                source_norm = normalize_text(entry.get('source'))
+                translation = entry.get('translation')
+                if not source_norm or not isinstance(translation, str) or not translation:
+                    continue
+                scope = MemoryScope(entry.get('source_lang'), entry.get('target_lang'), entry.get('provider'),
+                                    entry.get('model'), entry.get('prompt_hash'))
+                self._insert(source_norm, entry['source'], translation, scope, int(entry.get('hits') or 0))
+                imported += 1
+            self._conn.commit()
+        logger.info(f"翻译记忆导入 {imported} 条记录。")
+        return imported
+
+    def get_stats(self):
+        """记录数、命中率，以及按平均翻译耗时估算的节省时间。"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            stats = dict(self._stats)
+            avg_ms = self._translated_ms / self._translated_items if self._translated_items else 0.0
+        hits = stats['exact_hits'] + stats['fuzzy_hits']
+        lookups = hits + stats['misses']
+        return dict(
+            stats,
+            enabled=constants.TRANSLATION_MEMORY_ENABLED,
+            entries=entries,
+            fuzzy_threshold=self.fuzzy_threshold,
+            hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+            saved_requests=hits,
+            avg_translation_ms=round(avg_ms, 1),
+            estimated_saved_ms=round(hits * avg_ms, 1)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM grams")
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+        logger.info("翻译记忆已清空。")
+
+
+# --- 单例 ---
+_translation_memory_instance = None
+_translation_memory_lock = threading.Lock()
+
+
+def get_translation_memory():
+    """获取翻译记忆单例。被禁用或初始化失败时返回 None，调用方应直接请求翻译服务。"""
+    global _translation_memory_instance
+    if not constants.TRANSLATION_MEMORY_ENABLED:
+        return None
+    if _translation_memory_instance is None:
+        with _translation_memory_lock:
+            if _translation_memory_instance is None:
+                try:
+                    db_path = resource_path(os.path.join('data', 'translation_memory.db'))
+                    _translation_memory_instance = TranslationMemory(db_path)
+                except Exception as e:
+                    logger.error(f"初始化翻译记忆失败，将不使用翻译记忆: {e}", exc_info=True)
+                    return None
+    return _translation_memory_instance
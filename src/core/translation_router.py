@@ -0,0 +1,225 @@
+"""
+多服务商翻译路由：对冲请求与故障转移。
+
+按顺序配置多个翻译线路 (例如 DeepSeek 为主、本地 Ollama 为备、百度翻译兜底)：
+
+    - 对冲: 当前线路超过其近期 p95 延迟仍未返回时，向下一条线路再发一次相同的请求，先返回的成功结果被采用
+    - 故障转移: 线路返回错误且没有其他请求在进行时，立即改用下一条线路
+
+对冲阈值来自每条线路的延迟直方图 (按 服务商/模型 统计)，直方图与各线路的胜出次数可通过 get_router_stats() 查看。
+落选的请求无法中途取消，其结果会被丢弃，但耗时仍计入直方图。
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from src.shared import constants
+
+logger = logging.getLogger("CoreTranslationRouter")
+
+
+class TranslationRoute:
+    """一条翻译线路 (服务商 + 模型 + 凭证)。"""
+    def __init__(self, provider, api_key=None, model_name=None, custom_base_url=None,
+                 rpm_limit=constants.DEFAULT_rpm_TRANSLATION):
+        self.provider = provider
+        self.api_key = api_key
+        self.model_name = model_name
+        self.custom_base_url = custom_base_url
+        self.rpm_limit = rpm_limit or 0
+
+    @classmethod
+    def from_dict(cls, data):
+        """由前端传入的字典创建线路，缺少服务商时返回 None。"""
+        if not isinstance(data, dict) or not data.get('model_provider'):
+            return None
+        try:
+            rpm_limit = max(0, int(data.get('rpm_limit_translation') or 0))
+        except (TypeError, ValueError):
+            rpm_limit = 0
+        return cls(data['model_provider'], data.get('api_key'), data.get('model_name'),
+                   data.get('custom_base_url'), rpm_limit)
+
+    @property
+    def name(self):
+        return f"{self.provider}/{self.model_name or ''}"
+
+
+class LatencyHistogram:
+    """单条线路的延迟直方图。线程安全。"""
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.bounds = constants.ROUTER_LATENCY_BUCKETS_MS
+        self.counts = [0.0] * (len(self.bounds) + 1) # 最后一个为溢出桶
+        self.errors = 0
+        # 路由统计
+        self.attempts = 0
+        self.wins = 0
+        self.hedges = 0
+        self.failovers = 0
+
+    def record(self, elapsed_ms):
+        with self._lock:
+            index = next((i for i, bound in enumerate(self.bounds) if elapsed_ms <= bound), len(self.bounds))
+            self.counts[index] += 1
+            # 超过窗口后整体衰减，让阈值跟随近期延迟变化
+            if sum(self.counts) > constants.ROUTER_HISTOGRAM_WINDOW:
+                self.counts = [count / 2 for count in self.counts]
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def increment(self, counter):
+        """路由统计计数加一 (attempts / wins / hedges / failovers)。"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def percentile(self, q):
+        """估算分位延迟 (毫秒)，桶内线性插值。没有样本时返回 None。"""
+        with self._lock:
+            total = sum(self.counts)
+            if total <= 0:
+                return None
+            target = q * total
+            cumulative = 0.0
+            for i, count in enumerate(self.counts):
+                if count and cumulative + count >= target:
+                    lower = self.bounds[i - 1] if i > 0 else 0
+                    upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1] * 2
+                    return lower + (upper - lower) * (target - cumulative) / count
+                cumulative += count
+            return float(self.bounds[-1] * 2)
+
+    @property
+    def samples(self):
+        with self._lock:
+            return sum(self.counts)
+
+    def hedge_delay(self):
+        """发出对冲请求前的等待时间 (秒)。"""
+        if self.samples < constants.ROUTER_MIN_SAMPLES:
+            return constants.ROUTER_DEFAULT_HEDGE_SECONDS
+        return max(constants.ROUTER_MIN_HEDGE_SECONDS, self.percentile(constants.ROUTER_HEDGE_PERCENTILE) / 1000)
+
+    def to_dict(self):
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        with self._lock:
+            return {
+                'route': self.name,
+                'samples': round(sum(self.counts), 1),
+                'errors': self.errors,
+                'p50_ms': round(p50, 1) if p50 is not None else None,
+                'p95_ms': round(p95, 1) if p95 is not None else None,
+                'buckets': {f"le_{bound}": round(count, 1) for bound, count in zip(self.bounds, self.counts)},
+                'overflow': round(self.counts[-1], 1),
+                'attempts': self.attempts,
+                'wins': self.wins,
+                'hedges': self.hedges,
+                'failovers': self.failovers
+            }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_latency_histogram(route):
+    histogram = _histograms.get(route.name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.get(route.name)
+            if histogram is None:
+                histogram = LatencyHistogram(route.name)
+                _histograms[route.name] = histogram
+    return histogram
+
+
+def _get_executor():
+    """路由请求使用独立的线程池，调用方 (例如 translate_text_list 的并发线程) 只负责等待结果。"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=constants.ROUTER_MAX_WORKERS, thread_name_prefix="route")
+    return _executor
+
+
+def _run_attempt(route, attempt, is_failed):
+    """执行一次线路请求并记录延迟，返回 (是否成功, 结果)。"""
+    histogram = get_latency_histogram(route)
+    histogram.increment('attempts')
+    start_time = time.perf_counter()
+    try:
+        result = attempt(route)
+    except Exception as e:
+        logger.error(f"线路 {route.name} 请求异常: {e}")
+        histogram.record_error()
+        return False, f"翻译失败: {e}"
+    if is_failed(result):
+        histogram.record_error()
+        return False, result
+    histogram.record((time.perf_counter() - start_time) * 1000)
+    return True, result
+
+
+def route_translation(routes, attempt, is_failed):
+    """
+    按线路顺序翻译一段文本，必要时对冲或故障转移。
+
+    Args:
+        routes (list): TranslationRoute 列表，按优先级排序。
+        attempt (callable): attempt(route) -> 译文，使用指定线路发出请求。
+        is_failed (callable): is_failed(译文) -> bool，判断结果是否为失败信息。
+
+    Returns:
+        tuple: (译文, 采用的线路下标)。所有线路都失败时返回 (最后一个失败信息, None)。
+    """
+    executor = _get_executor()
+    in_flight = {}
+    state = {'next': 0, 'hedge_at': None}
+    last_failure = "翻译失败: 没有可用的翻译线路"
+
+    def launch(reason):
+        index = state['next']
+        route = routes[index]
+        state['next'] += 1
+        state['hedge_at'] = time.monotonic() + get_latency_histogram(route).hedge_delay()
+        if reason:
+            get_latency_histogram(routes[index - 1]).increment('hedges' if reason == 'hedge' else 'failovers')
+            logger.info(f"{'对冲' if reason == 'hedge' else '故障转移'}: 改用线路 {route.name}")
+        in_flight[executor.submit(_run_attempt, route, attempt, is_failed)] = index
+
+    if routes:
+        launch(None)
+    while in_flight:
+        timeout = None
+        if state['next'] < len(routes) and len(in_flight) < constants.ROUTER_MAX_PARALLEL_ATTEMPTS:
+            timeout = max(0.0, state['hedge_at'] - time.monotonic())
+        done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            launch('hedge')
+            continue
+        for future in done:
+            index = in_flight.pop(future)
+            ok, result = future.result()
+            if ok:
+                get_latency_histogram(routes[index]).increment('wins')
+                return result, index
+            last_failure = result
+        if not in_flight and state['next'] < len(routes):
+            launch('failover')
+    return last_failure, None
+
+
+def get_router_stats():
+    """返回各线路的延迟直方图、分位延迟与对冲/故障转移/胜出次数。"""
+    with _histograms_lock:
+        histograms = list(_histograms.values())
+    return [histogram.to_dict() for histogram in sorted(histograms, key=lambda h: h.name)]
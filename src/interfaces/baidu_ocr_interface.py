@@ -1,9 +1,13 @@
-import requests
 import base64
+import io
 import json
 import logging
 import time
 from typing import List, Dict, Tuple, Optional, Any
+from PIL import Image
+from src.shared import constants
+from src.shared.http_clients import http_post
+from src.shared.resilience import call_with_resilience, breaker_scope, RetryableError, PermanentError
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -14,6 +18,11 @@ class BaiduOCRInterface:
         "standard": "https://aip.baidubce.com/rest/2.0/ocr/v1/general_basic",           # 标准版
         "high_precision": "https://aip.baidubce.com/rest/2.0/ocr/v1/accurate_basic",    # 高精度版
     }
+    # 返回文本行位置的端点 (拼接识别时用位置把文本行分配回各气泡)
+    LOCATION_API_ENDPOINTS = {
+        "standard": "https://aip.baidubce.com/rest/2.0/ocr/v1/general",                 # 标准含位置版
+        "high_precision": "https://aip.baidubce.com/rest/2.0/ocr/v1/accurate",          # 高精度含位置版
+    }
     
     # 语言映射 - 百度OCR语言类型参数值
     # 参考文档: https://cloud.baidu.com/doc/OCR/s/zk3h7xz52
@@ -52,7 +61,7 @@ class BaiduOCRInterface:
         url = f"https://aip.baidubce.com/oauth/2.0/token?grant_type=client_credentials&client_id={self.api_key}&client_secret={self.secret_key}"
         
         try:
-            response = requests.post(url)
+            response = http_post('baidu_ocr', url)
             result = response.json()
             if 'access_token' in result:
                 return result['access_token']
@@ -82,25 +91,18 @@ class BaiduOCRInterface:
         # 更新上次请求时间
         self.last_request_time = time.time() * 1000
     
-    def recognize_text(self, image_bytes: bytes, language: str = "auto") -> List[str]:
+    def _request(self, image_bytes: bytes, language: str, endpoint: str) -> Optional[Dict[str, Any]]:
         """
-        识别图像中的文本
-        
-        Args:
-            image_bytes: 图像字节数据
-            language: 语言代码 (japanese, chinese, english, 等)
-            
+        发送一次识别请求 (含令牌刷新、QPS 限制与语言参数错误的重试)。
+
         Returns:
-            识别出的文本列表
+            API 返回的结果字典，失败时返回 None。
         """
         # 确保我们有访问令牌
         if not self.access_token:
             self.access_token = self._get_access_token()
             if not self.access_token:
-                return []
-        
-        # 准备API端点
-        endpoint = self.API_ENDPOINTS.get(self.version, self.API_ENDPOINTS["standard"])
+                return None
         
         # 准备请求参数
         params = {
@@ -123,82 +125,93 @@ class BaiduOCRInterface:
             # 如果是auto或未知语言，不设置language_type参数，让API自动检测
             logger.info("未指定语言或使用自动检测，不设置language_type参数")
         
-        # 确保请求间隔
-        self._ensure_request_interval()
-        
-        # 发送请求
-        max_retries = 3
-        retry_delay = 1.0  # 初始重试延迟(秒)
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+        def request_once():
+            # 确保请求间隔
+            self._ensure_request_interval()
+            # 不记录完整请求参数，仅记录端点和是否有语言设置
+            logger.info(f"发送百度OCR请求，端点: {endpoint.split('/')[-1]}, 语言设置: {'有' if 'language_type' in data else '无'}")
+
+            response = http_post('baidu_ocr', endpoint, params=params, data=data, headers=headers)
+            response.raise_for_status()
+            result = response.json()
+
+            if 'error_code' in result:
+                error_code = result.get('error_code')
+                error_msg = result.get('error_msg', '未知错误')
+                logger.error(f"百度OCR API错误: {result}")
+
+                # 处理不同类型的错误
+                if error_code in [110, 111]:  # 令牌过期
+                    logger.info("访问令牌过期，重新获取...")
+                    self.access_token = self._get_access_token()
+                    if not self.access_token:
+                        raise PermanentError("百度OCR访问令牌获取失败")
+                    params["access_token"] = self.access_token
+                    raise RetryableError("访问令牌已刷新", retry_after=0)  # 使用新令牌立即重试
+                elif error_code == 18:  # QPS限制，按退避策略等待后重试
+                    raise RetryableError(f"触发QPS限制: {error_msg}", throttled=True)
+                elif error_code == 216100:  # 语言参数错误
+                    if 'language_type' not in data:
+                        raise PermanentError("即使不设置语言参数也出错")
+                    logger.warning("语言类型参数无效，尝试移除语言参数使用自动检测...")
+                    del data['language_type']
+                    raise RetryableError("移除语言参数后重试", retry_after=0)
+                # 其他错误重试无意义
+                raise PermanentError(f"未处理的百度OCR错误: {error_code} - {error_msg}")
+            return result
+
+        try:
+            return call_with_resilience('baidu_ocr', self.version, request_once, scope=breaker_scope(api_key=self.api_key))
+        except Exception as e:
+            logger.error(f"百度OCR识别时出错: {str(e)}")
+            return None
+
+    def recognize_text(self, image_bytes: bytes, language: str = "auto") -> List[str]:
+        """
+        识别图像中的文本
         
-        for retry in range(max_retries):
-            try:
-                headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-                logger.info(f"发送百度OCR请求 (尝试 {retry+1}/{max_retries})")
-                # 不记录完整请求参数，仅记录端点和是否有语言设置
-                logger.info(f"请求端点: {endpoint.split('/')[-1]}, 语言设置: {'有' if 'language_type' in data else '无'}")
-                
-                response = requests.post(endpoint, params=params, data=data, headers=headers)
-                result = response.json()
-                
-                if 'error_code' in result:
-                    error_code = result.get('error_code')
-                    error_msg = result.get('error_msg', '未知错误')
-                    logger.error(f"百度OCR API错误: {result}")
-                    
-                    # 处理不同类型的错误
-                    if error_code in [110, 111]:  # 令牌过期
-                        logger.info("访问令牌过期，重新获取...")
-                        self.access_token = self._get_access_token()
-                        if self.access_token:
-                            params["access_token"] = self.access_token
-                            continue  # 使用新令牌重试
-                        else:
-                            return []
-                            
-                    elif error_code == 18:  # QPS限制
-                        if retry < max_retries - 1:
-                            wait_time = retry_delay * (retry + 1)  # 指数退避
-                            logger.info(f"触发QPS限制，等待 {wait_time} 秒后重试...")
-                            time.sleep(wait_time)
-                            continue  # 等待后重试
-                        else:
-                            logger.error("达到最大重试次数，QPS限制仍然存在")
-                            return []
-                    
-                    elif error_code == 216100:  # 语言参数错误
-                        logger.warning("语言类型参数无效，尝试移除语言参数使用自动检测...")
-                        # 移除语言参数
-                        if 'language_type' in data:
-                            del data['language_type']
-                            continue  # 重试，但不设置语言参数
-                        else:
-                            logger.error("即使不设置语言参数也出错")
-                            return []
-                    else:
-                        # 其他错误直接返回空结果
-                        logger.error(f"未处理的百度OCR错误: {error_code} - {error_msg}")
-                        return []
-                
-                # 提取识别文本
-                text_results = []
-                if 'words_result' in result:
-                    for item in result['words_result']:
-                        if 'words' in item:
-                            text_results.append(item['words'])
-                
-                logger.info(f"百度OCR识别成功，返回 {len(text_results)} 个文本结果")
-                return text_results
+        Args:
+            image_bytes: 图像字节数据
+            language: 语言代码 (japanese, chinese, english, 等)
             
-            except Exception as e:
-                logger.error(f"百度OCR识别时出错: {str(e)}")
-                if retry < max_retries - 1:
-                    wait_time = retry_delay * (retry + 1)
-                    logger.info(f"将在 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    return []
-        
-        return []  # 所有重试都失败
+        Returns:
+            识别出的文本列表
+        """
+        result = self._request(image_bytes, language, self.API_ENDPOINTS.get(self.version, self.API_ENDPOINTS["standard"]))
+        if result is None:
+            return []
+
+        # 提取识别文本
+        text_results = []
+        if 'words_result' in result:
+            for item in result['words_result']:
+                if 'words' in item:
+                    text_results.append(item['words'])
+
+        logger.info(f"百度OCR识别成功，返回 {len(text_results)} 个文本结果")
+        return text_results
+
+    def recognize_text_with_location(self, image_bytes: bytes, language: str = "auto") -> Optional[List[Tuple[str, Tuple[int, int, int, int]]]]:
+        """
+        使用含位置信息的端点识别图像中的文本。
+
+        Returns:
+            [(文本, (left, top, width, height)), ...]，请求失败时返回 None (与 "没有文本" 的空列表区分)。
+        """
+        endpoint = self.LOCATION_API_ENDPOINTS.get(self.version, self.LOCATION_API_ENDPOINTS["standard"])
+        result = self._request(image_bytes, language, endpoint)
+        if result is None:
+            return None
+        lines = []
+        for item in result.get('words_result', []):
+            location = item.get('location') or {}
+            if 'words' in item and location:
+                lines.append((item['words'], (int(location.get('left', 0)), int(location.get('top', 0)),
+                                              int(location.get('width', 0)), int(location.get('height', 0)))))
+        logger.info(f"百度OCR (含位置) 识别成功，返回 {len(lines)} 个文本行")
+        return lines
 
 # 单例实例
 _baidu_ocr_instance = None
@@ -254,6 +267,105 @@ def recognize_text_with_baidu_ocr(image_bytes: bytes, language: str = "auto", ap
         return ocr.recognize_text(image_bytes, language)
     return []
 
+def _pack_crops(sizes: List[Tuple[int, int]], horizontal: bool, gap: int, max_side: int) -> List[List[int]]:
+    """
+    按顺序把裁剪图分组，每组拼接后沿排列方向的长度不超过 max_side。
+
+    Args:
+        sizes: 各裁剪图的 (宽, 高)
+        horizontal: True 时横向排列 (竖排文字)，否则纵向排列 (横排文字)
+    """
+    groups, current, length = [], [], gap
+    for i, (width, height) in enumerate(sizes):
+        along = width if horizontal else height
+        if current and length + along + gap > max_side:
+            groups.append(current)
+            current, length = [], gap
+        current.append(i)
+        length += along + gap
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _compose_crops(crops: List[Image.Image], group: List[int], horizontal: bool, gap: int):
+    """
+    把一组裁剪图以白色间隔拼接成一张图。
+
+    Returns:
+        (拼接图, [(裁剪图索引, (left, top, width, height)), ...])
+    """
+    sizes = [crops[i].size for i in group]
+    if horizontal:
+        canvas_size = (sum(w for w, _ in sizes) + gap * (len(group) + 1), max(h for _, h in sizes) + 2 * gap)
+    else:
+        canvas_size = (max(w for w, _ in sizes) + 2 * gap, sum(h for _, h in sizes) + gap * (len(group) + 1))
+    canvas = Image.new('RGB', canvas_size, 'white')
+    placements, offset = [], gap
+    for i, (width, height) in zip(group, sizes):
+        position = (offset, gap) if horizontal else (gap, offset)
+        canvas.paste(crops[i].convert('RGB'), position)
+        placements.append((i, (position[0], position[1], width, height)))
+        offset += (width if horizontal else height) + gap
+    return canvas, placements
+
+
+def _assign_lines(lines: List[Tuple[str, Tuple[int, int, int, int]]], placements) -> Dict[int, List[str]]:
+    """按位置把拼接图上识别出的文本行分配给重叠面积最大的裁剪图，保持返回顺序。"""
+    assigned = {i: [] for i, _ in placements}
+    for text, (left, top, width, height) in lines:
+        best_index, best_overlap = None, 0
+        for i, (x, y, w, h) in placements:
+            overlap = max(0, min(left + width, x + w) - max(left, x)) * max(0, min(top + height, y + h) - max(top, y))
+            if overlap > best_overlap:
+                best_index, best_overlap = i, overlap
+        if best_index is not None:
+            assigned[best_index].append(text)
+    return assigned
+
+
+def recognize_crops_with_baidu_ocr_stitched(crops: List[Image.Image], language: str = "auto", api_key: str = None,
+                                            secret_key: str = None, version: str = "standard") -> List[Optional[str]]:
+    """
+    把多个气泡裁剪图以白色间隔拼接成少量大图，每张拼接图只请求一次含位置的识别端点，
+    再按返回的文本行位置把文本分配回各气泡。
+
+    横排文字的裁剪图纵向排列、竖排文字 (BAIDU_OCR_VERTICAL_LANGUAGES) 横向排列，
+    相邻气泡的文本行不会被识别成同一行。拼接图的最长边与编码后的大小受
+    BAIDU_OCR_STITCH_MAX_SIDE / BAIDU_OCR_STITCH_MAX_BYTES 限制，超出时分成多张。
+
+    Returns:
+        每个裁剪图的文本 (多行以空格连接)；所在拼接图请求失败的裁剪图为 None，调用方可改为单独识别。
+    """
+    texts: List[Optional[str]] = [None] * len(crops)
+    ocr = get_baidu_ocr(api_key, secret_key, version)
+    if not ocr or not crops:
+        return texts
+    horizontal = language in constants.BAIDU_OCR_VERTICAL_LANGUAGES
+    gap = constants.BAIDU_OCR_STITCH_GAP
+    pending = _pack_crops([crop.size for crop in crops], horizontal, gap, constants.BAIDU_OCR_STITCH_MAX_SIDE)
+    requests_sent = 0
+    while pending:
+        group = pending.pop(0)
+        canvas, placements = _compose_crops(crops, group, horizontal, gap)
+        buffer = io.BytesIO()
+        canvas.save(buffer, format="PNG")
+        image_bytes = buffer.getvalue()
+        if len(image_bytes) > constants.BAIDU_OCR_STITCH_MAX_BYTES and len(group) > 1:
+            # 编码后超过大小限制，对半拆分后重新拼接
+            middle = len(group) // 2
+            pending[:0] = [group[:middle], group[middle:]]
+            continue
+        requests_sent += 1
+        lines = ocr.recognize_text_with_location(image_bytes, language)
+        if lines is None:
+            logger.warning(f"百度OCR拼接图请求失败，涉及 {len(group)} 个气泡")
+            continue
+        for i, crop_lines in _assign_lines(lines, placements).items():
+            texts[i] = " ".join(crop_lines)
+    logger.info(f"百度OCR拼接识别: {len(crops)} 个气泡合并为 {requests_sent} 次请求")
+    return texts
+
 def test_baidu_ocr_connection(api_key: str, secret_key: str) -> Dict[str, Any]:
     """
     测试百度OCR连接
@@ -267,7 +379,7 @@ def test_baidu_ocr_connection(api_key: str, secret_key: str) -> Dict[str, Any]:
     """
     try:
         url = f"https://aip.baidubce.com/oauth/2.0/token?grant_type=client_credentials&client_id={api_key}&client_secret={secret_key}"
-        response = requests.post(url)
+        response = http_post('baidu_ocr', url)
         result = response.json()
         
         if 'access_token' in result:
@@ -4,6 +4,8 @@ import json
 from hashlib import md5
 import logging
 from time import sleep
+from src.shared.http_clients import http_post
+from src.shared.resilience import ConfigError
 
 logger = logging.getLogger(__name__)
 
@@ -35,17 +37,43 @@ class BaiduTranslateInterface:
         返回:
             str: 翻译后的文本
         """
+        trans_result = self._request(text, from_lang, to_lang, max_retries, retry_delay)
+        return '\n'.join(item['dst'] for item in trans_result)
+
+    def translate_batch(self, texts, from_lang='auto', to_lang='zh', max_retries=3, retry_delay=1):
+        """
+        一次请求翻译多段文本。
+
+        百度翻译按行翻译多行查询，每行对应 trans_result 中的一项，
+        因此将每段文本作为一行 (段内换行替换为空格) 发送，再按行拆回。
+
+        参数:
+            texts (list): 要翻译的文本列表，不应包含空文本
+            其余参数同 translate
+
+        返回:
+            list: 与 texts 一一对应的译文；返回行数与输入不一致时返回 None，由调用方逐段重试
+        """
+        lines = [' '.join(text.splitlines()) for text in texts]
+        trans_result = self._request('\n'.join(lines), from_lang, to_lang, max_retries, retry_delay)
+        if len(trans_result) != len(lines):
+            logger.warning(f"百度翻译批量请求返回 {len(trans_result)} 行，期望 {len(lines)} 行")
+            return None
+        return [item['dst'] for item in trans_result]
+
+    def _request(self, query, from_lang, to_lang, max_retries, retry_delay):
+        """发送翻译请求 (访问频率受限或连接失败时重试)，返回 trans_result 列表。"""
         if not self.app_id or not self.app_key:
-            raise ValueError("百度翻译API未配置appid和appkey，请在设置中配置")
+            raise ConfigError("百度翻译API未配置appid和appkey，请在设置中配置")
         
         # 生成签名
         salt = random.randint(32768, 65536)
-        sign = self._make_md5(self.app_id + text + str(salt) + self.app_key)
+        sign = self._make_md5(self.app_id + query + str(salt) + self.app_key)
         
         # 构建请求参数
         params = {
             'appid': self.app_id,
-            'q': text,
+            'q': query,
             'from': from_lang,
             'to': to_lang,
             'salt': salt,
@@ -57,7 +85,7 @@ class BaiduTranslateInterface:
         # 发送请求并处理重试
         for attempt in range(max_retries):
             try:
-                response = requests.post(self.API_URL, params=params, headers=headers)
+                response = http_post('baidu_translate', self.API_URL, params=params, headers=headers)
                 result = response.json()
                 
                 # 检查返回的错误码
@@ -68,7 +96,7 @@ class BaiduTranslateInterface:
                     
                     # 处理特定错误码
                     if error_code == '52003':  # 未授权用户
-                        raise ValueError("百度翻译API认证失败，请检查appid和appkey是否正确")
+                        raise ConfigError("百度翻译API认证失败，请检查appid和appkey是否正确")
                     elif error_code == '54003':  # 访问频率受限
                         if attempt < max_retries - 1:
                             logger.warning(f"百度翻译API访问频率受限，{retry_delay}秒后重试")
@@ -77,12 +105,8 @@ class BaiduTranslateInterface:
                     
                     raise Exception(f"百度翻译API错误 (错误码: {error_code}): {error_msg}")
                 
-                # 正常情况下，提取翻译结果
-                if 'trans_result' in result:
-                    translated_texts = [item['dst'] for item in result['trans_result']]
-                    return '\n'.join(translated_texts)
-                else:
-                    return ""
+                # 正常情况下，返回逐行的翻译结果
+                return result.get('trans_result', [])
                     
             except requests.exceptions.RequestException as e:
                 logger.error(f"百度翻译API请求异常: {str(e)}")
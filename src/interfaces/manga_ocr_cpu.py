@@ -0,0 +1,200 @@
+"""
+MangaOCR 的 CPU 推理配置。
+
+没有 GPU 时，get_manga_ocr_instance 按 MANGA_OCR_CPU_PROFILE 对加载好的 MangaOcr 实例做如下处理：
+
+    - 'quantized': 编码器与解码器中的 Linear 层动态量化为 int8 (torch.ao.quantization.quantize_dynamic)
+    - 'onnx'     : 编码器与解码器分别导出为 ONNX，首次导出后缓存在 MANGA_OCR_ONNX_DIR，
+                   之后直接由 ONNX Runtime 加载；解码仍按批次贪心进行
+
+MANGA_OCR_CPU_THREADS 大于 0 时才设置 intra-op 线程数；torch 的线程设置是进程级的，会同时影响 LAMA、YOLO 等模型，
+因此默认 (default 配置且线程数为 0) 不做任何修改。
+"""
+
+import logging
+import os
+import time
+
+import torch
+
+from src.shared import constants
+from src.shared.path_helpers import resource_path
+
+logger = logging.getLogger("MangaOCRCPU")
+
+CPU_PROFILES = ('default', 'quantized', 'onnx')
+ENCODER_FILE = 'encoder.onnx'
+DECODER_FILE = 'decoder.onnx'
+
+
+def get_cpu_profile():
+    """当前的 CPU 推理配置，环境变量 MANGA_OCR_CPU_PROFILE 优先。"""
+    profile = os.environ.get('MANGA_OCR_CPU_PROFILE', constants.MANGA_OCR_CPU_PROFILE)
+    if profile not in CPU_PROFILES:
+        logger.warning(f"未知的 MangaOCR CPU 推理配置 '{profile}'，使用 default。")
+        return 'default'
+    return profile
+
+
+def get_cpu_threads():
+    """用户设置的 intra-op 线程数，环境变量 MANGA_OCR_CPU_THREADS 优先；0 表示保持默认。"""
+    try:
+        threads = int(os.environ.get('MANGA_OCR_CPU_THREADS', constants.MANGA_OCR_CPU_THREADS))
+    except ValueError:
+        threads = 0
+    return max(threads, 0)
+
+
+def get_onnx_dir():
+    return resource_path(constants.MANGA_OCR_ONNX_DIR)
+
+
+def apply_cpu_threads(threads):
+    """设置 torch 的 intra-op 线程数 (进程级设置)。"""
+    torch.set_num_threads(threads)
+    logger.info(f"MangaOCR 使用 {threads} 个 CPU 线程。")
+
+
+def decoder_token_ids(model):
+    """解码需要的 (起始符, 结束符列表, pad) token id，模型配置缺少时对应值为 None。"""
+    config = model.config
+    generation_config = getattr(model, 'generation_config', None)
+    start_id = config.decoder_start_token_id
+    if start_id is None:
+        start_id = getattr(generation_config, 'decoder_start_token_id', None)
+    eos_id = getattr(generation_config, 'eos_token_id', None)
+    if eos_id is None:
+        eos_id = getattr(config.decoder, 'eos_token_id', None)
+    eos_ids = [i for i in (eos_id if isinstance(eos_id, (list, tuple)) else [eos_id]) if i is not None]
+    pad_id = config.pad_token_id if config.pad_token_id is not None else (eos_ids[0] if eos_ids else None)
+    return start_id, eos_ids, pad_id
+
+
+def quantize_model(ocr_instance):
+    """把 MangaOcr 实例中模型的 Linear 层动态量化为 int8 (就地替换 ocr_instance.model)。"""
+    try:
+        from torch.ao.quantization import quantize_dynamic
+    except ImportError:
+        from torch.quantization import quantize_dynamic # 旧版 torch
+    start_time = time.time()
+    ocr_instance.model = quantize_dynamic(ocr_instance.model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    logger.info(f"MangaOCR 模型已动态量化为 int8 (耗时: {time.time() - start_time:.2f}s)")
+    return ocr_instance
+
+
+class _EncoderForExport(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model.encoder(pixel_values=pixel_values).last_hidden_state
+
+
+class _DecoderForExport(torch.nn.Module):
+    """不使用 KV 缓存的解码器：输入完整的已生成序列，输出每个位置的 logits。"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, encoder_hidden_states):
+        # 通过完整模型前向，编码器输出到解码器的投影 (如有) 也会包含在导出的图中
+        return self.model(encoder_outputs=(encoder_hidden_states,), decoder_input_ids=input_ids,
+                          use_cache=False, return_dict=True).logits
+
+
+def export_onnx(ocr_instance, onnx_dir):
+    """把编码器与解码器导出为 ONNX。先写入临时文件再重命名，中途失败不会留下不完整的缓存。"""
+    os.makedirs(onnx_dir, exist_ok=True)
+    model = ocr_instance.model.eval()
+    image_size = ocr_instance.processor.size if hasattr(ocr_instance, 'processor') else ocr_instance.feature_extractor.size
+    height = image_size['height'] if isinstance(image_size, dict) else image_size
+    width = image_size['width'] if isinstance(image_size, dict) else image_size
+    start_id, _, _ = decoder_token_ids(model)
+    start_time = time.time()
+    logger.info(f"首次使用 ONNX 推理，正在导出 MangaOCR 模型到 {onnx_dir} ...")
+    with torch.inference_mode():
+        pixel_values = torch.zeros(2, 3, height, width)
+        encoder_hidden_states = _EncoderForExport(model)(pixel_values)
+        input_ids = torch.full((2, 3), start_id, dtype=torch.long)
+        exports = [
+            (ENCODER_FILE, _EncoderForExport(model), (pixel_values,), ['pixel_values'], ['last_hidden_state'],
+             {'pixel_values': {0: 'batch'}, 'last_hidden_state': {0: 'batch'}}),
+            (DECODER_FILE, _DecoderForExport(model), (input_ids, encoder_hidden_states),
+             ['input_ids', 'encoder_hidden_states'], ['logits'],
+             {'input_ids': {0: 'batch', 1: 'sequence'}, 'encoder_hidden_states': {0: 'batch'},
+              'logits': {0: 'batch', 1: 'sequence'}})
+        ]
+        for filename, module, args, input_names, output_names, dynamic_axes in exports:
+            tmp_path = os.path.join(onnx_dir, filename + '.tmp')
+            torch.onnx.export(module, args, tmp_path, input_names=input_names, output_names=output_names,
+                              dynamic_axes=dynamic_axes, opset_version=14)
+            os.replace(tmp_path, os.path.join(onnx_dir, filename))
+    logger.info(f"MangaOCR ONNX 导出完成 (耗时: {time.time() - start_time:.2f}s)")
+
+
+class OnnxMangaOcr:
+    """
+    使用 ONNX Runtime 推理的 MangaOCR，接口与 manga_ocr.MangaOcr 一致 (可直接调用识别单张图像)，
+    另提供 recognize_batch 按批次识别。
+    """
+    def __init__(self, ocr_instance, onnx_dir, threads):
+        import onnxruntime as ort
+        self.processor = getattr(ocr_instance, 'processor', None) or getattr(ocr_instance, 'feature_extractor')
+        self.tokenizer = ocr_instance.tokenizer
+        self.start_id, self.eos_ids, self.pad_id = decoder_token_ids(ocr_instance.model)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads # 0 时由 ONNX Runtime 自行决定
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ['CPUExecutionProvider']
+        self.encoder = ort.InferenceSession(os.path.join(onnx_dir, ENCODER_FILE), options, providers=providers)
+        self.decoder = ort.InferenceSession(os.path.join(onnx_dir, DECODER_FILE), options, providers=providers)
+
+    def __call__(self, image_pil):
+        return self.recognize_batch([image_pil])[0]
+
+    def recognize_batch(self, images, max_length=constants.MANGA_OCR_MAX_LENGTH):
+        import numpy as np
+        from src.interfaces.manga_ocr_interface import _post_process
+        images = [image.convert('L').convert('RGB') for image in images]
+        pixel_values = self.processor(images, return_tensors="np").pixel_values.astype(np.float32)
+        encoder_hidden_states = self.encoder.run(None, {'pixel_values': pixel_values})[0]
+        batch_size = pixel_values.shape[0]
+        tokens = np.full((batch_size, 1), self.start_id, dtype=np.int64)
+        unfinished = np.ones(batch_size, dtype=bool)
+        for _ in range(max_length - 1):
+            logits = self.decoder.run(None, {'input_ids': tokens, 'encoder_hidden_states': encoder_hidden_states})[0]
+            next_tokens = np.where(unfinished, logits[:, -1, :].argmax(axis=-1), self.pad_id).astype(np.int64)
+            tokens = np.concatenate([tokens, next_tokens[:, None]], axis=1)
+            unfinished &= ~np.isin(next_tokens, self.eos_ids)
+            if not unfinished.any():
+                break
+        return [_post_process(self.tokenizer.decode(ids, skip_special_tokens=True)) for ids in tokens]
+
+
+def apply_cpu_profile(ocr_instance, profile=None):
+    """
+    按 CPU 推理配置处理已加载的 MangaOcr 实例，返回处理后的实例。
+    ONNX 导出或加载失败时退回量化后的 torch 模型。
+    """
+    profile = profile or get_cpu_profile()
+    threads = get_cpu_threads()
+    if threads > 0:
+        apply_cpu_threads(threads)
+    if profile == 'default':
+        return ocr_instance
+    if profile == 'quantized':
+        return quantize_model(ocr_instance)
+    if profile == 'onnx':
+        onnx_dir = get_onnx_dir()
+        try:
+            if not all(os.path.exists(os.path.join(onnx_dir, name)) for name in (ENCODER_FILE, DECODER_FILE)):
+                export_onnx(ocr_instance, onnx_dir)
+            onnx_instance = OnnxMangaOcr(ocr_instance, onnx_dir, threads)
+            logger.info(f"MangaOCR 使用 ONNX Runtime 推理 ({onnx_dir})")
+            return onnx_instance
+        except Exception as e:
+            logger.error(f"MangaOCR ONNX 推理不可用，改用 int8 量化模型: {e}", exc_info=True)
+            return quantize_model(ocr_instance)
+    return ocr_instance
@@ -28,6 +28,14 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../.
 
 # 现在可以导入src模块了
 from src.shared.path_helpers import resource_path # 导入路径助手
+from src.shared import constants
+from src.interfaces.manga_ocr_cpu import apply_cpu_profile, decoder_token_ids, OnnxMangaOcr
+
+try:
+    from manga_ocr.ocr import post_process as _post_process # 与 MangaOcr.__call__ 相同的后处理
+except ImportError:
+    def _post_process(text):
+        return "".join(text.split())
 
 logger = logging.getLogger("MangaOCRInterface")
 
@@ -49,7 +57,8 @@ def get_manga_ocr_instance():
     获取 MangaOCR 的单例实例。如果未初始化，则进行初始化。
 
     Returns:
-        manga_ocr.MangaOcr or None: OCR 实例或 None (如果失败)。
+        manga_ocr.MangaOcr or OnnxMangaOcr or None: OCR 实例或 None (如果失败)。
+            没有 GPU 且 MANGA_OCR_CPU_PROFILE 为 'onnx' 时返回 OnnxMangaOcr。
     """
     global _manga_ocr_instance, _preloading_started
     
@@ -116,6 +125,10 @@ def get_manga_ocr_instance():
                 utils.http_get_request = original_head_request
         except Exception:
             pass
+
+        if force_cpu:
+            # CPU 推理配置：线程数、int8 动态量化或 ONNX Runtime (见 MANGA_OCR_CPU_PROFILE)
+            _manga_ocr_instance = apply_cpu_profile(_manga_ocr_instance)
             
         return _manga_ocr_instance
     except Exception as e:
@@ -123,6 +136,11 @@ def get_manga_ocr_instance():
         _manga_ocr_instance = None
         return None
 
+def reset_manga_ocr_instance():
+    """丢弃已加载的实例，下次调用 get_manga_ocr_instance 时按当前配置重新加载 (例如切换 CPU 推理配置后)。"""
+    global _manga_ocr_instance
+    _manga_ocr_instance = None
+
 def preload_manga_ocr():
     """
     预加载 MangaOCR 模型。当应用启动时调用，避免首次翻译时加载模型带来的延迟。
@@ -204,6 +222,87 @@ def recognize_japanese_text(image_pil):
         logger.error(f"MangaOCR 识别失败: {e}", exc_info=True)
         return ""
 
+def _preprocess_batch(ocr_instance, images):
+    """把一批裁剪图预处理为一个张量 (ViT 处理器会统一缩放到模型输入尺寸)。"""
+    # 旧版 MangaOcr 的属性名为 feature_extractor
+    processor = getattr(ocr_instance, 'processor', None) or getattr(ocr_instance, 'feature_extractor')
+    images = [image.convert('L').convert('RGB') for image in images]
+    return processor(images, return_tensors="pt").pixel_values
+
+
+def _greedy_decode_batch(model, pixel_values, max_length):
+    """
+    编码器只运行一次，解码器按批次贪心解码并复用 KV 缓存。
+
+    已输出结束符的行之后只填充 pad (结束掩码)，全部结束后提前停止。
+    模型配置缺少起始符或结束符时改用 model.generate。
+
+    Returns:
+        torch.Tensor: (batch, 长度) 的 token id。
+    """
+    start_id, eos_ids, pad_id = decoder_token_ids(model)
+    if start_id is None or not eos_ids:
+        return model.generate(pixel_values, max_length=max_length)
+    device = pixel_values.device
+    eos_ids = torch.tensor(eos_ids, device=device)
+
+    encoder_outputs = model.encoder(pixel_values=pixel_values)
+    batch_size = pixel_values.shape[0]
+    tokens = torch.full((batch_size, 1), start_id, dtype=torch.long, device=device)
+    unfinished = torch.ones(batch_size, dtype=torch.bool, device=device)
+    past_key_values = None
+    for _ in range(max_length - 1):
+        outputs = model(encoder_outputs=encoder_outputs,
+                        decoder_input_ids=tokens if past_key_values is None else tokens[:, -1:],
+                        past_key_values=past_key_values, use_cache=True)
+        past_key_values = outputs.past_key_values
+        next_tokens = outputs.logits[:, -1, :].argmax(dim=-1)
+        next_tokens = torch.where(unfinished, next_tokens, torch.full_like(next_tokens, pad_id))
+        tokens = torch.cat([tokens, next_tokens[:, None]], dim=1)
+        unfinished &= ~torch.isin(next_tokens, eos_ids)
+        if not unfinished.any():
+            break
+    return tokens
+
+
+def recognize_japanese_text_batch(images, batch_size=constants.MANGA_OCR_BATCH_SIZE):
+    """
+    批量识别多个裁剪图中的日文文本 (可以来自同一页或多页)。
+
+    每批图像合并为一个张量，编码器只运行一次，随后按批次贪心解码；
+    相比逐个调用 recognize_japanese_text，每页 10~20 个气泡时在 CPU 上可大幅减少耗时。
+
+    Args:
+        images (list): PIL 图像列表。
+        batch_size (int): 每批最多的图像数量。
+
+    Returns:
+        list: 与 images 顺序一致的识别文本，失败的位置为空字符串。
+    """
+    if not images:
+        return []
+    ocr_instance = get_manga_ocr_instance()
+    if ocr_instance is None:
+        return [""] * len(images)
+
+    results = []
+    for start in range(0, len(images), max(1, batch_size)):
+        chunk = images[start:start + max(1, batch_size)]
+        try:
+            if isinstance(ocr_instance, OnnxMangaOcr):
+                texts = ocr_instance.recognize_batch(chunk)
+            else:
+                model = ocr_instance.model
+                pixel_values = _preprocess_batch(ocr_instance, chunk).to(model.device)
+                with torch.inference_mode():
+                    token_ids = _greedy_decode_batch(model, pixel_values, constants.MANGA_OCR_MAX_LENGTH).cpu()
+                texts = [_post_process(ocr_instance.tokenizer.decode(ids, skip_special_tokens=True)) for ids in token_ids]
+        except Exception as e:
+            logger.error(f"MangaOCR 批量识别失败，改为逐个识别: {e}", exc_info=True)
+            texts = [recognize_japanese_text(image) for image in chunk]
+        results.extend(text if text else "" for text in texts)
+    return results
+
 # --- 测试代码 ---
 if __name__ == '__main__':
     print("--- 测试 MangaOCR 接口 ---")
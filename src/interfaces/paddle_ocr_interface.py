@@ -14,6 +14,8 @@ import tarfile
 import shutil
 from PIL import Image
 import time
+import threading
+from collections import OrderedDict
 
 from src.shared.path_helpers import resource_path, get_debug_dir
 from src.shared import constants
@@ -26,7 +28,65 @@ logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("PaddleOCR")
 
+RECOGNITION_MODES = ('page', 'crop', 'bubble')
+
+
+def _sort_line_boxes(boxes):
+    """文本行按从上到下、从左到右排序 (纵坐标相差不到 10 像素视为同一行，与 PaddleOCR 一致)。"""
+    boxes = sorted(boxes, key=lambda box: (box[0][1], box[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def _crop_line(img_np, box):
+    """按检测到的四边形透视裁剪文本行，竖长的文本行旋转为横向 (与 PaddleOCR 的 get_rotate_crop_image 一致)。"""
+    points = np.asarray(box, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    if width < 1 or height < 1:
+        return None
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    line_img = cv2.warpPerspective(img_np, cv2.getPerspectiveTransform(points, target), (width, height),
+                                   borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if line_img.shape[0] / line_img.shape[1] >= 1.5:
+        line_img = np.rot90(line_img)
+    return line_img
+
+
+def _assign_lines_to_bubbles(line_boxes, bubble_coords, min_overlap):
+    """
+    按几何位置把文本行分配给气泡：取与文本行外接矩形重叠面积最大的气泡，
+    重叠面积占文本行面积的比例低于 min_overlap 时不分配。
+
+    Returns:
+        list: 每个文本行所属气泡的索引，未分配为 -1。
+    """
+    if not line_boxes or not bubble_coords:
+        return [-1] * len(line_boxes)
+    points = np.asarray(line_boxes, dtype=np.float32)                     # (行数, 4, 2)
+    lines = np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)[:, None, :]  # (行数, 1, 4)
+    bubbles = np.asarray(bubble_coords, dtype=np.float32)[None, :, :]       # (1, 气泡数, 4)
+    inter_w = np.clip(np.minimum(lines[..., 2], bubbles[..., 2]) - np.maximum(lines[..., 0], bubbles[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(lines[..., 3], bubbles[..., 3]) - np.maximum(lines[..., 1], bubbles[..., 1]), 0, None)
+    line_area = np.maximum((lines[..., 2] - lines[..., 0]) * (lines[..., 3] - lines[..., 1]), 1.0)
+    ratio = inter_w * inter_h / line_area                                   # (行数, 气泡数)
+    best = ratio.argmax(axis=1)
+    return [int(b) if ratio[i, b] >= min_overlap else -1 for i, b in enumerate(best)]
+
+
 class PaddleOCRHandler:
+    """
+    PaddleOCR 处理器。
+
+    已初始化的 PaddleOCR 实例按语言保存在池中，切换语言时直接复用，
+    池中实例数或估算内存超过上限 (PADDLE_OCR_POOL_MAX_INSTANCES / PADDLE_OCR_POOL_MAX_MEMORY_MB)
+    时淘汰最久未使用的语言；只有被淘汰的语言再次使用时才重新构建。
+    """
     def __init__(self):
         """初始化PaddleOCR处理器"""
         # 获取模型目录路径
@@ -36,75 +96,136 @@ class PaddleOCRHandler:
         
         self.initialized = False
         self.ocr = None
+        self.current_lang = None
         self.lang_dict = constants.PADDLE_LANG_MAP
-        
+        self._lock = threading.RLock()
+        self._pool = OrderedDict()   # 语言 -> (PaddleOCR 实例, 估算内存 MB)，按最近使用排序
+        self._model_sizes = {}       # 已确认模型文件齐全的语言代码 -> 模型文件大小 (MB)
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _model_dirs(self, lang_code):
+        return (os.path.join(self.model_dir, f"det_{lang_code}"),
+                os.path.join(self.model_dir, f"rec_{lang_code}"),
+                os.path.join(self.model_dir, "cls"))
+
+    def _check_models(self, lang):
+        """
+        确保模型已下载并记录模型文件大小。同一语言只检查一次，结果缓存在 _model_sizes 中。
+
+        Returns:
+            float: 该语言 检测 + 识别 + 方向分类 模型文件的总大小 (MB)。
+        """
+        lang_code = self.lang_dict.get(lang, "en")
+        if lang_code in self._model_sizes:
+            return self._model_sizes[lang_code]
+        self._ensure_models_downloaded(lang)
+        total_bytes = 0
+        for model_dir in self._model_dirs(lang_code):
+            if not os.path.exists(model_dir):
+                logger.error(f"模型目录不存在: {model_dir}")
+                continue
+            files = os.listdir(model_dir)
+            logger.debug(f"模型目录 {model_dir} 内容: {files}")
+            total_bytes += sum(os.path.getsize(os.path.join(model_dir, name)) for name in files
+                               if os.path.isfile(os.path.join(model_dir, name)))
+        size_mb = total_bytes / (1024 * 1024)
+        self._model_sizes[lang_code] = size_mb
+        return size_mb
+
+    def _estimate_memory_mb(self, model_size_mb):
+        """按模型文件大小估算一个实例常驻内存 (推理引擎与中间缓冲区约为模型文件的数倍)。"""
+        return model_size_mb * constants.PADDLE_OCR_MEMORY_PER_MODEL_MB_FACTOR
+
+    def _evict(self, incoming_mb):
+        """为新实例腾出空间：按最久未使用的顺序淘汰，直到实例数与内存都不超过上限。"""
+        max_instances = max(1, constants.PADDLE_OCR_POOL_MAX_INSTANCES)
+        max_memory_mb = constants.PADDLE_OCR_POOL_MAX_MEMORY_MB
+        while self._pool:
+            used_mb = sum(memory_mb for _, memory_mb in self._pool.values())
+            over_count = len(self._pool) + 1 > max_instances
+            over_memory = max_memory_mb > 0 and used_mb + incoming_mb > max_memory_mb
+            if not (over_count or over_memory):
+                break
+            lang, _ = self._pool.popitem(last=False)
+            self._stats['evictions'] += 1
+            logger.info(f"PaddleOCR 实例池已满，淘汰最久未使用的语言: {lang}")
+
     def initialize(self, lang="en"):
         """
-        初始化PaddleOCR模型
+        获取 (必要时构建) 指定语言的 PaddleOCR 实例，并设为当前实例。
         
         参数:
         - lang: 语言代码，支持 "en"(英文)、"korean"(韩文)等
         """
-        try:
-            # 确保模型已下载
-            self._ensure_models_downloaded(lang)
-            
-            # 导入PaddleOCR
+        ocr = self._acquire(lang)
+        with self._lock:
+            self.ocr, self.current_lang, self.initialized = ocr, (lang if ocr else None), ocr is not None
+        return ocr is not None
+
+    def _acquire(self, lang, count=True):
+        """从池中取出指定语言的实例，不在池中时构建并放入池中。失败时返回 None。"""
+        with self._lock:
+            pooled = self._pool.get(lang)
+            if pooled is not None:
+                self._pool.move_to_end(lang)
+                if count:
+                    self._stats['hits'] += 1
+                return pooled[0]
+            self._stats['misses'] += 1
             try:
-                from paddleocr import PaddleOCR
-            except ImportError:
-                logger.error("PaddleOCR模块未安装，请使用pip install paddleocr安装")
-                raise ImportError("需要先安装PaddleOCR: pip install paddleocr")
-            
-            # 获取语言代码
-            lang_code = self.lang_dict.get(lang, "en")
-            
-            # 检查模型目录是否存在
-            det_model_dir = os.path.join(self.model_dir, f"det_{lang_code}")
-            rec_model_dir = os.path.join(self.model_dir, f"rec_{lang_code}")
-            cls_model_dir = os.path.join(self.model_dir, "cls")
-            
-            logger.info(f"检查模型目录: det={det_model_dir}, rec={rec_model_dir}, cls={cls_model_dir}")
-            
-            # 检查模型文件是否存在
-            if os.path.exists(det_model_dir):
-                det_files = os.listdir(det_model_dir)
-                logger.info(f"检测模型目录内容: {det_files}")
-            else:
-                logger.error(f"检测模型目录不存在: {det_model_dir}")
-            
-            if os.path.exists(rec_model_dir):
-                rec_files = os.listdir(rec_model_dir)
-                logger.info(f"识别模型目录内容: {rec_files}")
-            else:
-                logger.error(f"识别模型目录不存在: {rec_model_dir}")
-            
-            if os.path.exists(cls_model_dir):
-                cls_files = os.listdir(cls_model_dir)
-                logger.info(f"方向分类模型目录内容: {cls_files}")
-            else:
-                logger.error(f"方向分类模型目录不存在: {cls_model_dir}")
-            
-            # 初始化OCR对象
-            logger.info(f"初始化PaddleOCR引擎 (语言: {lang})")
-            self.ocr = PaddleOCR(
-                use_angle_cls=True,  # 使用方向分类器
-                lang=lang_code,      # 设置识别语言
-                use_gpu=False,       # 默认使用CPU
-                det_model_dir=det_model_dir,  # 检测模型路径
-                rec_model_dir=rec_model_dir,  # 识别模型路径
-                cls_model_dir=cls_model_dir,  # 方向分类模型路径
-                show_log=False       # 不显示日志
-            )
-            
-            self.initialized = True
-            self.current_lang = lang
-            logger.info(f"PaddleOCR初始化完成 (语言: {lang})")
-            return True
-        except Exception as e:
-            logger.error(f"初始化PaddleOCR失败: {e}", exc_info=True)
-            self.initialized = False
-            return False
+                # 确保模型已下载 (每种语言只检查一次)
+                model_size_mb = self._check_models(lang)
+                
+                # 导入PaddleOCR
+                try:
+                    from paddleocr import PaddleOCR
+                except ImportError:
+                    logger.error("PaddleOCR模块未安装，请使用pip install paddleocr安装")
+                    raise ImportError("需要先安装PaddleOCR: pip install paddleocr")
+                
+                # 获取语言代码
+                lang_code = self.lang_dict.get(lang, "en")
+                det_model_dir, rec_model_dir, cls_model_dir = self._model_dirs(lang_code)
+                
+                memory_mb = self._estimate_memory_mb(model_size_mb)
+                self._evict(memory_mb)
+
+                # 初始化OCR对象
+                logger.info(f"初始化PaddleOCR引擎 (语言: {lang})")
+                start_time = time.time()
+                ocr = PaddleOCR(
+                    use_angle_cls=True,  # 使用方向分类器
+                    lang=lang_code,      # 设置识别语言
+                    use_gpu=False,       # 默认使用CPU
+                    det_model_dir=det_model_dir,  # 检测模型路径
+                    rec_model_dir=rec_model_dir,  # 识别模型路径
+                    cls_model_dir=cls_model_dir,  # 方向分类模型路径
+                    rec_batch_num=constants.PADDLE_OCR_REC_BATCH_SIZE,  # 识别器每批的文本行数
+                    det_limit_side_len=constants.PADDLE_OCR_DET_LIMIT_SIDE_LEN,  # 检测图像长边上限
+                    show_log=False       # 不显示日志
+                )
+                self._pool[lang] = (ocr, memory_mb)
+                logger.info(f"PaddleOCR初始化完成 (语言: {lang}, 耗时: {time.time() - start_time:.2f}s, 池中语言: {list(self._pool)})")
+                return ocr
+            except Exception as e:
+                logger.error(f"初始化PaddleOCR失败: {e}", exc_info=True)
+                return None
+
+    def get_pool_stats(self):
+        """返回实例池中的语言 (按最近使用排序)、估算内存与命中/未命中/淘汰次数。"""
+        with self._lock:
+            return {
+                'languages': [{'lang': lang, 'estimated_mb': round(memory_mb, 1)} for lang, (_, memory_mb) in self._pool.items()],
+                'max_instances': constants.PADDLE_OCR_POOL_MAX_INSTANCES,
+                'max_memory_mb': constants.PADDLE_OCR_POOL_MAX_MEMORY_MB,
+                **self._stats
+            }
+
+    def clear_pool(self):
+        """释放池中的所有实例 (下次使用时重新构建)。"""
+        with self._lock:
+            self._pool.clear()
+            self.ocr, self.current_lang, self.initialized = None, None, False
     
     def _ensure_models_downloaded(self, lang):
         """
@@ -251,18 +372,100 @@ class PaddleOCRHandler:
             logger.error(f"下载模型失败: {e}", exc_info=True)
             raise
     
-    def recognize_text(self, image, bubble_coords):
+    def _recognize_lines(self, ocr, line_imgs):
+        """对文本行图像做方向分类 (启用时) 并批量识别，返回 [(文本, 置信度), ...]。"""
+        if getattr(ocr, 'use_angle_cls', False) and getattr(ocr, 'text_classifier', None) is not None:
+            line_imgs, _, _ = ocr.text_classifier(line_imgs)
+        rec_res, _ = ocr.text_recognizer(line_imgs)
+        return rec_res
+
+    def _recognize_page(self, ocr, img_np, bubble_coords):
+        """
+        整页识别：在所有气泡的外接区域上只做一次文本行检测，按几何位置把文本行分配给气泡，
+        再把全部文本行合并批量识别。每个气泡的文本行按阅读顺序以空格连接。
+        """
+        height, width = img_np.shape[:2]
+        coords = np.clip(np.asarray(bubble_coords, dtype=np.int64).reshape(-1, 4), 0, [width, height, width, height])
+        x0, y0 = coords[:, :2].min(axis=0)
+        x1, y1 = coords[:, 2:].max(axis=0)
+        region = np.ascontiguousarray(img_np[y0:y1, x0:x1])
+        if region.size == 0:
+            return [""] * len(bubble_coords)
+
+        start_time = time.time()
+        dt_boxes, _ = ocr.text_detector(region)
+        det_seconds = time.time() - start_time
+        line_boxes = _sort_line_boxes([box for box in (dt_boxes if dt_boxes is not None else [])])
+        # 检测在外接区域上进行，分配气泡前换算回整页坐标
+        owners = _assign_lines_to_bubbles([np.asarray(box) + [x0, y0] for box in line_boxes], coords.tolist(),
+                                          constants.PADDLE_OCR_LINE_MIN_OVERLAP)
+
+        line_imgs, line_owners = [], []
+        for box, owner in zip(line_boxes, owners):
+            if owner < 0:
+                continue
+            line_img = _crop_line(region, box)
+            if line_img is not None:
+                line_imgs.append(line_img)
+                line_owners.append(owner)
+
+        bubble_lines = [[] for _ in bubble_coords]
+        if line_imgs:
+            start_time = time.time()
+            rec_res = self._recognize_lines(ocr, line_imgs)
+            drop_score = getattr(ocr, 'drop_score', 0.5)
+            for owner, (text, score) in zip(line_owners, rec_res):
+                if text and score >= drop_score:
+                    bubble_lines[owner].append(text)
+            logger.info(f"PaddleOCR 整页识别: 检测 {det_seconds:.2f}s, 文本行 {len(line_imgs)}/{len(line_boxes)} 个, "
+                        f"批量识别 {time.time() - start_time:.2f}s")
+        else:
+            logger.info(f"PaddleOCR 整页识别: 检测 {det_seconds:.2f}s, 气泡内未检测到文本行")
+
+        recognized_texts = [" ".join(lines) for lines in bubble_lines]
+        for i, text in enumerate(recognized_texts):
+            if text:
+                logger.info(f"气泡{i}识别文本: '{text}'")
+            else:
+                logger.info(f"气泡{i}未识别出文本")
+        return recognized_texts
+
+    def _recognize_crops(self, ocr, img_np, bubble_coords):
+        """跳过检测：每个气泡裁剪图直接作为一行文本，全部气泡合并批量识别。"""
+        recognized_texts = [""] * len(bubble_coords)
+        crops, indices = [], []
+        for i, (x1, y1, x2, y2) in enumerate(bubble_coords):
+            crop = img_np[max(0, y1):y2, max(0, x1):x2]
+            if crop.size > 0:
+                crops.append(np.ascontiguousarray(crop))
+                indices.append(i)
+        if not crops:
+            return recognized_texts
+        start_time = time.time()
+        rec_res = self._recognize_lines(ocr, crops)
+        drop_score = getattr(ocr, 'drop_score', 0.5)
+        for i, (text, score) in zip(indices, rec_res):
+            recognized_texts[i] = text if score >= drop_score else ""
+            logger.info(f"气泡{i}识别文本: '{recognized_texts[i]}'" if recognized_texts[i] else f"气泡{i}未识别出文本")
+        logger.info(f"PaddleOCR 批量识别 {len(crops)} 个气泡裁剪图耗时: {time.time() - start_time:.2f}s")
+        return recognized_texts
+
+    def recognize_text(self, image, bubble_coords, lang=None, mode=None):
         """
         使用PaddleOCR识别图像中的文本
         
         参数:
         - image: PIL Image对象
         - bubble_coords: 气泡坐标列表，格式为[[x1,y1,x2,y2], ...]
+        - lang: 使用池中该语言的实例 (多个线程交替使用不同语言时应传入)，为空时使用当前实例
+        - mode: 识别方式 'page' / 'crop' / 'bubble'，为空时使用 PADDLE_OCR_RECOGNITION_MODE
         
         返回:
         - 识别结果列表，格式为[text1, text2, ...]
         """
-        if not self.initialized or self.ocr is None:
+        # 指定语言时直接从池中取 (已被淘汰则重新构建)，不受其他线程切换当前实例的影响
+        ocr = self._acquire(lang, count=False) if lang else (self.ocr if self.initialized else None)
+        if ocr is None:
             logger.error("PaddleOCR未初始化，请先调用initialize方法")
             return []
         
@@ -273,6 +476,21 @@ class PaddleOCRHandler:
             else:
                 img_np = image
             
+            mode = mode or constants.PADDLE_OCR_RECOGNITION_MODE
+            if mode not in RECOGNITION_MODES:
+                logger.warning(f"未知的 PaddleOCR 识别方式 '{mode}'，使用 bubble。")
+                mode = 'bubble'
+            if mode != 'bubble' and bubble_coords:
+                if getattr(ocr, 'text_recognizer', None) is None or (mode == 'page' and getattr(ocr, 'text_detector', None) is None):
+                    logger.warning(f"当前 PaddleOCR 版本不支持单独调用检测/识别模型，'{mode}' 方式改为逐个气泡识别。")
+                else:
+                    try:
+                        if mode == 'page':
+                            return self._recognize_page(ocr, img_np, bubble_coords)
+                        return self._recognize_crops(ocr, img_np, bubble_coords)
+                    except Exception as e:
+                        logger.error(f"PaddleOCR '{mode}' 方式识别失败，改为逐个气泡识别: {e}", exc_info=True)
+
             # 结果列表
             recognized_texts = []
             
@@ -293,7 +511,7 @@ class PaddleOCRHandler:
                     
                     # 使用PaddleOCR识别文本
                     start_time = time.time()
-                    result = self.ocr.ocr(bubble_img, cls=True)
+                    result = ocr.ocr(bubble_img, cls=True)
                     logger.info(f"气泡{i}识别耗时: {time.time() - start_time:.2f}秒")
                     
                     # 提取文本
@@ -7,20 +7,73 @@ import base64
 import requests
 import json
 import time
+import threading
+from collections import deque
 from io import BytesIO
 from PIL import Image
-from openai import OpenAI  # 添加OpenAI库导入，用于火山引擎调用
 
 from src.shared import constants
-from src.shared.image_helpers import image_to_base64
+from src.shared.image_helpers import encode_image_for_upload
+from src.shared.http_clients import get_openai_client, http_post, track_request
+from src.shared.resilience import call_with_resilience, breaker_scope, CircuitOpenError
+from src.shared.adaptive_limits import request_slot # rpm 限流 / 自适应限流
 
 # 设置日志
 logger = logging.getLogger("VisionInterface")
 
+# 每次视觉请求发送的字节数与耗时，用于调整图像编码策略
+_vision_stats = {}
+_vision_recent = deque(maxlen=constants.AI_VISION_STATS_RECENT)
+_vision_stats_lock = threading.Lock()
+
+
+def _encoding_name(mime_type, policy):
+    policy = policy or {}
+    name = mime_type.split('/')[-1]
+    if policy.get('quality') and name in ('jpeg', 'webp'):
+        name += f"/q{policy['quality']}"
+    if policy.get('grayscale'):
+        name += "/gray"
+    if policy.get('max_side'):
+        name += f"/max{policy['max_side']}"
+    return name
+
+
+def _record_vision_call(provider, encoding, size, nbytes, elapsed_ms, ok):
+    with _vision_stats_lock:
+        stats = _vision_stats.setdefault(f"{provider}:{encoding}", {
+            'provider': provider, 'encoding': encoding, 'count': 0, 'errors': 0, 'total_bytes': 0, 'total_ms': 0.0})
+        stats['count'] += 1
+        stats['total_bytes'] += nbytes
+        stats['total_ms'] += elapsed_ms
+        if not ok:
+            stats['errors'] += 1
+        _vision_recent.append({'provider': provider, 'encoding': encoding, 'width': size[0], 'height': size[1],
+                               'bytes': nbytes, 'ms': round(elapsed_ms, 1), 'ok': ok, 'time': time.time()})
+
+
+def get_vision_ocr_stats():
+    """返回各 (服务商, 编码策略) 的请求数、平均发送字节数与平均耗时，以及最近若干次请求的明细。"""
+    with _vision_stats_lock:
+        summary = []
+        for stats in _vision_stats.values():
+            count = stats['count'] or 1
+            summary.append(dict(stats, avg_bytes=round(stats['total_bytes'] / count),
+                                avg_ms=round(stats['total_ms'] / count, 1)))
+        return {'summary': sorted(summary, key=lambda s: (s['provider'], s['encoding'])), 'recent': list(_vision_recent)}
+
+
+def reset_vision_ocr_stats():
+    with _vision_stats_lock:
+        _vision_stats.clear()
+        _vision_recent.clear()
+
 # VVVVVV 新增：通用的 OpenAI 兼容视觉 API 调用函数 VVVVVV
-def _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt, base_url_to_use, service_friendly_name, start_time):
+def _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt, base_url_to_use, service_friendly_name, start_time,
+                                    provider=None, rpm_limit=0, mime_type="image/png"):
     """
     通用的 OpenAI 兼容视觉 API 调用函数。
+    每次请求前按 rpm_limit 限流 (开启自适应限流时按服务商的限流反馈自动调整，rpm_limit 作为上限)。
     """
     logger.info(f"开始调用 {service_friendly_name} 视觉API (通过 OpenAI SDK)，模型: {model_name}, BaseURL: {base_url_to_use}")
     try:
@@ -28,14 +81,14 @@ def _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt, b
             logger.error(f"调用 {service_friendly_name} 失败：未提供 Base URL。")
             return ""
 
-        client = OpenAI(api_key=api_key, base_url=base_url_to_use) # 使用传入的 base_url_to_use
+        client = get_openai_client(base_url_to_use, api_key) # 复用 base_url_to_use 对应的连接池
 
         payload_messages = [ # payload 结构保持一致
             {
                 "role": "user",
                 "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_base64}"}}
+                    {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image_base64}"}}
                 ]
             }
         ]
@@ -43,10 +96,17 @@ def _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt, b
         # debug_payload = { "model": model_name, "messages": [...] }
         # logger.debug(f"{service_friendly_name} API 请求体 (无图): {json.dumps(debug_payload, ensure_ascii=False)}")
 
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=payload_messages
-        )
+        def request_once():
+            with request_slot('ai_vision_ocr', provider or service_friendly_name, api_key, rpm_limit, model=model_name):
+                with track_request(f"vision:{service_friendly_name}"):
+                    return client.chat.completions.create(
+                        model=model_name,
+                        messages=payload_messages
+                    )
+
+        # 429/5xx/网络错误按退避策略重试，服务商连续失败时熔断
+        response = call_with_resilience('ai_vision_ocr', provider or service_friendly_name, request_once,
+                                        scope=breaker_scope(base_url_to_use, api_key))
 
         if response and response.choices and len(response.choices) > 0:
             content = response.choices[0].message.content
@@ -57,6 +117,9 @@ def _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt, b
         else:
             logger.error(f"{service_friendly_name} 响应格式异常或无有效结果, 响应: {response}")
             return ""
+    except CircuitOpenError as e:
+        logger.error(f"{service_friendly_name} 视觉API已熔断: {e}")
+        return ""
     except Exception as e:
         logger.error(f"调用 {service_friendly_name} 视觉API ({base_url_to_use}) 时发生异常: {e}", exc_info=True)
         # 记录更详细的错误响应 (如果可用)
@@ -72,8 +135,17 @@ def _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt, b
 
 def call_ai_vision_ocr_service(image_pil, provider='siliconflow', api_key=None, model_name=None, prompt=None,
                                # VVVVVV 新增 custom_base_url 参数 VVVVVV
-                               custom_base_url=None):
+                               custom_base_url=None,
                                # ^^^^^^ 结束新增 ^^^^^^
+                               rpm_limit=0, encoding=None):
+    """
+    调用 AI 视觉服务识别图片中的文字。
+
+    Args:
+        rpm_limit (int): 每分钟请求数限制 (0 表示不限制)，在每次实际请求 (包括重试) 前执行。
+        encoding (dict, optional): 图像编码策略 (见 encode_image_for_upload)，为 None 时发送无损 PNG。
+            每次调用发送的字节数与耗时记录在 get_vision_ocr_stats() 中。
+    """
     if not image_pil:
         logger.error("未提供有效图像")
         return ""
@@ -89,26 +161,38 @@ def call_ai_vision_ocr_service(image_pil, provider='siliconflow', api_key=None,
 
     start_time = time.time()
     try:
-        image_base64 = image_to_base64(image_pil)
+        image_base64, mime_type, nbytes = encode_image_for_upload(image_pil, encoding)
     except Exception as e:
         logger.error(f"图像转Base64失败: {e}")
         return ""
 
+    result = _call_vision_provider(image_base64, mime_type, provider, api_key, model_name, prompt,
+                                   custom_base_url, rpm_limit, start_time)
+    _record_vision_call(provider, _encoding_name(mime_type, encoding), image_pil.size, nbytes,
+                        (time.time() - start_time) * 1000, bool(result))
+    return result
+
+
+def _call_vision_provider(image_base64, mime_type, provider, api_key, model_name, prompt, custom_base_url, rpm_limit, start_time):
+    """按服务商分发视觉请求，失败时返回空字符串。"""
     try:
         provider_lower = provider.lower()
         if provider_lower == 'siliconflow':
-            return call_siliconflow_vision_api(image_base64, api_key, model_name, prompt, start_time)
+            return call_siliconflow_vision_api(image_base64, api_key, model_name, prompt, start_time,
+                                               rpm_limit=rpm_limit, mime_type=mime_type)
         elif provider_lower == 'volcano':
             # VVVVVV 修改为调用通用函数 VVVVVV
             return _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt,
                                                    "https://ark.cn-beijing.volces.com/api/v3",
-                                                   "火山引擎", start_time)
+                                                   "火山引擎", start_time, provider='volcano', rpm_limit=rpm_limit,
+                                                   mime_type=mime_type)
             # ^^^^^^ 结束修改 ^^^^^^
         elif provider_lower == 'gemini':
             # VVVVVV 修改为调用通用函数 VVVVVV
             return _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt,
                                                    "https://generativelanguage.googleapis.com/v1beta/openai/",
-                                                   "Gemini Vision", start_time)
+                                                   "Gemini Vision", start_time, provider='gemini', rpm_limit=rpm_limit,
+                                                   mime_type=mime_type)
             # ^^^^^^ 结束修改 ^^^^^^
         # VVVVVV 新增对自定义服务商的处理 VVVVVV
         elif provider_lower == constants.CUSTOM_AI_VISION_PROVIDER_ID: # 使用后端常量
@@ -117,7 +201,9 @@ def call_ai_vision_ocr_service(image_pil, provider='siliconflow', api_key=None,
                 return ""
             return _call_generic_openai_vision_api(image_base64, api_key, model_name, prompt,
                                                    custom_base_url, # <<< 使用传入的自定义 Base URL
-                                                   "自定义OpenAI兼容视觉服务", start_time)
+                                                   "自定义OpenAI兼容视觉服务", start_time,
+                                                   provider=constants.CUSTOM_AI_VISION_PROVIDER_ID, rpm_limit=rpm_limit,
+                                                   mime_type=mime_type)
         # ^^^^^^ 结束新增 ^^^^^^
         else:
             logger.error(f"不支持的AI视觉OCR服务提供商: {provider}")
@@ -126,7 +212,7 @@ def call_ai_vision_ocr_service(image_pil, provider='siliconflow', api_key=None,
         logger.error(f"调用AI视觉OCR服务 ({provider}) 时发生顶层异常: {e}", exc_info=True)
         return ""
 
-def call_siliconflow_vision_api(image_base64, api_key, model_name, prompt, start_time):
+def call_siliconflow_vision_api(image_base64, api_key, model_name, prompt, start_time, rpm_limit=0, mime_type="image/png"):
     """
     调用SiliconFlow的视觉API进行OCR识别
     
@@ -136,6 +222,7 @@ def call_siliconflow_vision_api(image_base64, api_key, model_name, prompt, start
         model_name (str): 模型名称 (如 'silicon-llava2-34b')
         prompt (str): 提示词
         start_time (float): 计时起点
+        mime_type (str): 图片的 MIME 类型
     
     Returns:
         str: 识别结果文本
@@ -161,7 +248,7 @@ def call_siliconflow_vision_api(image_base64, api_key, model_name, prompt, start
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{image_base64}"
+                            "url": f"data:{mime_type};base64,{image_base64}"
                         }
                     }
                 ]
@@ -170,13 +257,20 @@ def call_siliconflow_vision_api(image_base64, api_key, model_name, prompt, start
     }
     
     try:
-        # 发送请求
-        response = requests.post(
-            "https://api.siliconflow.cn/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        
+        def request_once():
+            with request_slot('ai_vision_ocr', 'siliconflow', api_key, rpm_limit, model=model_name):
+                response = http_post(
+                    'vision:siliconflow',
+                    "https://api.siliconflow.cn/v1/chat/completions",
+                    headers=headers,
+                    json=payload
+                )
+                response.raise_for_status() # 非 200 抛出 HTTPError，由 call_with_resilience 判断是否重试
+                return response
+
+        # 发送请求 (429/5xx/网络错误按退避策略重试，服务商连续失败时熔断)
+        response = call_with_resilience('ai_vision_ocr', 'siliconflow', request_once, scope=breaker_scope(api_key=api_key))
+
         # 检查响应状态
         if response.status_code == 200:
             result = response.json()
@@ -196,6 +290,12 @@ def call_siliconflow_vision_api(image_base64, api_key, model_name, prompt, start
             logger.error(f"SiliconFlow API请求失败: HTTP {response.status_code}, {response.text}")
             return ""
             
+    except CircuitOpenError as e:
+        logger.error(f"SiliconFlow 视觉API已熔断: {e}")
+        return ""
+    except requests.exceptions.HTTPError as e:
+        logger.error(f"SiliconFlow API请求失败: HTTP {e.response.status_code}, {e.response.text}")
+        return ""
     except requests.exceptions.Timeout:
         logger.error("SiliconFlow API请求超时")
         return ""
@@ -1,8 +1,8 @@
-import requests
 import hashlib
 import time
 import uuid
 import logging
+from src.shared.http_clients import http_post
 
 logger = logging.getLogger(__name__)
 
@@ -31,32 +31,7 @@ class YoudaoTranslateInterface:
             return text
             
         try:
-            # 准备请求参数
-            salt = str(uuid.uuid1())
-            curtime = str(int(time.time()))
-            
-            # 计算input参数
-            input_text = self._truncate(text)
-            
-            # 计算签名
-            sign_str = self.app_key + input_text + salt + curtime + self.app_secret
-            sign = hashlib.sha256(sign_str.encode('utf-8')).hexdigest()
-            
-            # 构建请求参数
-            params = {
-                'q': text,
-                'from': from_lang,
-                'to': to_lang,
-                'appKey': self.app_key,
-                'salt': salt,
-                'sign': sign,
-                'signType': 'v3',
-                'curtime': curtime
-            }
-            
-            # 发送请求
-            response = requests.post(self.api_url, params=params)
-            result = response.json()
+            result = self._request(text, from_lang, to_lang)
             
             # 处理结果
             if 'translation' in result and result['translation']:
@@ -69,6 +44,67 @@ class YoudaoTranslateInterface:
         except Exception as e:
             logger.error(f"有道翻译API调用异常: {str(e)}")
             return text
+
+    def translate_batch(self, texts, from_lang="auto", to_lang="zh-CHS"):
+        """
+        一次请求翻译多段文本。
+
+        有道翻译保留查询中的换行，因此将每段文本作为一行 (段内换行替换为空格) 发送，再按行拆回。
+
+        参数:
+            texts: 待翻译文本列表，不应包含空文本
+            from_lang, to_lang: 同 translate
+
+        返回:
+            与 texts 一一对应的译文列表；出错或返回行数与输入不一致时返回 None，由调用方逐段重试
+        """
+        if not self.app_key or not self.app_secret:
+            logger.error("有道翻译API密钥未设置")
+            return None
+
+        lines = [' '.join(text.splitlines()) for text in texts]
+        try:
+            result = self._request('\n'.join(lines), from_lang, to_lang)
+        except Exception as e:
+            logger.error(f"有道翻译API批量调用异常: {str(e)}")
+            return None
+        if not result.get('translation'):
+            logger.error(f"有道翻译API返回错误，错误码: {result.get('errorCode', 'unknown')}")
+            return None
+        translated_lines = result['translation'][0].split('\n')
+        if len(translated_lines) != len(lines):
+            logger.warning(f"有道翻译批量请求返回 {len(translated_lines)} 行，期望 {len(lines)} 行")
+            return None
+        return translated_lines
+
+    def _request(self, query, from_lang, to_lang):
+        """签名并发送翻译请求，返回响应 JSON。"""
+        # 准备请求参数
+        salt = str(uuid.uuid1())
+        curtime = str(int(time.time()))
+        
+        # 计算input参数
+        input_text = self._truncate(query)
+        
+        # 计算签名
+        sign_str = self.app_key + input_text + salt + curtime + self.app_secret
+        sign = hashlib.sha256(sign_str.encode('utf-8')).hexdigest()
+        
+        # 构建请求参数
+        params = {
+            'q': query,
+            'from': from_lang,
+            'to': to_lang,
+            'appKey': self.app_key,
+            'salt': salt,
+            'sign': sign,
+            'signType': 'v3',
+            'curtime': curtime
+        }
+        
+        # 发送请求
+        response = http_post('youdao_translate', self.api_url, params=params)
+        return response.json()
     
     def _truncate(self, q):
         """
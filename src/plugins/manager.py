@@ -275,6 +275,14 @@ class PluginManager:
         if removed_count > 0:
             logger.info(f"已注销插件 '{plugin_name_to_remove}' 的 {removed_count} 个钩子。")
 
+    def has_active_hook(self, hook_name):
+        """检查指定钩子点是否注册了至少一个已启用插件的处理函数。"""
+        for hook_method in self.hooks.get(hook_name, []):
+            plugin_instance = getattr(hook_method, '__self__', None)
+            if isinstance(plugin_instance, PluginBase) and plugin_instance.is_enabled():
+                return True
+        return False
+
     def trigger_hook(self, hook_name, *args, **kwargs):
         """
         触发指定的钩子点，并按顺序执行所有注册的方法。
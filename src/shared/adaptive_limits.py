@@ -0,0 +1,268 @@
+"""
+自适应限流 (AIMD)。
+
+手动设置 rpm 时，设得太低浪费吞吐，设得太高又会引发成片的 429。开启自适应模式后，
+每个 (服务类型, 服务商, 模型) 分别维护并发数与 rpm：
+
+    - 请求成功: 并发数约每一轮增加 1 (每次成功增加 1/并发数)，rpm 每次增加 ADAPTIVE_RPM_INCREASE
+    - 被限流 (HTTP 429) 或超时: 并发数与 rpm 乘以 ADAPTIVE_DECREASE_FACTOR，并记下减速前的 rpm 作为已学到的上限
+    - 超过已学到的上限后增长放慢，以便缓慢试探服务商是否放宽了限制
+
+用户设置的 rpm 作为上限 (为 0 时以 ADAPTIVE_MAX_RPM 为上限)，服务商的翻译并发设置作为并发上限。
+学到的限额保存在 config/adaptive_limits.json，重启后从上次的位置继续，而不是重新从初始值增长。
+
+未开启自适应模式时，request_slot() 只按设置的 rpm 限流，与原先的行为一致。
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from src.shared import constants
+from src.shared.config_loader import load_json_config, save_json_config
+from src.shared.rate_limiter import acquire_rate_limit
+from src.shared.resilience import get_status_code
+
+logger = logging.getLogger("AdaptiveLimits")
+
+ADAPTIVE_LIMITS_FILE = 'adaptive_limits.json'
+
+# 请求结果
+OUTCOME_SUCCESS = 'success'
+OUTCOME_THROTTLED = 'throttled'
+OUTCOME_ERROR = 'error' # 其他错误，不调整限额
+
+
+def is_throttle_error(error):
+    """429 或超时视为服务商限流的信号。"""
+    if get_status_code(error) == 429:
+        return True
+    if isinstance(error, TimeoutError):
+        return True
+    # requests.Timeout / httpx.TimeoutException / openai.APITimeoutError 等
+    return any('Timeout' in cls.__name__ for cls in type(error).__mro__)
+
+
+class AdaptiveLimit:
+    """单个 (服务类型, 服务商, 模型) 的自适应并发数与 rpm。线程安全。"""
+    def __init__(self, key, state=None):
+        state = state or {}
+        self.key = key
+        self._cond = threading.Condition()
+        self.concurrency = float(state.get('concurrency') or constants.ADAPTIVE_INITIAL_CONCURRENCY)
+        self.rpm = float(state.get('rpm') or constants.ADAPTIVE_INITIAL_RPM)
+        self.ceiling_rpm = state.get('ceiling_rpm')
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        # 统计
+        self.successes = 0
+        self.throttles = 0
+
+    def _caps(self, rpm_cap, max_concurrency):
+        rpm_cap = rpm_cap if rpm_cap and rpm_cap > 0 else constants.ADAPTIVE_MAX_RPM
+        concurrency_cap = min(max_concurrency or constants.ADAPTIVE_MAX_CONCURRENCY, constants.ADAPTIVE_MAX_CONCURRENCY)
+        return rpm_cap, max(1, concurrency_cap)
+
+    def current_rpm(self, rpm_cap):
+        rpm_cap, _ = self._caps(rpm_cap, None)
+        with self._cond:
+            return max(1, int(min(self.rpm, rpm_cap)))
+
+    def acquire(self, max_concurrency=None, cancel_event=None):
+        """
+        占用一个并发名额，已满时阻塞等待。
+
+        Returns:
+            bool: 是否取得名额 (仅在等待时被取消才会返回 False)。
+        """
+        _, concurrency_cap = self._caps(None, max_concurrency)
+        with self._cond:
+            while self.in_flight >= max(1, int(min(self.concurrency, concurrency_cap))):
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+                # 定时醒来检查取消标志
+                self._cond.wait(0.5)
+            self.in_flight += 1
+            return True
+
+    def release(self, outcome, rpm_cap=None, max_concurrency=None):
+        """
+        释放并发名额并按结果调整限额。
+
+        Returns:
+            bool: 是否发生了减速 (调用方据此立即保存学到的上限)。
+        """
+        rpm_cap, concurrency_cap = self._caps(rpm_cap, max_concurrency)
+        decreased = False
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if outcome == OUTCOME_SUCCESS:
+                self.successes += 1
+                slowdown = constants.ADAPTIVE_ABOVE_CEILING_SLOWDOWN if self.ceiling_rpm and self.rpm >= self.ceiling_rpm else 1
+                self.rpm = min(rpm_cap, self.rpm + constants.ADAPTIVE_RPM_INCREASE / slowdown)
+                self.concurrency = min(float(concurrency_cap), self.concurrency + 1.0 / (max(1.0, self.concurrency) * slowdown))
+            elif outcome == OUTCOME_THROTTLED:
+                self.throttles += 1
+                now = time.monotonic()
+                # 同一波并发请求陆续返回的 429 只减速一次
+                if now - self._last_decrease >= constants.ADAPTIVE_DECREASE_COOLDOWN:
+                    self._last_decrease = now
+                    self.ceiling_rpm = round(min(self.rpm, rpm_cap), 1)
+                    self.rpm = max(constants.ADAPTIVE_MIN_RPM, min(self.rpm, rpm_cap) * constants.ADAPTIVE_DECREASE_FACTOR)
+                    self.concurrency = max(1.0, min(self.concurrency, concurrency_cap) * constants.ADAPTIVE_DECREASE_FACTOR)
+                    decreased = True
+                    logger.warning(f"{self.key} 被限流，rpm 降至 {self.rpm:.1f}，并发降至 {self.concurrency:.1f} (已学到的上限: {self.ceiling_rpm} rpm)")
+            self._cond.notify_all()
+        return decreased
+
+    def to_state(self):
+        """持久化的字段。"""
+        with self._cond:
+            return {
+                'concurrency': round(self.concurrency, 2),
+                'rpm': round(self.rpm, 1),
+                'ceiling_rpm': self.ceiling_rpm,
+                'updated_at': time.time()
+            }
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                'key': self.key,
+                'concurrency': round(self.concurrency, 2),
+                'rpm': round(self.rpm, 1),
+                'ceiling_rpm': self.ceiling_rpm,
+                'in_flight': self.in_flight,
+                'successes': self.successes,
+                'throttles': self.throttles
+            }
+
+
+_limits = {}
+_limits_lock = threading.Lock()
+_enabled = None
+_saved_states = None
+_last_save = 0.0
+_save_lock = threading.Lock()
+
+
+def _load():
+    """首次使用时读取配置文件。调用方需持有 _limits_lock。"""
+    global _enabled, _saved_states
+    if _saved_states is None:
+        data = load_json_config(ADAPTIVE_LIMITS_FILE, {})
+        data = data if isinstance(data, dict) else {}
+        _enabled = bool(data.get('enabled', constants.ADAPTIVE_LIMITS_ENABLED))
+        limits = data.get('limits')
+        _saved_states = limits if isinstance(limits, dict) else {}
+
+
+def _save(force=False):
+    """把学到的限额写入配置文件。非强制保存时按 ADAPTIVE_SAVE_INTERVAL 节流。"""
+    global _last_save
+    now = time.monotonic()
+    if not force and now - _last_save < constants.ADAPTIVE_SAVE_INTERVAL:
+        return
+    with _save_lock:
+        _last_save = now
+        with _limits_lock:
+            _load()
+            states = dict(_saved_states)
+            states.update({key: limit.to_state() for key, limit in _limits.items()})
+            enabled = _enabled
+        save_json_config(ADAPTIVE_LIMITS_FILE, {'enabled': enabled, 'limits': states})
+
+
+def is_adaptive_enabled():
+    with _limits_lock:
+        _load()
+        return _enabled
+
+
+def set_adaptive_enabled(enabled):
+    """开启或关闭自适应模式，并保存到配置文件。"""
+    global _enabled
+    with _limits_lock:
+        _load()
+        _enabled = bool(enabled)
+    logger.info(f"自适应限流已{'开启' if enabled else '关闭'}。")
+    _save(force=True)
+
+
+def get_adaptive_limit(service, provider, model=None):
+    """获取 (服务类型, 服务商, 模型) 的自适应限额，首次调用时从配置文件恢复。"""
+    key = f"{service}:{provider or ''}:{model or ''}"
+    limit = _limits.get(key)
+    if limit is None:
+        with _limits_lock:
+            _load()
+            limit = _limits.get(key)
+            if limit is None:
+                limit = AdaptiveLimit(key, _saved_states.get(key))
+                _limits[key] = limit
+    return limit
+
+
+@contextmanager
+def request_slot(service, provider, api_key, rpm, model=None, max_concurrency=None):
+    """
+    在一次请求前后使用：
+
+        with request_slot('translation', provider, api_key, rpm, model=model_name):
+            response = send_request()
+
+    未开启自适应模式时等同于 acquire_rate_limit(service, provider, api_key, rpm)。
+    开启时先占用自适应并发名额，再按自适应 rpm (不超过 rpm 设置) 限流，
+    并根据 with 块是否抛出 429/超时调整限额。
+    未取得许可时抛出 RuntimeError，请求不会发出；只释放实际占用的并发名额。
+
+    Args:
+        max_concurrency (int, optional): 并发上限，例如服务商的翻译并发设置。
+    """
+    if not is_adaptive_enabled():
+        if not acquire_rate_limit(service, provider, api_key, rpm):
+            raise RuntimeError(f"{service} ({provider}) 未取得 rpm 许可，请求未发出。")
+        yield
+        return
+
+    limit = get_adaptive_limit(service, provider, model)
+    if not limit.acquire(max_concurrency):
+        raise RuntimeError(f"{limit.key} 未取得并发名额，请求未发出。")
+    outcome = OUTCOME_ERROR
+    try:
+        if not acquire_rate_limit(service, provider, api_key, limit.current_rpm(rpm)):
+            raise RuntimeError(f"{limit.key} 未取得 rpm 许可，请求未发出。")
+        yield
+        outcome = OUTCOME_SUCCESS
+    except Exception as e:
+        outcome = OUTCOME_THROTTLED if is_throttle_error(e) else OUTCOME_ERROR
+        raise
+    finally:
+        # 并发名额已经占用，无论请求是否发出都要归还
+        decreased = limit.release(outcome, rpm, max_concurrency)
+        _save(force=decreased)
+
+
+def get_adaptive_limits_stats():
+    """返回自适应模式开关及各服务商当前的并发数、rpm 与已学到的上限。"""
+    with _limits_lock:
+        _load()
+        limits = list(_limits.values())
+        saved = {key: state for key, state in _saved_states.items() if key not in _limits}
+        enabled = _enabled
+    return {
+        'enabled': enabled,
+        'limits': [limit.to_dict() for limit in sorted(limits, key=lambda l: l.key)],
+        'saved': saved
+    }
+
+
+def reset_adaptive_limits():
+    """丢弃学到的限额，从初始值重新开始。"""
+    global _saved_states
+    with _limits_lock:
+        _load()
+        _limits.clear()
+        _saved_states = {}
+    _save(force=True)
@@ -57,6 +57,39 @@ SUPPORTED_LANGUAGES_OCR = {
     "italian": "PaddleOCR",
     "spanish": "PaddleOCR"
 }
+# PaddleOCR 实例池：按语言缓存已初始化的实例，超过上限时淘汰最久未使用的语言
+PADDLE_OCR_POOL_MAX_INSTANCES = 3      # 最多同时保留的语言数
+PADDLE_OCR_POOL_MAX_MEMORY_MB = 0      # 估算内存上限 (MB)，0 表示只按实例数限制
+PADDLE_OCR_MEMORY_PER_MODEL_MB_FACTOR = 4 # 估算内存 = 模型文件大小 × 该系数
+# PaddleOCR 识别方式：
+#   'page'  : 整页 (所有气泡的外接区域) 只做一次文本行检测，按几何位置把文本行分配给气泡，所有文本行合并批量识别
+#   'crop'  : 跳过检测，每个气泡裁剪图直接作为一行文本批量识别 (适用于紧贴单行文字的检测框)
+#   'bubble': 每个气泡单独运行完整的 检测 + 方向分类 + 识别 流程 (旧方式)
+PADDLE_OCR_RECOGNITION_MODE = 'page'
+PADDLE_OCR_REC_BATCH_SIZE = 16          # 识别器每批的文本行数
+PADDLE_OCR_DET_LIMIT_SIDE_LEN = 1920    # 检测时图像长边上限，整页检测时避免小字被缩得过小
+PADDLE_OCR_LINE_MIN_OVERLAP = 0.5       # 文本行与气泡的重叠面积占文本行面积的最小比例，低于该值的文本行不归入任何气泡
+# MangaOCR 批量识别：一页的气泡裁剪图合并为一个批次，编码器只运行一次，解码按批次贪心进行
+MANGA_OCR_BATCH_SIZE = 16       # 每批最多的裁剪图数量，限制显存/内存占用
+MANGA_OCR_MAX_LENGTH = 300      # 解码的最大 token 数 (与 MangaOCR 默认一致)
+MANGA_OCR_SAVE_DEBUG_CROPS = False # 是否把每个气泡裁剪图保存到 data/debug/ocr_bubbles
+# MangaOCR CPU 推理配置 (仅在没有 GPU 时生效，可用同名环境变量覆盖)
+#   'default'  : 原始 fp32 模型
+#   'quantized': 编码器与解码器的 Linear 层动态量化为 int8
+#   'onnx'     : 首次使用时导出为 ONNX 并缓存到 MANGA_OCR_ONNX_DIR，之后使用 ONNX Runtime 推理
+# 切换前可用 scripts/benchmark_manga_ocr.py 在固定的裁剪图集合上对比准确率与耗时
+MANGA_OCR_CPU_PROFILE = 'default'
+MANGA_OCR_CPU_THREADS = 0       # torch / ONNX Runtime 的 intra-op 线程数，0 表示保持默认 (不修改进程级的 torch 线程设置)
+MANGA_OCR_ONNX_DIR = 'manga_ocr_model_onnx' # 相对项目根目录，与 manga_ocr_model 同级
+# 空白气泡预过滤：OCR 前用积分图一次性算出所有气泡 (向内收缩后) 的灰度标准差、墨迹像素比例与边缘密度，
+# 灰度几乎均匀，或既没有墨迹也没有边缘的气泡视为没有文字，不送 OCR，识别结果为空，翻译时也随之跳过
+BLANK_BUBBLE_FILTER_ENABLED = True
+BLANK_BUBBLE_INSET_RATIO = 0.1          # 每条边向内收缩的比例，排除气泡轮廓线
+BLANK_BUBBLE_MIN_AREA = 64              # 收缩后面积 (像素) 小于该值的气泡不做判断
+BLANK_BUBBLE_INK_THRESHOLD = 100        # 灰度低于该值的像素计为墨迹
+BLANK_BUBBLE_MAX_STD = 6.0              # 灰度标准差低于该值视为均匀区域
+BLANK_BUBBLE_MIN_INK_RATIO = 0.003      # 墨迹像素比例下限
+BLANK_BUBBLE_MIN_EDGE_DENSITY = 0.004   # 边缘 (Canny) 像素比例下限
 PADDLE_LANG_MAP = {
     "en": "en",
     "korean": "korean",
@@ -75,6 +108,14 @@ BAIDU_OCR_VERSIONS = {
     "high_precision": "高精度版"
 }
 
+# 百度OCR拼接识别：多个气泡裁剪图以白色间隔拼接成一张图，每张拼接图只请求一次含位置的端点
+BAIDU_OCR_STITCH_ENABLED = True
+BAIDU_OCR_STITCH_MAX_SIDE = 4096                 # 拼接图最长边 (百度要求不超过 4096px)
+BAIDU_OCR_STITCH_MAX_BYTES = 3 * 1024 * 1024     # 拼接图 PNG 编码后的大小上限 (Base64 后约 4MB)
+BAIDU_OCR_STITCH_GAP = 32                        # 裁剪图之间的白色间隔 (像素)
+BAIDU_OCR_VERTICAL_LANGUAGES = ('japanese',)     # 竖排文字的语言，裁剪图横向排列
+BAIDU_OCR_SAVE_DEBUG_CROPS = False               # 是否把每个气泡裁剪图保存到 data/debug/ocr_bubbles
+
 # 百度OCR语言映射使用大写编码
 # 参考文档: https://cloud.baidu.com/doc/OCR/s/zk3h7xz52
 BAIDU_LANG_MAP = {
@@ -187,6 +228,24 @@ DEFAULT_TRANSLATE_JSON_PROMPT = """你是一个专业的翻译引擎。请将用
   "translated_text": "[翻译后的文本放在这里]"
 }"""
 
+# 双提示词合并翻译：一次请求同时得到气泡译文和文本框译文。{bubble_prompt} / {textbox_prompt} 会被替换为各自的提示词
+DEFAULT_DUAL_TRANSLATE_JSON_PROMPT = """你需要为用户提供的同一段文本同时给出两种译文。
+
+第一种译文 (bubble_text) 的要求:
+{bubble_prompt}
+
+第二种译文 (textbox_text) 的要求:
+{textbox_prompt}
+
+当文本中包含特殊字符（如大括号{}、引号""、反斜杠\等）时，请在输出中保留它们但不要将它们视为JSON语法的一部分。
+
+无论上面的要求中是否提到其他输出格式，都请严格按照以下 JSON 格式返回结果，不要添加任何额外的解释或对话:
+{
+  "bubble_text": "[第一种译文]",
+  "textbox_text": "[第二种译文]"
+}"""
+DEFAULT_DUAL_PROMPT_TRANSLATION = True # 启用文本框提示词时，支持的服务商用一次请求同时获取两种译文
+
 DEFAULT_AI_VISION_OCR_JSON_PROMPT = """你是一个OCR助手。请将我发送给你的图片中的所有文字提取出来。
 
 当文本中包含特殊字符（如大括号{}、引号""、反斜杠\等）时，请在输出中保留它们但不要将它们视为JSON语法的一部分。如果需要，你可以使用转义字符\\来表示这些特殊字符。
@@ -196,12 +255,172 @@ DEFAULT_AI_VISION_OCR_JSON_PROMPT = """你是一个OCR助手。请将我发送
   "extracted_text": "[这里放入所有识别到的文字，可以包含换行符以大致保留原始分段，但不要包含任何其他非文本内容]"
 }"""
 
+# AI 视觉 OCR 逐个气泡识别时的并发请求数 (rpm 限流与自适应限流仍对每次请求生效)
+AI_VISION_OCR_CONCURRENCY = 4
+AI_VISION_SAVE_DEBUG_CROPS = False # 是否把每个气泡裁剪图保存到 data/debug/ocr_bubbles
+AI_VISION_SAVE_DEBUG_PAGES = False # 是否把整页 / 融合模式标注后的页面图像保存到 data/debug/ocr_pages
+# 发送给视觉模型的图像编码策略。气泡裁剪图转灰度并压缩为 JPEG，请求体通常只有无损 PNG 的几分之一；
+# 整页图像保留颜色 (红色编号框)。可结合 /api/vision_ocr/stats 中的字节数与耗时调整
+AI_VISION_CROP_ENCODING = {'grayscale': True, 'max_side': 1024, 'format': 'JPEG', 'quality': 85}
+AI_VISION_PAGE_ENCODING = {'grayscale': False, 'max_side': None, 'format': 'JPEG', 'quality': 90}
+AI_VISION_STATS_RECENT = 200 # 保留最近多少次请求的明细
+
+# AI 视觉 OCR 整页模式：整页图像只发送一次，模型按气泡编号返回 JSON 数组。{prompt} / {count} / {boxes} 会被替换
+DEFAULT_AI_VISION_PAGE_MODE = False
+AI_VISION_PAGE_MAX_SIDE = 1600 # 整页图像发送前缩小到的最长边 (像素)，减少图像 token
+AI_VISION_PAGE_BOX_COLOR = '#FF0000' # 标注气泡编号的框与标签颜色
+DEFAULT_AI_VISION_PAGE_OCR_PROMPT = """{prompt}
+
+图片是一整页漫画，其中 {count} 个文本区域已用红框标出，红底白字的数字是区域编号。各区域在图中的像素坐标 (左上角 - 右下角) 如下:
+{boxes}
+
+请分别识别每个编号区域内的全部文字 (不要包含编号本身)，不要合并不同区域的文字。
+
+无论上面的要求中是否提到其他输出格式，都请严格按照以下 JSON 数组格式返回结果，每个区域一个元素，不要添加任何额外的解释或对话:
+[{"id": 1, "text": "[编号 1 区域内的文字]"}, {"id": 2, "text": "[编号 2 区域内的文字]"}]"""
+
+# OCR + 翻译 合并模式：AI 视觉 OCR 与翻译使用同一服务商时，整页图像只请求一次，模型同时返回每个区域的原文与译文。
+# {prompt} (翻译提示词) / {ocr_prompt} / {count} / {boxes} 会被替换
+DEFAULT_FUSED_OCR_TRANSLATION = False
+# AI 视觉服务商 -> 同一家的翻译服务商，两者一致时才启用合并模式
+FUSED_OCR_TRANSLATION_PROVIDERS = {
+    'siliconflow': 'siliconflow',
+    'volcano': 'volcano',
+    'gemini': 'gemini',
+    CUSTOM_AI_VISION_PROVIDER_ID: CUSTOM_OPENAI_PROVIDER_ID
+}
+DEFAULT_AI_VISION_FUSED_PROMPT = """{ocr_prompt}
+
+图片是一整页漫画，其中 {count} 个文本区域已用红框标出，红底白字的数字是区域编号。各区域在图中的像素坐标 (左上角 - 右下角) 如下:
+{boxes}
+
+请分别识别每个编号区域内的全部文字 (不要包含编号本身，不要合并不同区域的文字)，再按照以下翻译要求分别翻译每个区域的文字:
+{prompt}
+
+无论上面的要求中是否提到其他输出格式，都请严格按照以下 JSON 数组格式返回结果，每个区域一个元素，"text" 为原文，"translation" 为译文，不要添加任何额外的解释或对话:
+[{"id": 1, "text": "[编号 1 区域内的原文]", "translation": "[编号 1 区域的译文]"}, {"id": 2, "text": "[编号 2 区域内的原文]", "translation": "[编号 2 区域的译文]"}]"""
+
 # --- rpm (Requests Per Minute) Limiting ---
 DEFAULT_rpm_TRANSLATION = 0  # 0 表示无限制
 DEFAULT_rpm_AI_VISION_OCR = 0 # 0 表示无限制
 
+# --- HTTP 连接池 ---
+HTTP_POOL_CONNECTIONS = 8   # 每个会话缓存的主机连接池数量
+HTTP_POOL_MAXSIZE = 16      # 每个主机保持的最大连接数 (应不小于翻译并发数)
+HTTP_KEEPALIVE_EXPIRY = 60  # 空闲连接保持时间 (秒)
+HTTP_CONNECT_TIMEOUT = 10   # 建立连接超时 (秒)
+HTTP_READ_TIMEOUT = 180     # 读取响应超时 (秒)，本地大模型首次加载可能较慢
+
+# --- 重试与熔断 (翻译 / AI 视觉 OCR / 百度 OCR) ---
+RETRY_MAX_ATTEMPTS = 3 # 每次调用最多尝试次数 (含第一次)
+RETRY_BASE_DELAY = 0.5 # 指数退避的基础间隔 (秒)
+RETRY_MAX_DELAY = 20 # 指数退避的最大间隔 (秒)
+RETRY_AFTER_MAX_SECONDS = 60 # 服务端 Retry-After 提示的最长采纳时间 (秒)
+CIRCUIT_FAILURE_THRESHOLD = 5 # 连续失败多少次后熔断
+CIRCUIT_RECOVERY_SECONDS = 30 # 熔断后多久进入半开状态探测
+
+# --- 自适应限流 (AIMD：成功时线性增加并发与 rpm，429/超时时减半) ---
+ADAPTIVE_LIMITS_ENABLED = False # 默认关闭，可通过 /api/adaptive_limits 开启 (状态保存在 config/adaptive_limits.json)
+ADAPTIVE_INITIAL_CONCURRENCY = 2 # 没有历史记录时的初始并发数
+ADAPTIVE_MAX_CONCURRENCY = 16 # 并发数上限 (同时不超过服务商的翻译并发设置)
+ADAPTIVE_INITIAL_RPM = 20 # 没有历史记录时的初始 rpm
+ADAPTIVE_MIN_RPM = 2 # 减速后的最低 rpm
+ADAPTIVE_MAX_RPM = 600 # rpm 设置为 0 (不限制) 时自适应 rpm 的上限；设置了 rpm 时以设置值为上限
+ADAPTIVE_RPM_INCREASE = 1 # 每次成功请求 rpm 增加量
+ADAPTIVE_DECREASE_FACTOR = 0.5 # 被限流或超时时的乘性减小系数
+ADAPTIVE_ABOVE_CEILING_SLOWDOWN = 4 # 超过已学到的上限后，增长速度降为原来的 1/N
+ADAPTIVE_DECREASE_COOLDOWN = 2.0 # 两次减速的最小间隔 (秒)，避免同一波并发请求的 429 连续减半
+ADAPTIVE_SAVE_INTERVAL = 30 # 学到的限额写入配置文件的最小间隔 (秒)
+
+# --- 翻译并发 ---
+DEFAULT_TRANSLATION_CONCURRENCY = 8 # 同一页内同时发出的翻译请求数 (rpm 限制仍由令牌桶保证)
+# 本地模型一次只能处理一个请求；百度/有道有 QPS 限制且接口对象共享凭证，保持逐个请求
+TRANSLATION_CONCURRENCY_BY_PROVIDER = {
+    'ollama': 1,
+    'sakura': 1,
+    BAIDU_TRANSLATE_ENGINE_ID: 1,
+    YOUDAO_TRANSLATE_ENGINE_ID: 1,
+}
+
+# --- 多服务商路由 (对冲请求与故障转移) ---
+# 延迟直方图的桶上界 (毫秒)，最后还有一个溢出桶
+ROUTER_LATENCY_BUCKETS_MS = (100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 60000, 120000)
+ROUTER_HISTOGRAM_WINDOW = 500 # 样本数超过该值时所有桶计数减半，使阈值跟随近期延迟变化
+ROUTER_HEDGE_PERCENTILE = 0.95 # 主服务商超过该分位延迟仍未返回时发出对冲请求
+ROUTER_MIN_SAMPLES = 20 # 样本不足时使用默认对冲等待时间
+ROUTER_DEFAULT_HEDGE_SECONDS = 10.0 # 默认对冲等待时间 (秒)
+ROUTER_MIN_HEDGE_SECONDS = 1.0 # 对冲等待时间下限 (秒)，避免延迟很低时几乎每段都发两次请求
+ROUTER_MAX_PARALLEL_ATTEMPTS = 2 # 同一段文本最多同时进行的请求数 (主请求 + 对冲请求)
+ROUTER_MAX_WORKERS = 32 # 路由请求线程池大小
+
+# --- 机器翻译接口批量请求 (彩云 / 百度 / 有道一次请求翻译多段文本) ---
+CAIYUN_BATCH_MAX_ITEMS = 50 # 彩云小译单次请求的 source 列表最多包含的文本段数
+CAIYUN_BATCH_MAX_CHARS = 5000 # 彩云小译单次请求的总字符数上限
+BAIDU_TRANSLATE_MAX_QUERY_BYTES = 6000 # 百度翻译单次请求 q 参数的 UTF-8 字节数上限
+YOUDAO_TRANSLATE_MAX_QUERY_CHARS = 5000 # 有道翻译单次请求 q 参数的字符数上限
+
+# --- 翻译记忆 ---
+TRANSLATION_MEMORY_ENABLED = True
+TRANSLATION_MEMORY_FUZZY_THRESHOLD = 0.9 # 模糊匹配的最低相似度 (difflib ratio)，低于此值视为未命中
+TRANSLATION_MEMORY_FUZZY_MIN_CHARS = 4 # 原文少于该字符数时只做精确匹配
+TRANSLATION_MEMORY_FUZZY_CANDIDATES = 20 # 按共享三元组数量取前 N 条候选计算相似度
+
+# --- 打包翻译 (多个气泡、多页合并为一次请求) ---
+DEFAULT_PACKED_TRANSLATION = False # 对话式大模型服务商按 token 预算把多段文本合并为一次请求
+PACKED_TRANSLATION_TOKEN_BUDGET = 3000 # 单个请求中原文与译文的估计 token 总数上限
+PACKED_TRANSLATION_MAX_ITEMS = 50 # 单个请求最多包含的文本段数
+PACKED_TRANSLATION_MAX_PAGES = 4 # 章节流水线中最多合并几页的文本 (仅合并已完成 OCR、正在等待翻译的页)
+DEFAULT_STREAMING_TRANSLATION = True # 打包翻译以流式方式接收回复，每段译文一解析出来就上报，不必等整个回复结束
+# {prompt} 会被替换为用户的翻译提示词
+DEFAULT_PACKED_TRANSLATE_PROMPT = """{prompt}
+
+用户会发送一个 JSON 数组，每个元素是一段相互独立的待翻译文本："id" 为编号，"text" 为原文。
+请对每个元素分别按上面的要求翻译，不要合并、拆分或遗漏任何元素。
+
+当文本中包含特殊字符（如大括号{}、引号""、反斜杠\等）时，请在输出中保留它们但不要将它们视为JSON语法的一部分。
+
+无论上面的要求中是否提到其他输出格式，都请只返回一个 JSON 数组，元素个数与编号必须与输入完全一致，不要添加任何额外的解释或对话:
+[
+  {"id": 1, "translation": "[第1段的译文]"},
+  {"id": 2, "translation": "[第2段的译文]"}
+]"""
+# 打包翻译与双提示词合并翻译同时启用时使用。{bubble_prompt} / {textbox_prompt} 会被替换为各自的提示词
+DEFAULT_PACKED_DUAL_TRANSLATE_PROMPT = """用户会发送一个 JSON 数组，每个元素是一段相互独立的待翻译文本："id" 为编号，"text" 为原文。
+你需要为每一段文本同时给出两种译文，不要合并、拆分或遗漏任何元素。
+
+第一种译文 (bubble_text) 的要求:
+{bubble_prompt}
+
+第二种译文 (textbox_text) 的要求:
+{textbox_prompt}
+
+当文本中包含特殊字符（如大括号{}、引号""、反斜杠\等）时，请在输出中保留它们但不要将它们视为JSON语法的一部分。
+
+无论上面的要求中是否提到其他输出格式，都请只返回一个 JSON 数组，元素个数与编号必须与输入完全一致，不要添加任何额外的解释或对话:
+[
+  {"id": 1, "bubble_text": "[第1段的第一种译文]", "textbox_text": "[第1段的第二种译文]"},
+  {"id": 2, "bubble_text": "[第2段的第一种译文]", "textbox_text": "[第2段的第二种译文]"}
+]"""
+
 # --- 文本描边默认值 ---
 DEFAULT_TEXT_STROKE_ENABLED = False
 DEFAULT_TEXT_STROKE_COLOR = '#FFFFFF' # 默认白色描边
 DEFAULT_TEXT_STROKE_WIDTH = 1         # 默认1像素宽度
-# ------------------------
\ No newline at end of file
+# ------------------------
+
+# --- 流水线并发 ---
+CHAPTER_PIPELINE_QUEUE_SIZE = 2 # 阶段之间队列的最大长度 (快的阶段最多领先慢的阶段几页)
+OVERLAP_INPAINTING_WITH_TRANSLATION = True # 单页内修复与 OCR+翻译 并发执行
+
+# --- 阶段结果缓存 (检测 / 修复) ---
+STAGE_CACHE_ENABLED = True
+STAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024 # 磁盘缓存总大小上限，超出后按 LRU 淘汰
+
+# --- OCR 结果缓存 (按气泡裁剪图，跨页面与会话复用) ---
+OCR_CACHE_ENABLED = True
+OCR_CACHE_MAX_BYTES = 64 * 1024 * 1024 # 记录总大小上限，超出后按最近使用时间淘汰
+
+# --- 后台任务 ---
+JOB_MAX_WORKERS = 2 # 同时执行的后台翻译任务数
+JOB_RESULT_TTL_SECONDS = 3600 # 已结束任务的结果保留时间 (秒)
+JOB_EVENT_KEEPALIVE_SECONDS = 15 # 事件流 (SSE) 无新事件时发送心跳的间隔 (秒)
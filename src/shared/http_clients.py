@@ -0,0 +1,138 @@
+"""
+复用的 HTTP / OpenAI 客户端。
+
+每次请求都新建 OpenAI(...) 或直接调用 requests.post 时，每个气泡都要重新建立 TCP/TLS 连接。
+本模块按 (base_url, api_key) 缓存 OpenAI 客户端，按服务名缓存 requests.Session，
+两者都使用带 keep-alive 的连接池，并统一设置连接池大小和超时。
+
+另外记录每个服务的请求次数与耗时 (get_http_client_stats)，便于比较连接复用前后的单次请求开销。
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from openai import OpenAI
+
+from src.shared import constants
+
+logger = logging.getLogger("HttpClients")
+
+_openai_clients = {}
+_http_sessions = {}
+_clients_lock = threading.Lock()
+
+_request_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _key_hash(api_key):
+    return hashlib.sha1(str(api_key or '').encode('utf-8')).hexdigest()[:12]
+
+
+def get_openai_client(base_url, api_key):
+    """
+    获取 (base_url, api_key) 对应的 OpenAI 客户端，首次调用时创建，之后复用其连接池。
+    OpenAI 客户端是线程安全的，可在并发翻译的多个线程间共享。
+    """
+    key = (base_url, _key_hash(api_key))
+    client = _openai_clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=constants.HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=constants.HTTP_POOL_MAXSIZE,
+                    keepalive_expiry=constants.HTTP_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(constants.HTTP_READ_TIMEOUT, connect=constants.HTTP_CONNECT_TIMEOUT)
+            )
+            # 重试由 resilience 统一负责：SDK 自带的重试会放大尝试次数，并吞掉 429 / Retry-After 等限流信号
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+            _openai_clients[key] = client
+            logger.info(f"创建 OpenAI 客户端: {base_url} (当前共 {len(_openai_clients)} 个)")
+    return client
+
+
+def get_http_session(name):
+    """获取指定服务的 requests.Session (带连接池)，首次调用时创建。"""
+    session = _http_sessions.get(name)
+    if session is not None:
+        return session
+    with _clients_lock:
+        session = _http_sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=constants.HTTP_POOL_CONNECTIONS,
+                                  pool_maxsize=constants.HTTP_POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_sessions[name] = session
+            logger.info(f"创建 HTTP 会话: {name}")
+    return session
+
+
+@contextmanager
+def track_request(name):
+    """记录一次请求的耗时，计入 name 对应的统计。"""
+    start_time = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        with _stats_lock:
+            stats = _request_stats.setdefault(name, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'min_ms': None, 'max_ms': 0.0, 'last_ms': 0.0})
+            stats['count'] += 1
+            stats['errors'] += 1 if failed else 0
+            stats['total_ms'] += elapsed_ms
+            stats['min_ms'] = elapsed_ms if stats['min_ms'] is None else min(stats['min_ms'], elapsed_ms)
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['last_ms'] = elapsed_ms
+        logger.debug(f"{name} 请求耗时: {elapsed_ms:.0f}ms")
+
+
+def http_post(name, url, **kwargs):
+    """
+    使用 name 对应的会话发送 POST 请求，默认带连接/读取超时，并记录耗时。
+    参数与 requests.post 相同。
+    """
+    kwargs.setdefault('timeout', (constants.HTTP_CONNECT_TIMEOUT, constants.HTTP_READ_TIMEOUT))
+    with track_request(name):
+        return get_http_session(name).post(url, **kwargs)
+
+
+def get_http_client_stats():
+    """返回已创建的客户端数量及各服务的请求耗时统计。"""
+    with _stats_lock:
+        services = {}
+        for name, stats in _request_stats.items():
+            services[name] = {
+                'count': stats['count'],
+                'errors': stats['errors'],
+                'avg_ms': round(stats['total_ms'] / stats['count'], 1) if stats['count'] else 0.0,
+                'min_ms': round(stats['min_ms'] or 0.0, 1),
+                'max_ms': round(stats['max_ms'], 1),
+                'last_ms': round(stats['last_ms'], 1)
+            }
+    return {
+        'openai_clients': len(_openai_clients),
+        'http_sessions': sorted(_http_sessions),
+        'services': services
+    }
+
+
+def reset_http_client_stats():
+    with _stats_lock:
+        _request_stats.clear()
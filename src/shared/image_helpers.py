@@ -23,6 +23,47 @@ def image_to_base64(image, format="PNG"):
     return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
 
+def encode_image_for_upload(image, policy=None):
+    """
+    按编码策略把图像编码为 base64，用于发送给视觉模型。
+
+    Args:
+        image: PIL图像对象
+        policy (dict, optional): 编码策略，可包含
+            grayscale (bool): 是否转为灰度
+            max_side (int): 最长边上限 (像素)，超过时等比缩小
+            format (str): 'PNG' / 'JPEG' / 'WEBP'，当前 Pillow 不支持 WEBP 时改用 JPEG
+            quality (int): JPEG / WEBP 质量
+            为 None 时与 image_to_base64 相同，使用无损 PNG。
+
+    Returns:
+        tuple: (base64编码字符串, MIME 类型, 编码后的字节数)
+    """
+    policy = policy or {}
+    image_format = (policy.get('format') or 'PNG').upper()
+    if policy.get('grayscale'):
+        image = image.convert('L')
+    elif image_format != 'PNG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB') # JPEG 不支持透明通道
+    max_side = policy.get('max_side')
+    if max_side:
+        image = resize_image_to_fit(image, max_side, max_side)
+
+    save_kwargs = {}
+    if image_format in ('JPEG', 'WEBP'):
+        save_kwargs['quality'] = int(policy.get('quality') or 85)
+    buffered = io.BytesIO()
+    try:
+        image.save(buffered, format=image_format, **save_kwargs)
+    except (KeyError, OSError):
+        # 未编译 WebP 支持的 Pillow
+        image_format = 'JPEG'
+        buffered = io.BytesIO()
+        image.save(buffered, format=image_format, **save_kwargs)
+    data = buffered.getvalue()
+    return base64.b64encode(data).decode('utf-8'), f"image/{image_format.lower()}", len(data)
+
+
 def base64_to_image(base64_string):
     """
     将base64编码字符串转换为PIL图像对象
@@ -0,0 +1,101 @@
+"""
+增量 JSON 数组解析。
+
+流式接收大模型回复时，回复形如 (可能带有 ```json 代码块或前后说明文字)：
+
+    [{"id": 1, "translation": "..."}, {"id": 2, "translation": "..."}]
+
+IncrementalJsonArrayParser 每收到一段文本就扫描新增的字符，顶层数组中的某个元素一闭合就立即解析并返回，
+不必等整个回复结束。扫描时跟踪字符串与转义，元素内部的括号、引号不会影响判断；
+单个元素不是合法 JSON 时跳过该元素，调用方可在回复结束后用完整文本 (parser.text) 做兜底解析。
+"""
+
+import json
+
+
+class IncrementalJsonArrayParser:
+    """逐段喂入文本，返回顶层 JSON 数组中新闭合的元素。"""
+    def __init__(self):
+        self._chunks = []
+        self._buffer = ""     # 尚未扫描完的元素文本
+        self._depth = 0       # 0: 尚未进入数组；1: 数组内、元素之间；>1: 元素内部
+        self._in_string = False
+        self._escape = False
+        self._element_start = None
+        self.finished = False # 顶层数组已闭合
+        self.skipped = 0      # 无法解析而跳过的元素数
+
+    @property
+    def text(self):
+        """目前收到的完整文本。"""
+        return "".join(self._chunks)
+
+    def feed(self, chunk):
+        """
+        喂入一段文本。
+
+        Returns:
+            list: 本次新闭合并成功解析的元素 (按出现顺序)。
+        """
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        if self.finished:
+            return []
+        elements = []
+        offset = len(self._buffer)
+        self._buffer += chunk
+        for i in range(offset, len(self._buffer)):
+            ch = self._buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if self._depth == 0:
+                # 数组开始前的说明文字、代码块标记等直接跳过
+                if ch == '[':
+                    self._depth = 1
+                continue
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._element_start is None:
+                    self._element_start = i # 顶层元素是字符串
+            elif ch in '{[':
+                if self._depth == 1:
+                    self._element_start = i
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._element_start is not None:
+                        # 最后一个元素是标量
+                        self._emit(self._buffer[self._element_start:i], elements)
+                        self._element_start = None
+                    self.finished = True
+                    break
+                if self._depth == 1 and self._element_start is not None:
+                    self._emit(self._buffer[self._element_start:i + 1], elements)
+                    self._element_start = None
+            elif ch == ',' and self._depth == 1 and self._element_start is not None:
+                # 字符串或数字等标量元素在逗号处结束
+                self._emit(self._buffer[self._element_start:i], elements)
+                self._element_start = None
+            elif self._depth == 1 and self._element_start is None and not ch.isspace() and ch != ',':
+                self._element_start = i
+        # 丢弃已处理的部分，只保留正在扫描的元素
+        if self._element_start is not None:
+            self._buffer = self._buffer[self._element_start:]
+            self._element_start = 0
+        else:
+            self._buffer = ""
+        return elements
+
+    def _emit(self, element_text, elements):
+        try:
+            elements.append(json.loads(element_text))
+        except json.JSONDecodeError:
+            self.skipped += 1
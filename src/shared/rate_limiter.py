@@ -0,0 +1,128 @@
+"""
+线程安全的令牌桶限流器。
+
+按 (服务类型, 服务商, API Key) 分别限流，同一服务商的不同 Key 互不影响，
+同一 Key 在多个请求线程、多个后台任务之间共享同一个令牌桶。
+
+令牌以 rpm/60 每秒的速度补充，桶容量等于 rpm 且初始为满，
+因此一页的十几个气泡可以在额度内同时发出，而不是逐个等待；
+额度用尽后每个请求只等待补充一个令牌所需的时间，而不是整个 60 秒窗口的剩余时间。
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger("RateLimiter")
+
+
+class TokenBucket:
+    """令牌桶。"""
+    def __init__(self, rpm):
+        self._lock = threading.Lock()
+        self.rpm = 0
+        self.capacity = 0.0
+        self.refill_per_second = 0.0
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+        self.set_rpm(rpm)
+        self._tokens = self.capacity # 初始为满
+
+    def set_rpm(self, rpm):
+        """调整速率 (例如用户修改了 rpm 设置)，已有令牌数不超过新容量。"""
+        with self._lock:
+            if rpm == self.rpm:
+                return
+            self._refill()
+            self.rpm = rpm
+            self.capacity = float(max(1, rpm))
+            self.refill_per_second = rpm / 60.0
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.refill_per_second)
+        self._last_refill = now
+
+    def acquire(self, cancel_event=None):
+        """
+        取得一个令牌，必要时阻塞等待。
+
+        Args:
+            cancel_event (threading.Event, optional): 等待期间被设置时立即返回 False。
+
+        Returns:
+            bool: 是否取得令牌。
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_time = (1 - self._tokens) / self.refill_per_second
+            if cancel_event is not None:
+                if cancel_event.wait(wait_time):
+                    return False
+            else:
+                time.sleep(wait_time)
+
+    @property
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket_key(service, provider, api_key):
+    # 不在内存中以明文作为键保存 API Key
+    key_hash = hashlib.sha1(str(api_key or '').encode('utf-8')).hexdigest()[:12]
+    return (service, provider or '', key_hash)
+
+
+def acquire_rate_limit(service, provider, api_key, rpm, cancel_event=None):
+    """
+    按 rpm 限流。rpm 为 0 或负数时不限制。
+
+    Args:
+        service (str): 服务类型，例如 'translation'、'ai_vision_ocr'。
+        provider (str): 服务商 ID。
+        api_key (str): API Key，仅用于区分令牌桶。
+        rpm (int): 每分钟最大请求数。
+        cancel_event (threading.Event, optional): 等待期间可被取消。
+
+    Returns:
+        bool: 是否取得许可 (仅在等待时被取消才会返回 False)。
+    """
+    if not rpm or rpm <= 0:
+        return True
+    key = _bucket_key(service, provider, api_key)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rpm)
+            _buckets[key] = bucket
+    bucket.set_rpm(rpm)
+
+    start_time = time.monotonic()
+    acquired = bucket.acquire(cancel_event)
+    waited = time.monotonic() - start_time
+    if waited > 0.05:
+        logger.info(f"rpm: {service} ({provider}) - 已达到每分钟 {rpm} 次请求上限，等待了 {waited:.2f} 秒。")
+    return acquired
+
+
+def get_rate_limiter_stats():
+    """返回各令牌桶的当前状态 (不含 API Key)。"""
+    with _buckets_lock:
+        items = list(_buckets.items())
+    return [
+        {'service': service, 'provider': provider, 'key_id': key_hash,
+         'rpm': bucket.rpm, 'available_tokens': round(bucket.available, 2)}
+        for (service, provider, key_hash), bucket in items
+    ]
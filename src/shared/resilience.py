@@ -0,0 +1,342 @@
+"""
+外部服务调用的重试与熔断。
+
+翻译、AI 视觉 OCR、百度 OCR 共用同一套策略：
+    - 只重试可恢复的错误 (连接失败、超时、429、5xx 等)，4xx 参数/认证错误立即返回
+    - 重试间隔为带随机抖动的指数退避；服务端给出 Retry-After 时按其等待
+    - 每个 (服务类型, 服务商, 接口地址 + API Key) 一个熔断器：连续失败达到阈值后熔断，冷却期内直接失败，
+      不再让每个气泡都等完整的超时；冷却结束后进入半开状态，只放行一个探测请求，
+      成功则恢复，失败则重新熔断
+    - 被限流 (429 或带 Retry-After 的响应) 只退避重试，不计入熔断器的连续失败次数：
+      并发请求同时收到一批 429 时不会因此熔断，剩余的气泡继续等待额度
+
+熔断器状态与重试计数可通过 get_resilience_stats() 查看。
+"""
+
+import hashlib
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from src.shared import constants
+
+logger = logging.getLogger("Resilience")
+
+# 熔断器状态
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# 这些 HTTP 状态码表示暂时性错误，可以重试
+RETRYABLE_STATUS_CODES = (408, 409, 425, 429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """服务商已熔断，请求未发出。"""
+    pass
+
+
+class RetryableError(Exception):
+    """
+    接口以业务错误码表示的暂时性错误 (例如 QPS 超限)，可以重试。
+
+    Args:
+        retry_after (float, optional): 建议的等待秒数；为 0 时立即重试 (例如刷新令牌后)。
+        throttled (bool): 是否为限流 (例如 QPS 超限)，限流不计入熔断器的失败次数。
+    """
+    def __init__(self, message, retry_after=None, throttled=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.throttled = throttled
+
+
+class PermanentError(Exception):
+    """请求本身有问题 (参数错误、凭证无效等)，重试无意义，也不计入服务商的失败次数。"""
+    pass
+
+
+class ConfigError(PermanentError, ValueError):
+    """缺少凭证、配置错误或认证失败。同时是 ValueError，已有的 except ValueError 仍能捕获。"""
+    pass
+
+
+def get_status_code(error):
+    """从 requests / httpx / OpenAI SDK 的异常中取出 HTTP 状态码，没有则返回 None。"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def get_retry_after(error):
+    """
+    读取服务端建议的等待时间 (秒)。支持 Retry-After 的秒数与 HTTP 日期格式，以及 retry-after-ms。
+    """
+    if isinstance(error, RetryableError):
+        return error.retry_after
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after-ms')
+        if value:
+            return max(0.0, float(value) / 1000)
+        value = headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            retry_at = parsedate_to_datetime(value)
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled_error(error):
+    """服务商限流：HTTP 429、带 Retry-After 的响应，或业务层声明的限流错误。"""
+    if isinstance(error, RetryableError):
+        return error.throttled
+    return get_status_code(error) == 429 or get_retry_after(error) is not None
+
+
+def is_retryable_error(error):
+    """默认的重试判断：业务层声明的永久错误与非暂时性的 4xx 不重试，其余 (网络错误、5xx 等) 重试。"""
+    if isinstance(error, (PermanentError, CircuitOpenError)):
+        return False
+    if isinstance(error, RetryableError):
+        return True
+    status = get_status_code(error)
+    if status is not None and 400 <= status < 500:
+        return status in RETRYABLE_STATUS_CODES
+    return True
+
+
+def compute_backoff(attempt, retry_after=None,
+                    base_delay=constants.RETRY_BASE_DELAY, max_delay=constants.RETRY_MAX_DELAY):
+    """
+    第 attempt 次重试 (从 0 开始) 前的等待时间。
+
+    服务端给出 Retry-After 时以其为准 (不超过 RETRY_AFTER_MAX_SECONDS)，再加少量抖动避免多线程同时重试；
+    否则在 [0, min(max_delay, base_delay * 2^attempt)] 内均匀随机 (full jitter)。
+    """
+    if retry_after is not None:
+        return min(retry_after, constants.RETRY_AFTER_MAX_SECONDS) + random.uniform(0, base_delay)
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """单个 (服务类型, 服务商) 的熔断器。线程安全。"""
+    def __init__(self, name, failure_threshold=constants.CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_seconds=constants.CIRCUIT_RECOVERY_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        # 统计
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.throttles = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error = None
+
+    def before_call(self):
+        """请求前调用。熔断中 (或半开状态已有探测请求) 时抛出 CircuitOpenError。"""
+        with self._lock:
+            if self.state == STATE_OPEN:
+                remaining = self.opened_at + self.recovery_seconds - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} 已熔断 (连续失败 {self.consecutive_failures} 次)，{remaining:.0f} 秒后重试。最近错误: {self.last_error}")
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"{self.name} 熔断冷却结束，进入半开状态，放行一个探测请求。")
+            if self.state == STATE_HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} 正在探测服务是否恢复，请稍后重试。")
+                self._probe_in_flight = True
+            self.calls += 1
+
+    def record_success(self):
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                logger.info(f"{self.name} 探测请求成功，熔断器恢复。")
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"{self.name} 连续失败 {self.consecutive_failures} 次，熔断 {self.recovery_seconds} 秒。最近错误: {self.last_error}")
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_throttle(self, error):
+        """被限流：只计数，不增加连续失败次数；半开状态下释放探测名额，由下一个请求继续探测。"""
+        with self._lock:
+            self.throttles += 1
+            self.last_error = str(error)[:200]
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """请求以不计入失败的方式结束 (例如参数错误) 时释放半开状态的探测名额。"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def reset(self):
+        with self._lock:
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def to_dict(self):
+        with self._lock:
+            retry_in = None
+            if self.state == STATE_OPEN:
+                retry_in = round(max(0.0, self.opened_at + self.recovery_seconds - time.monotonic()), 1)
+            return {
+                'name': self.name,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_in_seconds': retry_in,
+                'calls': self.calls,
+                'failures': self.failures,
+                'retries': self.retries,
+                'throttles': self.throttles,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened,
+                'last_error': self.last_error
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_scope(base_url=None, api_key=None):
+    """
+    熔断器作用域：同一服务商的不同接口地址 (例如多个自定义 OpenAI 服务) 与不同 API Key 互不影响。
+    API Key 只以哈希出现在熔断器名称中。
+    """
+    if not base_url and not api_key:
+        return None
+    key_hash = hashlib.sha1(str(api_key or '').encode('utf-8')).hexdigest()[:8] if api_key else ''
+    return f"{base_url or ''}#{key_hash}"
+
+
+def get_circuit_breaker(service, provider, scope=None):
+    """获取 (服务类型, 服务商, 作用域) 对应的熔断器，首次调用时创建。"""
+    key = f"{service}:{provider or ''}" + (f":{scope}" if scope else '')
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(key)
+                _breakers[key] = breaker
+    return breaker
+
+
+def call_with_resilience(service, provider, func, max_attempts=constants.RETRY_MAX_ATTEMPTS,
+                         is_retryable=is_retryable_error, cancel_event=None, scope=None):
+    """
+    调用 func()，按策略重试并更新熔断器。
+
+    Args:
+        service (str): 服务类型，例如 'translation'、'ai_vision_ocr'、'baidu_ocr'。
+        provider (str): 服务商 ID。
+        func (callable): 发出一次请求的无参函数，失败时抛出异常。
+        max_attempts (int): 最多尝试次数 (含第一次)。
+        is_retryable (callable): is_retryable(error) -> bool。不可重试的错误不计入熔断器的失败次数。
+        cancel_event (threading.Event, optional): 等待重试期间被设置时立即抛出最后一次的错误。
+        scope (str, optional): 熔断器作用域 (见 breaker_scope)，区分同一服务商的不同接口地址与 API Key。
+
+    Returns:
+        func() 的返回值。
+
+    Raises:
+        CircuitOpenError: 服务商已熔断。
+        Exception: 最后一次尝试的错误。
+    """
+    breaker = get_circuit_breaker(service, provider, scope)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.release_probe()
+                raise
+            attempt += 1
+            if is_throttled_error(e):
+                # 限流只退避，不计入连续失败次数
+                breaker.record_throttle(e)
+                if attempt >= max_attempts:
+                    raise
+            else:
+                breaker.record_failure(e)
+                if attempt >= max_attempts or breaker.state == STATE_OPEN:
+                    raise
+            delay = compute_backoff(attempt - 1, get_retry_after(e))
+            breaker.record_retry()
+            logger.warning(f"{breaker.name} 请求失败 (尝试 {attempt}/{max_attempts})，{delay:.2f} 秒后重试: {e}")
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    raise
+            else:
+                time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def get_resilience_stats():
+    """返回所有熔断器的状态与重试统计。"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {
+        'policy': {
+            'max_attempts': constants.RETRY_MAX_ATTEMPTS,
+            'base_delay': constants.RETRY_BASE_DELAY,
+            'max_delay': constants.RETRY_MAX_DELAY,
+            'failure_threshold': constants.CIRCUIT_FAILURE_THRESHOLD,
+            'recovery_seconds': constants.CIRCUIT_RECOVERY_SECONDS
+        },
+        'breakers': [breaker.to_dict() for breaker in sorted(breakers, key=lambda b: b.name)]
+    }
+
+
+def reset_circuit_breakers():
+    """手动关闭所有熔断器 (例如用户更换了 API Key 或确认服务已恢复)。"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    for breaker in breakers:
+        breaker.reset()